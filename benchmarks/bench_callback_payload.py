@@ -0,0 +1,88 @@
+# Bytes exchanged per Predict click as the history grows: the current Patch-based
+# update_output (measured through the Flask test client) against the previous full
+# re-render (px.line figure, full DataTable and the history store sent both ways,
+# rebuilt here the way the old callback did it)
+#   python benchmarks/bench_callback_payload.py
+import argparse
+import base64
+import json
+import os
+import tempfile
+
+from common import CACHE_DIR, ROOT, load_model, synthetic_fleet
+
+
+def old_payload(history, importance_fig):
+    import pandas as pd
+    import plotly.express as px
+    from dash import dash_table
+    from plotly.utils import PlotlyJSONEncoder
+
+    history_df = pd.DataFrame(history)
+    trend_fig = px.line(history_df, x='cycle', y='rul', color='unit', title='RUL Prediction Trend',
+                        labels={'cycle': 'Cycle', 'rul': 'Predicted RUL'}, line_shape='linear')
+    trend_fig.update_traces(mode='lines+markers')
+    table = dash_table.DataTable(data=history_df.to_dict('records'), columns=[{'name': c, 'id': c} for c in history_df.columns])
+
+    response = json.dumps([f"Predicted RUL: {history[-1]['rul']:.2f} cycles", importance_fig, trend_fig, history, table], cls=PlotlyJSONEncoder)
+    request = json.dumps(history[:-1])  # the history store went up as State on every click
+    return len(request) + len(response)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clicks', type=int, default=50)
+    parser.add_argument('--units', type=int, default=5)
+    args = parser.parse_args()
+
+    load_model('point')
+    os.environ.update({
+        'MODEL_PATH': os.path.join(CACHE_DIR, 'model_point.joblib'),
+        'SCALER_PATH': os.path.join(ROOT, 'artifacts', 'scaler.pkl'),
+        'MODEL_LOAD_MODE': 'eager',
+        'UPLOAD_CACHE_DIR': tempfile.mkdtemp()
+    })
+    import app as dash_app
+    from ingest import FEATURES
+    from utils import get_feature_importance
+
+    client = dash_app.server.test_client()
+    fleet = synthetic_fleet(args.units)
+    keys = []
+    for unit, group in fleet.groupby('unit'):
+        contents = 'data:text/csv;base64,' + base64.b64encode(group.to_csv(index=False).encode()).decode()
+        body = {'output': '..uploaded-data.data...upload-feedback.children..',
+                'outputs': [{'id': 'uploaded-data', 'property': 'data'}, {'id': 'upload-feedback', 'property': 'children'}],
+                'inputs': [{'id': 'upload-data', 'property': 'contents', 'value': contents}],
+                'state': [{'id': 'upload-data', 'property': 'filename', 'value': f'unit{unit}.csv'}],
+                'changedPropIds': ['upload-data.contents']}
+        keys.append(client.post('/_dash-update-component', json=body).get_json()['response']['uploaded-data']['data'])
+
+    outputs = [('prediction-output', 'children'), ('feature-importance-plot', 'figure'), ('prediction-trend-plot', 'figure'),
+               ('prediction-history', 'data'), ('prediction-history-datatable', 'data'), ('prediction-history-meta', 'data')]
+    meta, history = dash_app.EMPTY_HISTORY_META, []
+    importance_fig = get_feature_importance(dash_app.model_registry.get()[0], FEATURES)
+
+    print(f"{'click':>6} {'before (bytes)':>15} {'after (bytes)':>14}")
+    for click in range(1, args.clicks + 1):
+        body = {'output': '..' + '...'.join(f'{i}.{p}' for i, p in outputs) + '..',
+                'outputs': [{'id': i, 'property': p} for i, p in outputs],
+                'inputs': [{'id': 'predict-button', 'property': 'n_clicks', 'value': click},
+                           {'id': 'reset-history-button', 'property': 'n_clicks', 'value': 0}],
+                'state': [{'id': 'uploaded-data', 'property': 'data', 'value': keys[click % len(keys)]},
+                          {'id': 'equipment-name', 'property': 'value', 'value': 'Engine-001'},
+                          {'id': 'prediction-history-meta', 'property': 'data', 'value': meta}],
+                'changedPropIds': ['predict-button.n_clicks']}
+        request = json.dumps(body)
+        response = client.post('/_dash-update-component', data=request, content_type='application/json').get_data()
+        meta = json.loads(response)['response']['prediction-history-meta']['data']
+
+        unit_df = fleet[fleet['unit'] == click % len(keys) + 1]
+        history.append({'equipment': 'Engine-001', 'unit': int(unit_df['unit'].iloc[0]), 'cycle': int(unit_df['cycle'].iloc[0]),
+                        'rul': float(json.loads(response)['response']['prediction-output']['children'].split()[2])})
+        if click in (1, 2, 5, 10, 20, 50) or click == args.clicks:
+            print(f"{click:>6} {old_payload(history, importance_fig):>15} {len(request) + len(response):>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+# Per-unit loop vs batched PointPredictorRegressor.predict for growing fleets
+#   python benchmarks/bench_fleet_predict.py
+import argparse
+
+from common import load_model, synthetic_fleet, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--end-points', type=int, default=10)
+    parser.add_argument('--max-loop-units', type=int, default=1000,
+                        help='skip the per-unit loop above this fleet size (it takes minutes)')
+    args = parser.parse_args()
+
+    model = load_model('regressor')
+    print(f"{'units':>8} {'rows':>9} {'loop (s)':>10} {'batched (s)':>12} {'speedup':>8}")
+    for n_units in args.units:
+        fleet = synthetic_fleet(n_units)
+        batched = timeit(lambda: model.predict_units(fleet, end_points=args.end_points))
+
+        if n_units <= args.max_loop_units:
+            loop = timeit(lambda: model.predict(fleet, end_points=args.end_points, batched=False), repeat=1)
+            print(f"{n_units:>8} {len(fleet):>9} {loop:>10.3f} {batched:>12.3f} {loop / batched:>7.1f}x")
+        else:
+            print(f"{n_units:>8} {len(fleet):>9} {'-':>10} {batched:>12.3f} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Throughput and latency of concurrent single-unit predictions, each caller running
+# its own model.predict_units, with and without the MicroBatcher in front of the forest.
+# Every caller scores one engine, like a UI click or a small API request.
+#   python benchmarks/bench_micro_batching.py --clients 1 4 16 64 --engine compiled
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from common import load_model, synthetic_fleet
+
+
+def run(model, requests, n_clients, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        X = requests[i % len(requests)]
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            model.predict_units(X)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies) * 1000, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--kind', choices=['point', 'regressor'], default='point')
+    parser.add_argument('--engine', choices=['sklearn', 'compiled'], default='compiled')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--max-batch-rows', type=int, default=8192)
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per measurement')
+    args = parser.parse_args()
+
+    from batching import batch_model
+    from tree_engine import compile_model
+
+    model = load_model(args.kind)
+    if args.engine == 'compiled':
+        model = compile_model(model)
+    fleet = synthetic_fleet(64)
+    requests = [group for _, group in fleet.groupby('unit')]
+
+    print(f"{args.kind} model, {args.engine} forest, max wait {args.max_wait_ms:g} ms")
+    print(f"{'clients':>8} {'mode':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11}")
+    for n_clients in args.clients:
+        batched = batch_model(model, args.max_batch_rows, args.max_wait_ms / 1000)
+        for mode, candidate in [('direct', model), ('batched', batched)]:
+            latencies, elapsed = run(candidate, requests, n_clients, args.duration)
+            p50, p99 = np.percentile(latencies, [50, 99])
+            mean_batch = batched.regressor.batcher.stats()['mean_batch'] if mode == 'batched' else 1.0
+            print(f"{n_clients:>8} {mode:>8} {len(latencies) / elapsed:>9.0f} {p50:>8.2f} {p99:>8.2f} {mean_batch:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
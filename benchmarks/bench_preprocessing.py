@@ -0,0 +1,105 @@
+# Peak memory and wall time of PointPredictor.fit on the concatenated CMAPSS train
+# sets (FD001-FD004): the original DataFrame implementation (deep copies, scaled
+# columns written back, labels from a per-unit lambda), the current DataFrame fit and
+# fit_arrays on the float64 matrix with unit offsets. Each variant runs in a fresh
+# process; "peak" is the tracemalloc peak (NumPy buffers included) while fitting.
+# Train sets missing from dataset/ are skipped; --scale tiles the fleet k times.
+#   python benchmarks/bench_preprocessing.py --trees 10 --scale 4
+import argparse
+import multiprocessing as mp
+import os
+import time
+import tracemalloc
+
+from common import DATASET_DIR
+
+TRAIN_SETS = [name for name in ['train_FD001', 'train_FD002', 'train_FD003', 'train_FD004']
+              if os.path.exists(os.path.join(DATASET_DIR, f'{name}.txt'))]
+
+
+# The implementation this benchmark compares against
+def legacy_fit(model, X):
+    copy = X.copy(deep=True)
+    y = X.groupby('unit')['cycle'].transform(lambda x: x.max() - x)
+
+    features = [col for col in copy.columns if col not in ['unit', 'cycle', 'RUL', 'failure_30']]
+    model.feature_names = features
+    copy = copy[features]
+    model.scaler.fit(copy)
+
+    scaled = copy.copy(deep=True)
+    scaled[features] = model.scaler.transform(copy[features])
+    model.regressor.fit(scaled, y)
+    return model
+
+
+def fit_variant(variant, n_trees, scale, results):
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+    from custom_models import PointPredictor, unit_offsets
+    from ingest import FEATURES, load_arrays, load_fleet
+
+    model = PointPredictor(RandomForestRegressor(max_depth=10, n_estimators=n_trees, random_state=42, n_jobs=1))
+    if variant == 'arrays':
+        ids, features, offset = [], [], 0
+        for name in TRAIN_SETS * scale:
+            file_ids, file_features = load_arrays(f'{DATASET_DIR}/{name}.txt')
+            file_ids = np.array(file_ids)
+            file_ids[:, 0] += offset
+            offset = int(file_ids[:, 0].max())
+            ids.append(file_ids)
+            features.append(file_features)
+        ids, features = np.concatenate(ids), np.concatenate(features)
+        offsets = unit_offsets(ids[:, 0])
+        fit = lambda: model.fit_arrays(features, offsets, ids[:, 1], feature_names=FEATURES, copy=False)
+    else:
+        df = load_fleet(TRAIN_SETS * scale, DATASET_DIR)
+        fit = (lambda: legacy_fit(model, df)) if variant == 'legacy' else (lambda: model.fit(df))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    fit()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results.put((elapsed, peak))
+
+
+def label_timings(scale):
+    import numpy as np
+    from common import timeit
+    from custom_models import rul_labels, unit_offsets
+    from ingest import load_fleet
+
+    df = load_fleet(TRAIN_SETS * scale, DATASET_DIR)
+    units, cycles = df['unit'].to_numpy(), df['cycle'].to_numpy()
+    lam = timeit(lambda: df.groupby('unit')['cycle'].transform(lambda x: x.max() - x))
+    grouped = timeit(lambda: df['cycle'].groupby(df['unit']).transform('max') - df['cycle'])
+    vectorised = timeit(lambda: rul_labels(cycles, unit_offsets(units)))
+    assert np.array_equal(rul_labels(cycles, unit_offsets(units)), (df['cycle'].groupby(df['unit']).transform('max') - df['cycle']).to_numpy())
+    return len(df), df['unit'].nunique(), lam, grouped, vectorised
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trees', type=int, default=10, help='forest size (the serving model uses 100)')
+    parser.add_argument('--scale', type=int, default=1, help='repeat the train sets this many times')
+    args = parser.parse_args()
+
+    rows, units, lam, grouped, vectorised = label_timings(args.scale)
+    print(f"{rows} rows, {units} units ({', '.join(TRAIN_SETS)} x{args.scale})")
+    print(f"labels: lambda {lam * 1000:.1f} ms, groupby max {grouped * 1000:.1f} ms, offsets {vectorised * 1000:.1f} ms")
+
+    ctx = mp.get_context('spawn')
+    print(f"{'fit':>8} {'time (s)':>9} {'peak MiB':>9}")
+    for variant in ['legacy', 'frame', 'arrays']:
+        results = ctx.Queue()
+        proc = ctx.Process(target=fit_variant, args=(variant, args.trees, args.scale, results))
+        proc.start()
+        elapsed, peak = results.get()
+        proc.join()
+        print(f"{variant:>8} {elapsed:>9.2f} {peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# Cost of absorbing one new cycle for every engine in a fleet: StreamingRULTracker
+# vs re-running PointPredictorRegressor.predict_units on the full history
+#   python benchmarks/bench_streaming.py
+import argparse
+
+from common import load_model, synthetic_fleet, timeit
+from streaming import StreamingRULTracker
+from tree_engine import compile_model
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--end-points', type=int, default=10)
+    args = parser.parse_args()
+
+    model = compile_model(load_model('regressor'))
+    print(f"{'units':>8} {'history rows':>13} {'full rerun (ms)':>16} {'streaming (ms)':>15}")
+    for n_units in args.units:
+        fleet = synthetic_fleet(n_units)
+        last_cycle = fleet.groupby('unit').tail(1)
+        history = fleet.drop(last_cycle.index)
+
+        tracker = StreamingRULTracker(model, end_points=args.end_points)
+        tracker.update(history)
+        # Pushing the same cycle repeatedly keeps the state size constant between repeats
+        stream = timeit(lambda: tracker.update(last_cycle), repeat=5)
+        rerun = timeit(lambda: model.predict_units(fleet, end_points=args.end_points), repeat=3)
+        print(f"{n_units:>8} {len(fleet):>13} {rerun * 1e3:>16.2f} {stream * 1e3:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# sklearn RandomForestRegressor.predict vs the compiled array-backed forest
+#   python benchmarks/bench_tree_engine.py
+import argparse
+
+import numpy as np
+
+from common import load_model, synthetic_fleet, timeit
+from tree_engine import compile_forest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 10, 100, 1000, 10000, 100000])
+    args = parser.parse_args()
+
+    model = load_model('point')
+    forest = model.regressor
+    compiled = compile_forest(forest)
+
+    fleet = synthetic_fleet(max(1, max(args.rows) // 100))
+    X = model._preprocess(fleet[model.feature_names])
+    X = X.iloc[np.resize(np.arange(len(X)), max(args.rows))]
+
+    # The pure NumPy walk is timed without the sklearn fallback for large batches
+    print(f"{'rows':>8} {'sklearn (ms)':>13} {'compiled (ms)':>14} {'speedup':>8} {'max |diff|':>11}")
+    for n_rows in args.rows:
+        batch = X.iloc[:n_rows]
+        diff = np.abs(forest.predict(batch) - compiled.predict(batch)).max()
+        repeat = 20 if n_rows <= 1000 else 3
+        sk = timeit(lambda: forest.predict(batch), repeat=repeat) * 1e3
+        fast = timeit(lambda: compiled.predict(batch), repeat=repeat) * 1e3
+        print(f"{n_rows:>8} {sk:>13.3f} {fast:>14.3f} {sk / fast:>7.1f}x {diff:>11.2e}")
+
+
+if __name__ == '__main__':
+    main()
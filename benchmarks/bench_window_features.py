@@ -0,0 +1,58 @@
+# Rolling mean/std/slope + EWMA of every sensor for a whole fleet: pandas
+# groupby().rolling / ewm vs window_features (cumulative sums, one pass), then fit and
+# fleet prediction of RollingFeaturePredictor next to PointPredictor with the same
+# forest settings. The pandas slope (rolling apply with polyfit) is only timed on
+# the smallest fleet, it takes minutes beyond that.
+#   python benchmarks/bench_window_features.py --units 100 1000 --trees 20
+import argparse
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from common import FEATURES, generate_fleet, timeit
+from custom_models import PointPredictor, RollingFeaturePredictor, unit_offsets
+from tree_engine import compile_model
+from window_features import window_features
+
+
+def pandas_features(fleet, window, alpha, slope=False):
+    groups = fleet.groupby('unit')[FEATURES]
+    rolling = groups.rolling(window, min_periods=1)
+    out = [rolling.mean(), rolling.std(ddof=0), groups.transform(lambda c: c.ewm(alpha=alpha, adjust=False).mean())]
+    if slope:
+        x = lambda y: np.polyfit(np.arange(len(y)), y, 1)[0] if len(y) > 1 else 0.0
+        out.append(rolling.apply(x, raw=True))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--window', type=int, default=10)
+    parser.add_argument('--alpha', type=float, default=0.3)
+    parser.add_argument('--trees', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'units':>6} {'rows':>8} {'pandas (ms)':>12} {'+slope (ms)':>12} {'engine (ms)':>12}")
+    for i, n_units in enumerate(args.units):
+        fleet = generate_fleet(n_units, seed=5)
+        values = fleet[FEATURES].to_numpy(np.float64)
+        offsets = unit_offsets(fleet['unit'].to_numpy())
+        pandas = timeit(lambda: pandas_features(fleet, args.window, args.alpha))
+        with_slope = timeit(lambda: pandas_features(fleet, args.window, args.alpha, slope=True), repeat=1) if i == 0 else None
+        engine = timeit(lambda: window_features(values, offsets, args.window, args.alpha))
+        print(f"{n_units:>6} {len(fleet):>8} {pandas * 1e3:>12.1f} {f'{with_slope * 1e3:.1f}' if with_slope else '-':>12} {engine * 1e3:>12.1f}")
+
+    train = generate_fleet(100, seed=6, truncate=False)
+    test = generate_fleet(1000, seed=7)
+    print(f"\n{'model':<24} {'fit (s)':>8} {'predict 1000 units (ms)':>24}")
+    for cls in [PointPredictor, RollingFeaturePredictor]:
+        model = cls(RandomForestRegressor(max_depth=10, n_estimators=args.trees, random_state=42, n_jobs=1))
+        fit = timeit(lambda: model.fit(train), repeat=1)
+        served = compile_model(model)
+        predict = timeit(lambda: served.predict_units(test))
+        print(f"{cls.__name__:<24} {fit:>8.2f} {predict * 1e3:>24.1f}")
+
+
+if __name__ == '__main__':
+    main()
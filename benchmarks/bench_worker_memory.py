@@ -0,0 +1,75 @@
+# Resident memory per worker when N processes each load the model, comparing the
+# plain joblib pickle with the memory-mapped artifact from utils.save_model_artifact.
+# Pss splits shared pages between the processes mapping them, so sum(Pss) is the
+# real footprint of the whole pool. Linux only (reads /proc/self/smaps_rollup).
+#   python benchmarks/bench_worker_memory.py --workers 8
+import argparse
+import multiprocessing as mp
+import os
+
+from common import CACHE_DIR, load_model, synthetic_fleet
+
+
+def memory_kb():
+    usage = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                usage[parts[0][:-1]] = int(parts[1])
+    return usage
+
+
+def worker(mode, path, sample, ready, release, results):
+    import joblib
+    import sklearn.ensemble  # noqa: F401  (same imports in every mode, model or not)
+    from utils import load_model_artifact
+
+    if mode != 'none':
+        model = joblib.load(path) if mode == 'joblib' else load_model_artifact(path)
+        model.predict(sample)  # touch the model like a first request would
+    ready.wait()  # measure only once every worker holds its copy
+    results.put(memory_kb())
+    release.wait()
+
+
+def measure(mode, path, n_workers, sample):
+    ctx = mp.get_context('spawn')  # like gunicorn without --preload: nothing inherited
+    ready, release, results = ctx.Barrier(n_workers + 1), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, sample, ready, release, results)) for _ in range(n_workers)]
+    for proc in procs:
+        proc.start()
+    ready.wait()
+    rows = [results.get() for _ in procs]
+    release.set()
+    for proc in procs:
+        proc.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    from utils import save_model_artifact
+
+    model = load_model('point')
+    joblib_path = os.path.join(CACHE_DIR, 'model_point.joblib')
+    mmap_path = save_model_artifact(model, os.path.join(CACHE_DIR, 'model_point.mmap.joblib'))
+    sample = synthetic_fleet(5)
+
+    # 'none' loads no model at all; the other rows are reported relative to it
+    print(f"{args.workers} workers, MiB per worker (model cost = total minus the no-model baseline)")
+    print(f"{'artifact':>9} {'Rss':>8} {'Pss':>8} {'model Rss':>10} {'model Pss':>10} {'pool Pss':>9}")
+    baseline = None
+    for mode, path in [('none', None), ('joblib', joblib_path), ('mmap', mmap_path)]:
+        rows = measure(mode, path, args.workers, sample)
+        rss = sum(row['Rss'] for row in rows) / len(rows) / 1024
+        pss = sum(row['Pss'] for row in rows) / len(rows) / 1024
+        baseline = baseline or (rss, pss)
+        print(f"{mode:>9} {rss:>8.1f} {pss:>8.1f} {rss - baseline[0]:>10.1f} {pss - baseline[1]:>10.1f} {(pss - baseline[1]) * len(rows):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
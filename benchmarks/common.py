@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(ROOT, 'src'))
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from custom_models import PointPredictor, PointPredictorRegressor, RollingFeaturePredictor
+from ingest import COLUMNS, FEATURES, load_cmapss, to_frame
+
+DATASET_DIR = os.path.join(ROOT, 'dataset')
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '.cache')
+
+MODEL_CLASSES = {
+    'point': PointPredictor,
+    'regressor': PointPredictorRegressor,
+    'rolling': RollingFeaturePredictor
+}
+
+
+def read_cmapss(name):
+    return load_cmapss(os.path.join(DATASET_DIR, name))
+
+
+# Production-shaped model (same forest settings as the notebook), trained once and cached
+def load_model(kind='point'):
+    path = os.path.join(CACHE_DIR, f'model_{kind}.joblib')
+    if os.path.exists(path):
+        return joblib.load(path)
+
+    regressor = RandomForestRegressor(max_depth=10, n_estimators=100, random_state=42, n_jobs=-1)
+    model = MODEL_CLASSES[kind](regressor).fit(read_cmapss('train_FD001.txt'))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    joblib.dump(model, path)
+    return model
+
+
+# Fleet of n_units engines built by resampling real FD001 test trajectories
+def synthetic_fleet(n_units, seed=0):
+    source = read_cmapss('test_FD001.txt')
+    groups = [group for _, group in source.groupby('unit')]
+    rng = np.random.default_rng(seed)
+
+    picks = rng.integers(0, len(groups), n_units)
+    fleet = pd.concat([groups[i] for i in picks], ignore_index=True)
+    fleet['unit'] = np.repeat(np.arange(1, n_units + 1), [len(groups[i]) for i in picks])
+    return fleet
+
+
+# Statistics of a CMAPSS train set for generate_fleet: every feature's mean path over
+# the life fraction (cycle / failure cycle) as a polynomial, the covariance of the
+# per-unit offsets from that path, the covariance of the remaining per-cycle noise and
+# the observed lifetimes
+def fleet_statistics(name='train_FD001.txt', degree=3):
+    df = read_cmapss(name)
+    life = df.groupby('unit')['cycle'].transform('max').to_numpy()
+    basis = np.vander(df['cycle'].to_numpy() / life, degree + 1)
+    values = df[FEATURES].to_numpy(np.float64)
+    coef = np.linalg.lstsq(basis, values, rcond=None)[0]
+
+    residual = pd.DataFrame(values - basis @ coef).groupby(df['unit'].to_numpy())
+    unit_offset = residual.transform('mean').to_numpy()
+    return {
+        'coef': coef,
+        'unit_cov': np.cov(residual.mean().to_numpy(), rowvar=False),
+        'noise_cov': np.cov(values - basis @ coef - unit_offset, rowvar=False),
+        'lifetimes': df.groupby('unit')['cycle'].max().to_numpy()
+    }
+
+
+def _correlated_normal(rng, cov, size):
+    # cov can be singular (constant sensors), so factor it through its eigenvectors
+    eigval, eigvec = np.linalg.eigh(cov)
+    return rng.standard_normal((size, len(cov))) @ (eigvec * np.sqrt(np.clip(eigval, 0, None))).T
+
+
+# Synthetic fleet with the statistics of a real train set: lifetimes resampled from
+# the observed ones, sensor paths following the fitted degradation curves plus
+# correlated per-unit offsets and per-cycle noise. With truncate=True every unit
+# stops at a random point of its life, like the test sets. Same seed, same fleet.
+def generate_fleet(n_units, seed=0, truncate=True, stats=None):
+    stats = stats or fleet_statistics()
+    rng = np.random.default_rng(seed)
+    lifetimes = rng.choice(stats['lifetimes'], n_units)
+    observed = rng.integers(np.minimum(31, lifetimes), lifetimes + 1) if truncate else lifetimes
+
+    units = np.repeat(np.arange(1, n_units + 1), observed)
+    cycles = np.arange(len(units)) - np.repeat(np.cumsum(observed) - observed, observed) + 1
+    basis = np.vander(cycles / np.repeat(lifetimes, observed), stats['coef'].shape[0])
+    features = basis @ stats['coef']
+    features += np.repeat(_correlated_normal(rng, stats['unit_cov'], n_units), observed, axis=0)
+    features += _correlated_normal(rng, stats['noise_cov'], len(units))
+
+    ids = np.column_stack([units, cycles]).astype(np.int32)
+    return to_frame(ids, features)
+
+
+def timeit(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,143 @@
+# Load test for the bulk scoring API (POST /api/v1/rul): N concurrent clients send
+# fleets back to back for a fixed time; reports requests/s, units/s and latency
+# percentiles per concurrency level. Without --url the app is started in a child
+# process on a threaded werkzeug server with the benchmark model and the
+# prediction cache disabled, so every request really runs the forest.
+#   python benchmarks/load_test_api.py --clients 1 4 16 --units 100 --format csv
+#   python benchmarks/load_test_api.py --url http://localhost:8050 --clients 32
+#   python benchmarks/load_test_api.py --query 'interval=1&budget_ms=5'   # anytime mode
+import argparse
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from common import CACHE_DIR, COLUMNS, ROOT, load_model, synthetic_fleet
+
+CONTENT_TYPES = {'csv': 'text/csv', 'json': 'application/json', 'npy': 'application/x-npy'}
+
+
+def encode(fleet, payload_format):
+    if payload_format == 'csv':
+        return fleet.to_csv(index=False).encode()
+    if payload_format == 'json':
+        return json.dumps(fleet[COLUMNS].to_dict('list')).encode()
+    buffer = io.BytesIO()
+    np.save(buffer, fleet[COLUMNS].to_numpy(np.float64))
+    return buffer.getvalue()
+
+
+def serve(port):
+    from werkzeug.serving import make_server
+    import app
+
+    app.model_registry.load()
+    make_server('127.0.0.1', port, app.server, threaded=True).serve_forever()
+
+
+def start_server(port, cache):
+    env = dict(os.environ,
+               MODEL_PATH=os.path.join(CACHE_DIR, 'model_point.joblib'),
+               SCALER_PATH=os.path.join(ROOT, 'artifacts', 'scaler.pkl'),
+               MODEL_LOAD_MODE='lazy',
+               HISTORY_DB_PATH=os.path.join(tempfile.gettempdir(), 'pm_load_test.sqlite3'))
+    if not cache:
+        env['PREDICTION_CACHE_SIZE'] = '0'
+    load_model('point')  # make sure the cached benchmark model exists
+    proc = subprocess.Popen([sys.executable, __file__, '--serve', str(port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    for _ in range(600):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Server did not become ready.")
+
+
+def client(url, path, body, content_type, deadline, latencies, errors):
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=body, headers={'Content-Type': content_type})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except OSError:
+            conn.close()
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+
+
+def run(url, path, n_clients, body, content_type, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, path, body, content_type, deadline, latencies, errors))
+               for _ in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies) * 1000, len(errors), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='running server; by default one is started locally')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--units', type=int, default=100)
+    parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--cache', action='store_true', help='keep the prediction cache enabled')
+    parser.add_argument('--query', default='', help='query string for /api/v1/rul, e.g. interval=1&budget_ms=5')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve)
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc = start_server(args.port, args.cache)
+        url = f'http://127.0.0.1:{args.port}'
+
+    try:
+        fleet = synthetic_fleet(args.units)
+        body = encode(fleet, args.format)
+        print(f"{args.units} units ({len(fleet)} rows) per request, {args.format} payload of {len(body) / 1024:.0f} KiB")
+        print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'units/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for n_clients in args.clients:
+            path = '/api/v1/rul' + (f'?{args.query}' if args.query else '')
+            latencies, n_errors, elapsed = run(url, path, n_clients, body, CONTENT_TYPES[args.format], args.duration)
+            rps = len(latencies) / elapsed
+            p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (float('nan'),) * 2
+            print(f"{n_clients:>8} {len(latencies):>9} {n_errors:>7} {rps:>8.1f} {rps * args.units:>9.0f} {p50:>8.1f} {p99:>8.1f}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# Benchmark suite: upload parsing, fleet prediction, the regressor's end_points,
+# training, window features and figure construction, all on synthetic fleets
+# generated from the statistics of train_FD001 (common.generate_fleet, fixed seeds).
+# Every run is appended to a JSON history file together with the commit and library
+# versions, and compared with the last run on the same machine so regressions stand out.
+#   python benchmarks/run_suite.py                 # full suite
+#   python benchmarks/run_suite.py --quick -k predict_rul
+#   python benchmarks/run_suite.py --fail-on-regression 1.25
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import FEATURES, ROOT, fleet_statistics, generate_fleet, load_model
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), 'results', 'history.json')
+
+
+class Case:
+    def __init__(self, name, func, setup=None, repeat=5, **params):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.repeat = repeat
+        self.params = params
+
+    def run(self):
+        times = []
+        for _ in range(self.repeat):
+            if self.setup is not None:
+                self.setup()
+            start = time.perf_counter()
+            self.func()
+            times.append(time.perf_counter() - start)
+        return {'best': min(times), 'median': statistics.median(times), 'repeat': self.repeat, **self.params}
+
+
+def upload_cases(stats, quick):
+    # The Dash callback itself, with an empty upload cache before every call so each
+    # repetition really parses the file
+    os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+    import app
+    from data_cache import DatasetCache
+
+    cache_dir = os.path.join(tempfile.gettempdir(), 'pm_bench_upload_cache')
+
+    def fresh_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        app.upload_cache = DatasetCache(cache_dir)
+
+    cases = []
+    for n_units in [1, 100] if quick else [1, 100, 1000]:
+        fleet = generate_fleet(n_units, seed=1, stats=stats)
+        contents = 'data:text/csv;base64,' + base64.b64encode(fleet.to_csv(index=False).encode()).decode()
+        cases.append(Case(f'process_upload[{n_units}]', lambda c=contents: app.process_upload(c, 'fleet.csv'),
+                          setup=fresh_cache, units=n_units, rows=len(fleet), bytes=len(contents)))
+    return cases
+
+
+def predict_cases(stats, quick):
+    from tree_engine import compile_model
+    from utils import predict_rul, prediction_cache
+
+    model = compile_model(load_model('point'))  # as served (see config.COMPILED_FOREST)
+    cases = []
+    for n_units in [1, 100] if quick else [1, 100, 10000]:
+        fleet = generate_fleet(n_units, seed=2, stats=stats)
+        cases.append(Case(f'predict_rul[{n_units}]', lambda f=fleet: predict_rul(model, None, f),
+                          setup=prediction_cache.clear, units=n_units, rows=len(fleet)))
+    return cases
+
+
+def regressor_cases(stats, quick):
+    model = load_model('regressor')
+    fleet = generate_fleet(100, seed=3, stats=stats)
+    return [
+        Case(f'regressor_predict[end_points={end_points}]',
+             lambda e=end_points: model.predict(fleet, end_points=e), units=100, end_points=end_points)
+        for end_points in ([1, 10] if quick else [1, 5, 10, 20, 50])
+    ]
+
+
+def fit_cases(stats, quick):
+    from sklearn.ensemble import RandomForestRegressor
+    from custom_models import PointPredictor
+
+    fleet = generate_fleet(100, seed=4, truncate=False, stats=stats)
+    n_trees = 5 if quick else 20
+    fit = lambda: PointPredictor(RandomForestRegressor(max_depth=10, n_estimators=n_trees, random_state=42, n_jobs=1)).fit(fleet)
+    return [Case('point_predictor_fit', fit, repeat=3, units=100, rows=len(fleet), trees=n_trees)]
+
+
+def window_feature_cases(stats, quick):
+    from custom_models import unit_offsets
+    from window_features import last_window_features, window_features
+
+    cases = []
+    for n_units in [100] if quick else [100, 1000]:
+        fleet = generate_fleet(n_units, seed=5, stats=stats)
+        values, offsets = fleet[FEATURES].to_numpy(np.float64), unit_offsets(fleet['unit'].to_numpy())
+        cases.append(Case(f'window_features[{n_units}]', lambda v=values, o=offsets: window_features(v, o),
+                          units=n_units, rows=len(fleet)))
+        cases.append(Case(f'last_window_features[{n_units}]', lambda v=values, o=offsets: last_window_features(v, o),
+                          units=n_units, rows=len(fleet)))
+    return cases
+
+
+def figure_cases(stats, quick):
+    import utils
+
+    model = load_model('point')
+    history = [{'equipment': 'E1', 'unit': int(unit), 'cycle': int(cycle), 'rul': float(rul)}
+               for unit, cycle, rul in zip(np.arange(50) % 5, np.arange(50), np.linspace(150, 20, 50))]
+    return [
+        # The figure is memoized per model; drop it so every call builds it
+        Case('feature_importance_figure', lambda: utils.get_feature_importance(model, FEATURES),
+             setup=lambda: utils._importance_figures.pop(model, None)),
+        Case('trend_figure[50]', lambda: utils.get_trend_figure(history), entries=50)
+    ]
+
+
+SUITES = [upload_cases, predict_cases, regressor_cases, fit_cases, window_feature_cases, figure_cases]
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+
+    import pandas
+    import sklearn
+    return {
+        'commit': commit or None,
+        'dirty': dirty,
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def load_history(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def save_history(path, history):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-k', dest='pattern', help='only run cases whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes, for a fast check')
+    parser.add_argument('--history', default=HISTORY_PATH)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--fail-on-regression', type=float, metavar='RATIO',
+                        help='exit with status 1 if a case is this many times slower than the last run')
+    args = parser.parse_args()
+
+    stats = fleet_statistics()
+    env = environment()
+    history = load_history(args.history)
+    previous = next((run for run in reversed(history)
+                     if run['env']['machine'] == env['machine'] and run['quick'] == args.quick), None)
+
+    print(f"commit {env['commit']}{' (dirty)' if env['dirty'] else ''}, compared with "
+          f"{previous['env']['commit'] + ' from ' + previous['timestamp'] if previous else 'nothing'}")
+    print(f"{'case':<40} {'best (ms)':>10} {'median (ms)':>12} {'vs last':>8}")
+    results, regressions = {}, []
+    for suite in SUITES:
+        for case in suite(stats, args.quick):
+            if args.pattern and args.pattern not in case.name:
+                continue
+            result = results[case.name] = case.run()
+            last = previous['results'].get(case.name) if previous else None
+            ratio = result['best'] / last['best'] if last else None
+            if ratio and args.fail_on_regression and ratio > args.fail_on_regression:
+                regressions.append(case.name)
+            print(f"{case.name:<40} {result['best'] * 1000:>10.2f} {result['median'] * 1000:>12.2f} "
+                  f"{f'{ratio:.2f}x' if ratio else '-':>8}")
+
+    if not args.no_save:
+        history.append({
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'quick': args.quick,
+            'env': env,
+            'results': results
+        })
+        save_history(args.history, history)
+        print(f"Saved to {os.path.relpath(args.history)}")
+
+    if regressions:
+        print(f"Slower than {args.fail_on_regression}x the last run: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import json
+
+import flask
+
+import config
+import metrics
+
+# Content types accepted by the scoring endpoint, mapped to the ingest parser name
+PAYLOAD_FORMATS = {
+    'text/csv': 'csv',
+    'text/plain': 'csv',
+    'application/gzip': 'csv',
+    'application/json': 'json',
+    'application/x-npy': 'npy',
+    'application/octet-stream': 'npy',
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/vnd.apache.arrow.file': 'arrow'
+}
+
+
+def _error(message, status):
+    return flask.jsonify({'error': message}), status
+
+
+# The request body, or None when it is longer than limit bytes. Chunked requests
+# have no Content-Length, so the limit is enforced while reading.
+def _read_body(request, limit):
+    raw = request.stream.read(limit + 1)
+    return None if len(raw) > limit else raw
+
+
+def _parse(payload_format, raw):
+    import ingest
+
+    if payload_format == 'json':
+        try:
+            return ingest.from_columns(json.loads(raw))
+        except ValueError as e:
+            if isinstance(e, ingest.SchemaError):
+                raise
+            raise ingest.SchemaError("Request body is not valid JSON.") from e
+    if payload_format == 'npy':
+        return ingest.from_npy(raw)
+    if payload_format == 'arrow':
+        return ingest.from_arrow(raw)
+    return ingest.read_frame(raw)
+
+
+# Machine-to-machine scoring on the Flask server, without the Dash callback machinery.
+# POST a fleet (CSV / raw CMAPSS text, column-oriented JSON, .npy or Arrow) to
+# /api/v1/rul and get the RUL of every unit back as column-oriented JSON.
+# ?model=<id> scores with one model of the registry; without it (or with "auto") the
+# model is picked from the fleet's operating settings, see model_registry.py.
+# ?interval=1 adds rul_std, rul_low and rul_high (the 90% range of the forest's trees)
+# and n_trees; tolerance=<cycles> and budget_ms=<ms> (defaults ANYTIME_TOLERANCE and
+# ANYTIME_BUDGET_MS) let it stop early, see tree_engine.predict_anytime.
+def create_api(model_registry):
+    api = flask.Blueprint('api', __name__, url_prefix='/api/v1')
+
+    @api.route('/rul', methods=['POST'])
+    def score():
+        from ingest import SchemaError
+        from tree_engine import NoTreesError
+        from utils import predict_rul_intervals, predict_rul_units
+
+        content_type = (flask.request.mimetype or '').lower()
+        payload_format = PAYLOAD_FORMATS.get(content_type)
+        if payload_format is None:
+            return _error(f"Unsupported content type {content_type!r}; use one of {', '.join(PAYLOAD_FORMATS)}.", 415)
+        max_bytes = config.API_MAX_MB * 1024 * 1024
+        if (flask.request.content_length or 0) > max_bytes:
+            return _error(f"Payload is larger than {config.API_MAX_MB} MB.", 413)
+
+        interval = flask.request.args.get('interval', '').lower() in ('1', 'true', 'yes', 'on')
+        try:
+            tolerance = float(flask.request.args.get('tolerance', config.ANYTIME_TOLERANCE))
+            budget = float(flask.request.args.get('budget_ms', config.ANYTIME_BUDGET_MS)) / 1000
+        except ValueError:
+            return _error("tolerance and budget_ms must be numbers.", 400)
+
+        raw = _read_body(flask.request, max_bytes)
+        if raw is None:
+            return _error(f"Payload is larger than {config.API_MAX_MB} MB.", 413)
+        metrics.observe_payload('api_rul', len(raw))
+        try:
+            with metrics.timed('api_parse'):
+                df = _parse(payload_format, raw)
+        except SchemaError as e:
+            return _error(str(e), 400)
+        except ImportError:
+            return _error("Arrow payloads require pyarrow on the server.", 415)
+
+        try:
+            model, scaler, model_id = model_registry.get(flask.request.args.get('model'), df, timeout=config.MODEL_WAIT_SECONDS)
+        except KeyError as e:
+            return _error(e.args[0], 404)
+        except (TimeoutError, RuntimeError) as e:
+            return _error(str(e), 503)
+
+        try:
+            if interval:
+                table = predict_rul_intervals(model, scaler, df, tolerance or None, budget or None)
+            else:
+                table = predict_rul_units(model, scaler, df)
+        except NoTreesError as e:
+            return _error(f"Model {model_id} has no prediction intervals: {e}", 501)
+        except Exception as e:
+            return _error(f"Prediction error: {e}", 500)
+
+        result = table.to_dict('list')
+        result['n_rows'] = len(df)
+        result['n_units'] = len(table)
+        result['model'] = model_id
+        return flask.jsonify(result)
+
+    return api
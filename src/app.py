@@ -2,32 +2,118 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-import dash
-from dash import html, dcc, dash_table
-from dash.dependencies import Input, Output, State
-import plotly.express as px
-from app_components import (
-    header, input_form, prediction_card, prediction_history_table,
-    model_details, feature_importance_plot, prediction_trend_plot, footer
-)
-from utils import load_model_and_scaler, predict_rul, get_feature_importance
-import pandas as pd
-import base64
-import io
+import startup
+
+# pandas, plotly.express, sklearn and the model itself are only loaded when first
+# needed; startup.phase records how long each step of a cold start takes
+with startup.phase('import dash'):
+    import dash
+    from dash import html, dcc, Patch
+    from dash.dependencies import Input, Output, State
+    import flask
+
+with startup.phase('import app modules'):
+    from app_components import (
+        header, input_form, prediction_card, prediction_history_table,
+        model_details, feature_importance_plot, prediction_trend_plot, footer
+    )
+    import config
+    import metrics
+    from model_registry import ModelRegistry
+    from data_cache import DatasetCache
+    from history_store import HistoryStore
+    from api import create_api
+    import jobs
+    import base64
+    import time
+    import urllib.parse
 
 # Initialize Dash app
-app = dash.Dash(__name__, external_stylesheets=[
-    'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css',
-    '/assets/tailwind.css'
-])
+with startup.phase('create dash app'):
+    app = dash.Dash(__name__, external_stylesheets=[
+        'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css',
+        '/assets/tailwind.css'
+    ])
 
 server = app.server
+metrics.install_request_profiler(server, config.PROFILE_REQUESTS, config.PROFILE_DIR)
+
+# Models by ID (see config.MODEL_REGISTRY); the default one is loaded according to
+# config.MODEL_LOAD_MODE, any others on first use
+micro_batch = {'max_batch_rows': config.MICRO_BATCH_MAX_ROWS, 'max_wait': config.MICRO_BATCH_WAIT_MS / 1000} if config.MICRO_BATCH else None
+model_registry = ModelRegistry(config.MODEL_REGISTRY, config.MODEL_PATH, config.SCALER_PATH,
+                               max_bytes=config.MODEL_CACHE_MB * 1024 * 1024, reload_seconds=config.MODEL_RELOAD_SECONDS,
+                               compiled=config.COMPILED_FOREST, fallback=config.COMPILED_FALLBACK, mmap=config.MODEL_MMAP,
+                               micro_batch=micro_batch)
+if config.MODEL_LOAD_MODE == 'eager':
+    model_registry.load()
+elif config.MODEL_LOAD_MODE == 'background':
+    model_registry.start()
+
+# Parsed uploads stay on the server; the browser store only holds the cache key
+upload_cache = DatasetCache(config.UPLOAD_CACHE_DIR, max_bytes=config.UPLOAD_CACHE_MAX_MB * 1024 * 1024)
+
+# Readiness probe: 200 once the default model is loaded, 503 while loading or after a
+# failure
+@server.route('/health')
+def health():
+    from utils import prediction_cache
+    status = model_registry.status()
+    status['prediction_cache'] = prediction_cache.stats()
+    batcher = getattr(getattr(model_registry.loader().model, 'regressor', None), 'batcher', None)
+    if batcher is not None:
+        status['micro_batch'] = batcher.stats()
+    return flask.jsonify(status), 200 if status['status'] == 'ready' else 503
 
-# Load model and scaler
-model, scaler = load_model_and_scaler()
+# Prometheus scrape target: stage latencies, payload sizes and row/unit counts of
+# this worker (see metrics.py)
+@server.route('/metrics')
+def metrics_endpoint():
+    from utils import prediction_cache
+    cache = prediction_cache.stats()
+    metrics.registry.set('pm_prediction_cache_hits_total', cache['hits'])
+    metrics.registry.set('pm_prediction_cache_misses_total', cache['misses'])
+    metrics.registry.set('pm_prediction_cache_entries', cache['size'])
+    metrics.registry.set('pm_model_ready', int(model_registry.loader().state == 'ready'))
+    models = model_registry.status()['models'].values()
+    metrics.registry.set('pm_models_resident', sum(model['state'] == 'ready' for model in models))
+    metrics.registry.set('pm_models_resident_bytes', model_registry.resident_bytes())
+    return flask.Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
-# Features expected by the model (updated to include all features the model was trained on)
-FEATURES = ['setting1', 'setting2', 'setting3'] + [f'sensor{i}' for i in range(1, 22)]
+# REST scoring endpoints for bulk, programmatic predictions
+server.register_blueprint(create_api(model_registry))
+
+# Every prediction is kept in SQLite; the browser only receives the visible page
+history_store = HistoryStore(config.HISTORY_DB_PATH)
+
+# Exports are streamed straight from the database, filtered like the History table
+# (including the client's last Reset, see EMPTY_HISTORY_META)
+def _since():
+    return flask.request.args.get('since', 0, type=int)
+
+@server.route('/history/export.csv')
+def export_history_csv():
+    rows = metrics.stream('history_export_csv', history_store.iter_csv(flask.request.args.get('filter'), since=_since()))
+    return flask.Response(flask.stream_with_context(rows), mimetype='text/csv',
+                          headers={'Content-Disposition': 'attachment; filename=prediction_report.csv'})
+
+@server.route('/history/export.parquet')
+def export_history_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "Parquet export requires pyarrow.", 501
+    chunks = metrics.stream('history_export_parquet', history_store.iter_parquet(flask.request.args.get('filter'), since=_since()))
+    return flask.Response(flask.stream_with_context(chunks), mimetype='application/vnd.apache.parquet',
+                          headers={'Content-Disposition': 'attachment; filename=prediction_report.parquet'})
+
+# The trend plot shows this client's latest predictions (since the page was loaded or
+# Reset); the meta store remembers which trend trace each of them went to, so updates
+# can be sent as patches. since is the last
+# history id when this client pressed Reset: the database is shared by every user, so
+# Reset only hides the older rows (python src/history_store.py purge deletes them).
+HISTORY_LIMIT = 50
+EMPTY_HISTORY_META = {'units': [], 'entries': [], 'importance': None, 'since': 0}
 
 # App layout with space-themed background and tabs
 app.layout = html.Div(className='min-h-screen flex flex-col', style={
@@ -41,7 +127,7 @@ app.layout = html.Div(className='min-h-screen flex flex-col', style={
         dcc.Tabs(id='tabs', value='input-tab', className='custom-tabs', children=[
             dcc.Tab(label='Input & Prediction', value='input-tab', className='custom-tab', selected_className='custom-tab--selected', children=[
                 html.Div(className='bg-gray-800 bg-opacity-90 p-6 rounded-lg shadow-lg mt-4', children=[
-                    input_form(),
+                    input_form(model_registry.ids()),
                     prediction_card()
                 ])
             ]),
@@ -54,7 +140,7 @@ app.layout = html.Div(className='min-h-screen flex flex-col', style={
             ]),
             dcc.Tab(label='History', value='history-tab', className='custom-tab', selected_className='custom-tab--selected', children=[
                 html.Div(className='mt-4', children=[
-                    prediction_history_table()
+                    prediction_history_table(page_size=config.HISTORY_PAGE_SIZE)
                 ])
             ])
         ])
@@ -62,7 +148,10 @@ app.layout = html.Div(className='min-h-screen flex flex-col', style={
     footer(),
     # Stores
     dcc.Store(id='uploaded-data', data=None),
-    dcc.Store(id='prediction-history', data=[])
+    dcc.Store(id='history-version', data=0),
+    dcc.Store(id='prediction-history-meta', data=EMPTY_HISTORY_META),
+    dcc.Store(id='prediction-history-cursors', data=None),
+    dcc.Store(id='prediction-job-report', data=None)
 ])
 
 # Callback to process uploaded CSV
@@ -78,62 +167,86 @@ def process_upload(contents, filename):
     if contents is None:
         return None, "Please upload a CSV file."
 
+    from ingest import SchemaError, read_frame
+
     try:
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-
-        # Validate required columns
-        required_columns = ['unit', 'cycle'] + FEATURES
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return None, f"Error: Missing required columns: {', '.join(missing_columns)}"
-
-        # Validate data types
-        for col in FEATURES:
-            if not pd.api.types.is_numeric_dtype(df[col]):
-                return None, f"Error: Column '{col}' must contain numeric values."
-
-        return df.to_dict('records'), f"Successfully uploaded {filename}."
+        with metrics.timed('process_upload'):
+            content_type, content_string = contents.split(',')
+            decoded = base64.b64decode(content_string)
+            metrics.observe_payload('process_upload', len(decoded))
+            key = upload_cache.key_for(decoded)
+            df = upload_cache.get(key) if key in upload_cache else None
+            if df is None:
+                # Parsed straight from the decoded bytes into the fixed schema;
+                # also accepts raw CMAPSS text and gzipped files
+                df = read_frame(decoded)
+                del contents, content_string, decoded
+                upload_cache.put(key, df)
+        metrics.observe_counts('process_upload', rows=len(df), units=df['unit'].nunique())
+        return {'key': key, 'rows': len(df)}, f"Successfully uploaded {filename}."
+    except SchemaError as e:
+        return None, f"Error: {str(e)}"
     except Exception as e:
         return None, f"Error processing file: {str(e)}"
 
-# Callback to update prediction and plots
+# Reset the history view (the only full re-render of the prediction outputs)
 @app.callback(
     [
-        Output('prediction-output', 'children'),
-        Output('feature-importance-plot', 'figure'),
-        Output('prediction-trend-plot', 'figure'),
-        Output('prediction-history', 'data'),
-        Output('prediction-history-table', 'children')
+        Output('prediction-output', 'children', allow_duplicate=True),
+        Output('feature-importance-plot', 'figure', allow_duplicate=True),
+        Output('prediction-trend-plot', 'figure', allow_duplicate=True),
+        Output('history-version', 'data', allow_duplicate=True),
+        Output('prediction-history-meta', 'data', allow_duplicate=True)
     ],
-    [
-        Input('predict-button', 'n_clicks'),
-        Input('reset-history-button', 'n_clicks')
-    ],
-    [
-        State('uploaded-data', 'data'),
-        State('equipment-name', 'value'),
-        State('prediction-history', 'data')
-    ]
+    Input('reset-history-button', 'n_clicks'),
+    State('history-version', 'data'),
+    prevent_initial_call=True
 )
-def update_output(predict_clicks, reset_clicks, uploaded_data, equipment_name, prediction_history):
-    ctx = dash.callback_context
-    triggered_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else None
+def reset_history(reset_clicks, version):
+    return "Prediction history reset.", {}, {}, (version or 0) + 1, {**EMPTY_HISTORY_META, 'since': history_store.last_id()}
+
+# Callback to update prediction and plots. The entry is written to the history
+# database and, after the first prediction, the trend plot is sent as dash.Patch appends.
+# It runs as a background job when diskcache is available (see config.BACKGROUND_JOBS):
+# the request returns at once, the browser polls for progress and the result, and
+# Cancel kills the job's processes. The job does all the work (model, upload, scoring,
+# figures); what it records in memory dies with it, so its new cache rows and metrics
+# are returned in the job report, for store_job_report to keep in the app's process.
+def update_output(set_progress, predict_clicks, uploaded_data, equipment_name, model_choice, meta, version):
+    unchanged = [dash.no_update] * 4
+    version = (version or 0) + 1
 
-    # Reset history if reset button clicked
-    if triggered_id == 'reset-history-button':
-        return "Prediction history reset.", {}, {}, [], html.P("No predictions yet.", className='text-gray-300')
+    if predict_clicks is None or uploaded_data is None:
+        return ["Upload a CSV file and click Predict."] + unchanged + [dash.no_update]
 
-    # Handle prediction
-    if triggered_id != 'predict-button' or predict_clicks is None or uploaded_data is None:
-        return "Upload a CSV file and click Predict.", {}, {}, prediction_history, html.P("No predictions yet.", className='text-gray-300')
+    from ingest import FEATURES
+    from utils import CacheRecorder, prediction_cache, predict_rul, predict_rul_intervals, get_feature_importance, get_trend_figure, trend_trace
 
+    start = time.perf_counter()
+    in_job = set_progress is not None
+    if in_job:
+        metrics.registry.clear()  # the job starts with a copy of the app's metrics
+    cache = CacheRecorder(prediction_cache) if in_job else prediction_cache
     try:
-        df = pd.DataFrame(uploaded_data)
+        df = upload_cache.get(uploaded_data['key'])
+        if df is None:
+            return ["Uploaded data has expired. Please upload the file again."] + unchanged + [_job_report(cache, in_job)]
+        model, scaler, model_id = model_registry.get(model_choice, df, timeout=config.MODEL_WAIT_SECONDS)
         # Predict RUL using the full DataFrame
-        rul = predict_rul(model, scaler, df)
+        if not in_job:
+            rul = predict_rul(model, scaler, df, cache=cache)
+        else:
+            rul = predict_rul(model, scaler, df, workers=config.JOB_WORKERS, cache=cache,
+                              progress=lambda done, total: set_progress((done, total)))
         prediction_text = f"Predicted RUL: {rul:.2f} cycles"
+        try:
+            # Range of the forest's per-tree predictions for the same unit
+            interval = predict_rul_intervals(model, scaler, df[df['unit'] == df['unit'].iloc[0]], cache=cache).iloc[0]
+            prediction_text += f" (90% of trees: {interval['rul_low']:.0f}–{interval['rul_high']:.0f})"
+        except Exception:
+            pass  # not a tree ensemble, or failed (printed by predict_rul_intervals): RUL only
+        if len(model_registry.ids()) > 1:
+            prediction_text += f" (model {model_id})"
 
         # Update prediction history with equipment name
         equipment_name = equipment_name if equipment_name else "Unnamed Equipment"
@@ -143,70 +256,153 @@ def update_output(predict_clicks, reset_clicks, uploaded_data, equipment_name, p
             'cycle': int(df['cycle'].iloc[0]),  # Ensure integer
             'rul': float(rul)  # Ensure float
         }
-        prediction_history.append(prediction_entry)
-        if len(prediction_history) > 50:  # Limit history to 50 entries
-            prediction_history = prediction_history[-50:]
-
-        # Generate plots
-        feature_importance_fig = get_feature_importance(model, FEATURES)
-        history_df = pd.DataFrame(prediction_history)
-        trend_fig = px.line(
-            history_df, 
-            x='cycle', 
-            y='rul', 
-            color='unit',
-            title='RUL Prediction Trend', 
-            labels={'cycle': 'Cycle', 'rul': 'Predicted RUL'},
-            line_shape='linear'
-        )
-        trend_fig.update_traces(mode='lines+markers')
-        trend_fig.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#ffffff',
-            title_font_color='#ffffff'
-        )
-
-        # Generate history table
-        history_table = dash_table.DataTable(
-            data=history_df.to_dict('records'),
-            columns=[
-                {'name': 'Equipment', 'id': 'equipment'},
-                {'name': 'Unit', 'id': 'unit'},
-                {'name': 'Cycle', 'id': 'cycle'},
-                {'name': 'Predicted RUL', 'id': 'rul'}
-            ],
-            style_table={'overflowX': 'auto'},
-            style_cell={
-                'backgroundColor': 'rgba(55, 65, 81, 0.9)',
-                'color': 'white',
-                'border': '1px solid #4B5563'
-            },
-            style_header={
-                'backgroundColor': 'rgba(31, 41, 55, 0.9)',
-                'color': 'white',
-                'fontWeight': 'bold'
-            }
-        )
-
-        return prediction_text, feature_importance_fig, trend_fig, prediction_history, history_table
+        history_store.add([prediction_entry])
+        meta = meta or EMPTY_HISTORY_META
+        units, entries = list(meta['units']), list(meta['entries'])
+        trend_patch = Patch()
+
+        # First point after a reset or page load: the figure is empty, send it whole.
+        # Only this client's predictions are plotted, like the patches that follow;
+        # other users' rows in the shared database stay in the history table.
+        if not entries:
+            units, entries = [prediction_entry['unit']], [0]
+            trend_out = get_trend_figure([prediction_entry])
+        else:
+            if prediction_entry['unit'] in units:
+                trace = trend_patch['data'][units.index(prediction_entry['unit'])]
+                trace['x'].append(prediction_entry['cycle'])
+                trace['y'].append(prediction_entry['rul'])
+            else:
+                units.append(prediction_entry['unit'])
+                trend_patch['data'].append(trend_trace(prediction_entry['unit'], [prediction_entry['cycle']], [prediction_entry['rul']]))
+            entries.append(units.index(prediction_entry['unit']))
+            trend_out = trend_patch
+
+        if len(entries) > HISTORY_LIMIT:  # Limit the trend plot to 50 points
+            oldest = entries.pop(0)
+            del trend_patch['data'][oldest]['x'][0]
+            del trend_patch['data'][oldest]['y'][0]
+
+        # The importance figure only changes with the model; send it when it does
+        importance = f'{model_id}/{model_registry.version(model_id)}'
+        feature_importance_fig = dash.no_update if meta['importance'] == importance else get_feature_importance(model, getattr(model, 'input_names', FEATURES))
+
+        new_meta = {'units': units, 'entries': entries, 'importance': importance, 'since': meta.get('since', 0)}
+        metrics.registry.observe('pm_stage_seconds', time.perf_counter() - start, stage='update_output')
+        return [prediction_text, feature_importance_fig, trend_out, version, new_meta, _job_report(cache, in_job)]
     except Exception as e:
         print(f"Callback error: {str(e)}")
-        return f"Prediction error: {str(e)}", {}, {}, prediction_history, html.P("No predictions yet.", className='text-gray-300')
+        metrics.error('update_output')
+        return [f"Prediction error: {str(e)}"] + unchanged + [_job_report(cache, in_job)]
+
+# What a background job recorded that the app's process should keep
+def _job_report(cache, in_job):
+    if not in_job:
+        return dash.no_update
+    return {'cache': cache.fresh, 'metrics': metrics.registry.snapshot()}
+
+# Runs in the app's process (any worker) once a job's result has arrived
+@app.callback(Input('prediction-job-report', 'data'), prevent_initial_call=True)
+def store_job_report(report):
+    from utils import prediction_cache
+    if not report:
+        return
+    for key, row in report['cache'].items():
+        prediction_cache.put(key, row)
+    metrics.registry.merge(report['metrics'])
+
+PREDICTION_DEPENDENCIES = [
+    [
+        Output('prediction-output', 'children'),
+        Output('feature-importance-plot', 'figure'),
+        Output('prediction-trend-plot', 'figure'),
+        Output('history-version', 'data'),
+        Output('prediction-history-meta', 'data'),
+        Output('prediction-job-report', 'data')
+    ],
+    Input('predict-button', 'n_clicks'),
+    [
+        State('uploaded-data', 'data'),
+        State('equipment-name', 'value'),
+        State('model-select', 'value'),
+        State('prediction-history-meta', 'data'),
+        State('history-version', 'data')
+    ]
+]
+# Predict is disabled and the progress bar with its Cancel button shown while it runs
+PREDICTION_RUNNING = [
+    (Output('predict-button', 'disabled'), True, False),
+    (Output('prediction-job', 'style'), {'display': 'flex'}, {'display': 'none'})
+]
+
+with startup.phase('job manager'):
+    job_manager = jobs.background_manager(config.JOB_CACHE_DIR) if config.BACKGROUND_JOBS else None
+if job_manager is not None:
+    app.callback(
+        *PREDICTION_DEPENDENCIES,
+        background=True,
+        manager=job_manager,
+        interval=config.JOB_POLL_MS,
+        progress=[Output('prediction-progress', 'value'), Output('prediction-progress', 'max')],
+        progress_default=[0, 1],
+        running=PREDICTION_RUNNING,
+        cancel=[Input('cancel-prediction-button', 'n_clicks')],
+        prevent_initial_call=True
+    )(update_output)
+else:
+    @app.callback(*PREDICTION_DEPENDENCIES, running=PREDICTION_RUNNING, prevent_initial_call=True)
+    def update_output_sync(*args):
+        return update_output(None, *args)
 
-# Callback to download prediction report
+# Callback to serve the visible page of the history table. The cursors of the pages
+# seen so far are kept per client, so paging forward reads by keyset (see
+# HistoryStore.page); they are dropped when the sort, filter or history changes.
 @app.callback(
-    Output('download-report', 'data'),
-    Input('prediction-history', 'data'),
-    prevent_initial_call=True
+    [
+        Output('prediction-history-datatable', 'data'),
+        Output('prediction-history-datatable', 'page_count'),
+        Output('prediction-history-cursors', 'data')
+    ],
+    [
+        Input('prediction-history-datatable', 'page_current'),
+        Input('prediction-history-datatable', 'page_size'),
+        Input('prediction-history-datatable', 'sort_by'),
+        Input('prediction-history-datatable', 'filter_query'),
+        Input('history-version', 'data')
+    ],
+    [
+        State('prediction-history-meta', 'data'),
+        State('prediction-history-cursors', 'data')
+    ]
 )
-def download_report(prediction_history):
-    if not prediction_history:
-        return None
+def update_history_table(page_current, page_size, sort_by, filter_query, version, meta, cursors):
+    page_size = page_size or config.HISTORY_PAGE_SIZE
+    page_current = page_current or 0
+    since = (meta or EMPTY_HISTORY_META).get('since', 0)
+    view = [sort_by or [], filter_query or '', since, page_size, version]
+    pages = {int(page): cursor for page, cursor in cursors['pages'].items()} if cursors and cursors['view'] == view else {}
+    with metrics.timed('history_page'):
+        total = history_store.count(filter_query, since=since)
+        rows = history_store.page(page_current, page_size, sort_by, filter_query, since=since, cursors=pages)
+    if rows:
+        pages[page_current] = history_store.cursor(sort_by, rows[-1])
+    return rows, max(1, -(-total // page_size)), {'view': view, 'pages': pages}
 
-    df = pd.DataFrame(prediction_history)
-    csv_string = df.to_csv(index=False)
-    return dict(content=csv_string, filename='prediction_report.csv')
+# Keep the export links in step with the table's filter and the client's last Reset
+@app.callback(
+    [
+        Output('download-csv', 'href'),
+        Output('download-parquet', 'href')
+    ],
+    [
+        Input('prediction-history-datatable', 'filter_query'),
+        Input('prediction-history-meta', 'data')
+    ]
+)
+def update_export_links(filter_query, meta):
+    params = {key: value for key, value in [('filter', filter_query), ('since', (meta or EMPTY_HISTORY_META).get('since', 0))] if value}
+    query = f"?{urllib.parse.urlencode(params)}" if params else ''
+    return f'/history/export.csv{query}', f'/history/export.parquet{query}'
 
 # Run the app
 if __name__ == '__main__':
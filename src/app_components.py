@@ -1,6 +1,5 @@
-from dash import html, dcc
+from dash import html, dcc, dash_table
 import base64
-import pandas as pd
 
 def header():
     return html.Header(
@@ -23,9 +22,9 @@ def header():
         ]
     )
 
-def input_form():
+def input_form(model_ids=('default',)):
     # Realistic sample data based on NASA Turbofan Jet Engine Dataset (FD001), including all sensors
-    sample_data = pd.DataFrame([
+    sample_data = [
         {
             'unit': 1, 'cycle': 1, 
             'setting1': -0.0007, 'setting2': -0.0004, 'setting3': 100.0,
@@ -46,8 +45,10 @@ def input_form():
             'sensor17': 392, 'sensor18': 2388, 'sensor19': 100.0, 'sensor20': 39.00,
             'sensor21': 23.4236
         }
-    ])
-    sample_csv = sample_data.to_csv(index=False)
+    ]
+    # Built by hand rather than with pandas so rendering the layout stays import-free
+    columns = list(sample_data[0])
+    sample_csv = '\n'.join([','.join(columns)] + [','.join(str(row[col]) for col in columns) for row in sample_data]) + '\n'
     encoded_csv = base64.b64encode(sample_csv.encode()).decode()
 
     return html.Div(
@@ -55,7 +56,7 @@ def input_form():
         children=[
             html.H2('Upload Sensor Data', className='text-2xl font-semibold text-white'),
             html.P(
-                'Upload a CSV file with sensor data to predict RUL. The CSV should contain columns: unit, cycle, setting1, setting2, setting3, sensor1, sensor2, ..., sensor21.',
+                'Upload a CSV file with sensor data to predict RUL. The CSV should contain columns: unit, cycle, setting1, setting2, setting3, sensor1, sensor2, ..., sensor21. Raw CMAPSS .txt files and gzipped files are also accepted.',
                 className='text-gray-300'
             ),
             dcc.Upload(
@@ -65,7 +66,7 @@ def input_form():
                     className='bg-blue-600 text-white p-3 rounded-md hover:bg-blue-700 transition'
                 ),
                 multiple=False,
-                accept='.csv',
+                accept='.csv,.txt,.gz',
                 className='w-full'
             ),
             html.A(
@@ -88,6 +89,21 @@ def input_form():
                     )
                 ]
             ),
+            # "auto" picks the model trained on the operating conditions closest to the upload
+            html.Div(
+                className='mb-4',
+                children=[
+                    html.Label('Model', className='block text-gray-300 font-medium mb-1'),
+                    dcc.Dropdown(
+                        id='model-select',
+                        options=[{'label': 'Automatic (by operating settings)', 'value': 'auto'}] +
+                                [{'label': model_id, 'value': model_id} for model_id in model_ids],
+                        value='auto',
+                        clearable=False,
+                        className='text-gray-900'
+                    )
+                ]
+            ),
             html.Button(
                 'Predict RUL',
                 id='predict-button',
@@ -107,11 +123,21 @@ def prediction_card():
                 id='prediction-output',
                 className='text-lg text-gray-200',
                 children='Upload a CSV file and click Predict to see the RUL'
-            )
+            ),
+            # Shown while a prediction job is running (see the background callback in app.py)
+            html.Div(id='prediction-job', className='items-center space-x-4 mt-4', style={'display': 'none'}, children=[
+                html.Progress(id='prediction-progress', value=0, max=1, className='flex-grow'),
+                html.Button(
+                    'Cancel',
+                    id='cancel-prediction-button',
+                    n_clicks=0,
+                    className='bg-red-600 text-white px-4 py-2 rounded-md hover:bg-red-700 transition'
+                )
+            ])
         ]
     )
 
-def prediction_history_table():
+def prediction_history_table(page_size=20):
     return html.Div(
         className='p-6 bg-gray-800 border border-gray-700 rounded-lg',
         children=[
@@ -124,8 +150,44 @@ def prediction_history_table():
                     className='bg-red-600 text-white px-4 py-2 rounded-md hover:bg-red-700 transition'
                 )
             ]),
-            html.Div(id='prediction-history-table', className='overflow-x-auto'),
-            dcc.Download(id='download-report')
+            # Paging, sorting and filtering run on the server against the SQLite history
+            html.Div(id='prediction-history-table', className='overflow-x-auto', children=[
+                dash_table.DataTable(
+                    id='prediction-history-datatable',
+                    data=[],
+                    columns=[
+                        {'name': 'Equipment', 'id': 'equipment'},
+                        {'name': 'Unit', 'id': 'unit', 'type': 'numeric'},
+                        {'name': 'Cycle', 'id': 'cycle', 'type': 'numeric'},
+                        {'name': 'Predicted RUL', 'id': 'rul', 'type': 'numeric', 'format': {'specifier': '.2f'}}
+                    ],
+                    page_action='custom',
+                    sort_action='custom',
+                    sort_mode='multi',
+                    filter_action='custom',
+                    filter_query='',
+                    page_current=0,
+                    page_size=page_size,
+                    sort_by=[],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={
+                        'backgroundColor': 'rgba(55, 65, 81, 0.9)',
+                        'color': 'white',
+                        'border': '1px solid #4B5563'
+                    },
+                    style_header={
+                        'backgroundColor': 'rgba(31, 41, 55, 0.9)',
+                        'color': 'white',
+                        'fontWeight': 'bold'
+                    }
+                )
+            ]),
+            html.Div(className='flex space-x-4 mt-4', children=[
+                html.A('Download CSV', id='download-csv', href='/history/export.csv',
+                       className='bg-blue-600 text-white px-4 py-2 rounded-md hover:bg-blue-700 transition'),
+                html.A('Download Parquet', id='download-parquet', href='/history/export.parquet',
+                       className='bg-blue-600 text-white px-4 py-2 rounded-md hover:bg-blue-700 transition')
+            ])
         ]
     )
 
@@ -0,0 +1,174 @@
+import copy
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import numpy as np
+
+# Every batcher of the process. A fork copies a batcher's lock in whatever state a
+# thread of the parent held it, so the child gets fresh, unlocked ones; its
+# scheduler thread is restarted by the next submit.
+_batchers = weakref.WeakSet()
+
+
+def _after_fork():
+    for batcher in list(_batchers):
+        batcher._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+# Coalesces concurrent predict calls into one. Callers hand their rows to a scheduler
+# thread, which waits up to max_wait seconds after the first pending request for
+# others to arrive (or until max_batch_rows rows are queued), stacks everything into
+# one matrix, runs predict_fn once and hands each caller back its slice. On a tree
+# ensemble one call on a stacked matrix costs far less than many small calls.
+# A lone request is not held back: the scheduler only waits while requests are
+# actually overlapping (the previous batch coalesced or more are already queued).
+# When a batch fails, its requests are retried one by one, so one bad request only
+# fails its own caller; stats() counts the failed batches and requests.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_rows=8192, max_wait=0.005, feature_names=None):
+        self.predict_fn = predict_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self.feature_names = feature_names
+        self.batches = 0
+        self.requests = 0
+        self.failed_batches = 0
+        self.failed_requests = 0
+        self._last_batch = 1
+        self._closed = False
+        self._lock = threading.Lock()
+        with self._lock:
+            self._start()
+        _batchers.add(self)
+
+    # Called with self._lock held
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        if not self._closed:
+            self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._thread.start()
+
+    # Stops the scheduler thread once the queued requests are served (the model
+    # registry calls it when it drops a model); later calls run in the caller's thread
+    def close(self):
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+
+    def submit(self, X):
+        X = X.to_numpy(np.float32) if hasattr(X, 'to_numpy') else np.asarray(X, dtype=np.float32)
+        future = Future()
+        with self._lock:
+            # The scheduler thread does not survive a fork (background jobs, see jobs.py)
+            if self._pid != os.getpid():
+                self._start()
+            # Requests that fill a batch on their own gain nothing from waiting
+            queued = not self._closed and len(X) < self.max_batch_rows
+            if queued:
+                self._queue.put((X, future))
+        if not queued:
+            future.set_result(self._predict(X))
+        return future
+
+    def predict(self, X):
+        return self.submit(X).result()
+
+    def _predict(self, X):
+        if self.feature_names is not None:
+            # Keeps sklearn from warning that the forest was fitted with feature names
+            import pandas as pd
+            X = pd.DataFrame(X, columns=self.feature_names, copy=False)
+        return np.asarray(self.predict_fn(X))
+
+    # Requests for the next batch; empty once close() was called
+    def _collect(self):
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return []
+        n_rows = len(batch[0][0])
+        if self._last_batch == 1 and self._queue.empty():
+            return batch
+        deadline = time.perf_counter() + self.max_wait
+        while n_rows < self.max_batch_rows:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # closed: serve this batch first
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            futures = [future for _, future in batch]
+            try:
+                X = np.concatenate([rows for rows, _ in batch]) if len(batch) > 1 else batch[0][0]
+                y = self._predict(X)
+            except Exception as e:
+                self.failed_batches += 1
+                if len(batch) == 1:
+                    self.failed_requests += 1
+                    futures[0].set_exception(e)
+                    continue
+                for rows, future in batch:
+                    try:
+                        future.set_result(self._predict(rows))
+                    except Exception as e:
+                        self.failed_requests += 1
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(batch)
+            self._last_batch = len(batch)
+            offsets = np.cumsum([0] + [len(rows) for rows, _ in batch])
+            for future, start, stop in zip(futures, offsets[:-1], offsets[1:]):
+                future.set_result(y[start:stop])
+
+    def stats(self):
+        return {'batches': self.batches, 'requests': self.requests,
+                'mean_batch': self.requests / self.batches if self.batches else 0.0,
+                'failed_batches': self.failed_batches, 'failed_requests': self.failed_requests}
+
+
+# Stands in for a fitted regressor: predict goes through the batcher and every other
+# attribute (feature_importances_, estimators_, ...) comes from the wrapped model
+class BatchedRegressor:
+    def __init__(self, regressor, max_batch_rows=8192, max_wait=0.005):
+        self.regressor = regressor
+        self.batcher = MicroBatcher(regressor.predict, max_batch_rows, max_wait,
+                                    feature_names=getattr(regressor, 'feature_names_in_', None))
+
+    def predict(self, X):
+        return self.batcher.predict(X)
+
+    def __getattr__(self, name):
+        if name == 'regressor':  # not set yet (e.g. while unpickling)
+            raise AttributeError(name)
+        return getattr(self.regressor, name)
+
+
+# Returns a shallow copy of a SequenceModel whose regressor predicts through a
+# MicroBatcher. Models without a regressor are returned unchanged.
+def batch_model(model, max_batch_rows=8192, max_wait=0.005):
+    if getattr(model, 'regressor', None) is None or isinstance(model.regressor, BatchedRegressor):
+        return model
+    batched = copy.copy(model)
+    batched.regressor = BatchedRegressor(model.regressor, max_batch_rows, max_wait)
+    return batched
@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+# Runtime settings, overridable through environment variables so deployments don't
+# depend on the working directory the server was started from
+
+
+def _flag(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+# Relative paths are taken from the repository root, not the working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _path(name, default):
+    return os.path.join(ROOT_DIR, os.environ.get(name, default))
+
+
+ARTIFACTS_DIR = _path('ARTIFACTS_DIR', 'artifacts')
+MODEL_PATH = _path('MODEL_PATH', os.path.join(ARTIFACTS_DIR, 'model.joblib'))
+SCALER_PATH = _path('SCALER_PATH', os.path.join(ARTIFACTS_DIR, 'scaler.pkl'))
+
+# eager: load while importing the app, lazy: on the first prediction,
+# background: start loading at import without blocking the worker from serving
+MODEL_LOAD_MODE = os.environ.get('MODEL_LOAD_MODE', 'background')
+MODEL_WAIT_SECONDS = float(os.environ.get('MODEL_WAIT_SECONDS', 30))
+COMPILED_FOREST = _flag('COMPILED_FOREST', True)
+# Keep the sklearn forest next to the compiled one for batches of FALLBACK_ROWS rows
+# or more (see tree_engine.CompiledForest.predict). It is faster there, but the model
+# then takes about twice the memory. Memory-mapped artifacts never have a fallback.
+COMPILED_FALLBACK = _flag('COMPILED_FALLBACK', False)
+# Memory-map uncompressed artifacts (see utils.save_model_artifact) so gunicorn
+# workers share the forest arrays through the page cache
+MODEL_MMAP = _flag('MODEL_MMAP', True)
+# Coalesce concurrent predictions into one forest call (see batching.MicroBatcher):
+# at most MICRO_BATCH_MAX_ROWS rows, waiting at most MICRO_BATCH_WAIT_MS for more
+MICRO_BATCH = _flag('MICRO_BATCH', False)
+MICRO_BATCH_MAX_ROWS = int(os.environ.get('MICRO_BATCH_MAX_ROWS', 8192))
+MICRO_BATCH_WAIT_MS = float(os.environ.get('MICRO_BATCH_WAIT_MS', 5))
+# Several models (see model_registry.py): a JSON manifest of model IDs and their
+# artifacts. Without it only MODEL_PATH / SCALER_PATH is served. Resident models are
+# kept up to MODEL_CACHE_MB, and artifacts are checked for changes (and reloaded)
+# every MODEL_RELOAD_SECONDS; 0 turns hot reloading off.
+MODEL_REGISTRY = _path('MODEL_REGISTRY', os.path.join(ARTIFACTS_DIR, 'models.json'))
+MODEL_CACHE_MB = int(os.environ.get('MODEL_CACHE_MB', 1024))
+MODEL_RELOAD_SECONDS = float(os.environ.get('MODEL_RELOAD_SECONDS', 2))
+
+# Anytime prediction with intervals (/api/v1/rul?interval=1, see
+# tree_engine.predict_anytime): stop adding trees once every unit's RUL is within
+# ANYTIME_TOLERANCE cycles of the full forest's (95% confidence) or after
+# ANYTIME_BUDGET_MS; 0 turns either off. Requests can override both.
+ANYTIME_TOLERANCE = float(os.environ.get('ANYTIME_TOLERANCE', 0))
+ANYTIME_BUDGET_MS = float(os.environ.get('ANYTIME_BUDGET_MS', 0))
+ANYTIME_STEP = int(os.environ.get('ANYTIME_STEP', 10))
+
+UPLOAD_CACHE_DIR = os.environ.get('UPLOAD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pm_upload_cache'))
+UPLOAD_CACHE_MAX_MB = int(os.environ.get('UPLOAD_CACHE_MAX_MB', 512))
+
+# Per-unit prediction cache in utils (entries, seconds)
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+
+# SQLite prediction history shared by all workers
+HISTORY_DB_PATH = _path('HISTORY_DB_PATH', os.path.join(ARTIFACTS_DIR, 'history.sqlite3'))
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+
+# Per-request cProfile capture (see metrics.install_request_profiler): off, header
+# (requests sent with "X-Profile: 1") or all
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'off')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'pm_profiles'))
+
+# Predictions from the UI run as Dash background callbacks: each job is a separate
+# process with its result in a diskcache directory, so the request worker returns at
+# once. Scoring inside a job is spread over JOB_WORKERS processes in chunks of about
+# JOB_CHUNK_ROWS rows (see jobs.py). Without diskcache the callback runs in the request.
+BACKGROUND_JOBS = _flag('BACKGROUND_JOBS', True)
+JOB_CACHE_DIR = os.environ.get('JOB_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pm_jobs'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+JOB_CHUNK_ROWS = int(os.environ.get('JOB_CHUNK_ROWS', 10000))
+JOB_POLL_MS = int(os.environ.get('JOB_POLL_MS', 250))
+
+# Largest request body accepted by the scoring API (/api/v1/rul)
+API_MAX_MB = int(os.environ.get('API_MAX_MB', 256))
@@ -2,16 +2,134 @@ from sklearn.base import BaseEstimator
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
 import numpy as np
+import pandas as pd
+
+import metrics
+
+NON_FEATURE_COLUMNS = ['unit', 'cycle', 'RUL', 'failure_30']
+
+# Rows of a float32 buffer scaled at a time in float64 (see scale_inplace)
+SCALE_BLOCK_ROWS = 65536
+
+
+# Start row of every unit plus the total row count, for rows grouped by unit (as in
+# the CMAPSS files and ingest.load_arrays)
+def unit_offsets(units):
+    units = np.asarray(units)
+    return np.concatenate(([0], np.flatnonzero(units[1:] != units[:-1]) + 1, [len(units)]))
+
+
+# Remaining cycles of every row, max(cycle) - cycle per unit, without a Python
+# call per unit
+def rul_labels(cycles, offsets):
+    cycles = np.asarray(cycles)
+    if len(cycles) == 0:  # reduceat needs at least one row
+        return cycles[:0].copy()
+    counts = np.diff(offsets)
+    return np.repeat(np.maximum.reduceat(cycles, offsets[:-1]), counts) - cycles
+
+
+# Same arithmetic as StandardScaler.transform on float64 input (which subtracts and
+# divides in place on its own copy), done in place on a buffer the model owns, so
+# results match transform bit for bit. float32 buffers are scaled in float64 blocks
+# and cast back, which is exactly what the forest gets from float64 input.
+def scale_inplace(scaler, values, feature_names):
+    if isinstance(scaler, StandardScaler):
+        if values.dtype == np.float64:
+            _standardize(scaler, values)
+        else:
+            for start in range(0, len(values), SCALE_BLOCK_ROWS):
+                block = values[start:start + SCALE_BLOCK_ROWS]
+                block[...] = _standardize(scaler, block.astype(np.float64))
+    else:
+        values[...] = scaler.transform(pd.DataFrame(values, columns=feature_names, copy=False))
+    return values
+
+
+def _standardize(scaler, values):
+    if scaler.with_mean:
+        values -= scaler.mean_
+    if scaler.with_std and scaler.scale_ is not None:
+        values /= scaler.scale_
+    return values
+
+
+# Own copy of the feature columns in their float dtype (integer columns become float64,
+# as StandardScaler.transform would return them)
+def _feature_values(X, feature_names):
+    values = X[feature_names].to_numpy(copy=True)
+    return values if values.dtype.kind == 'f' else values.astype(np.float64)
+
+
+# Scaled copy of the feature columns only (unit, cycle and labels are never copied),
+# as a DataFrame over the scaled buffer
+def scaled_features(scaler, X, feature_names):
+    with metrics.timed('preprocess'):
+        values = _feature_values(X, feature_names)
+        return pd.DataFrame(scale_inplace(scaler, values, feature_names), columns=feature_names, index=X.index, copy=False)
+
+
+# Shared fit for the sequence models. Takes either a DataFrame with unit/cycle
+# columns or, through fit_arrays, a feature matrix whose rows are grouped by unit.
+def _fit(model, X, y, feature_names, preprocess, values=None):
+    model.feature_names = feature_names
+    if values is None:
+        values = _feature_values(X, feature_names)
+    frame = pd.DataFrame(values, columns=feature_names, copy=False)
+
+    if model.scaler_unfit:
+        model.scaler.fit(frame)
+    if preprocess:
+        scale_inplace(model.scaler, values, feature_names)
+
+    model.regressor.fit(frame, y)
+    return model
+
+
+# C-contiguous float buffer of features (the caller's own with copy=False when it
+# already is one); float32 input stays float32, anything else becomes float64
+def _float_buffer(features, copy):
+    features = np.asarray(features)
+    return np.array(features, dtype=features.dtype if features.dtype.kind == 'f' else np.float64, copy=copy, order='C')
+
+
+def _fit_arrays(model, features, offsets, cycles, feature_names, preprocess, copy):
+    values = _float_buffer(features, copy)
+    feature_names = list(feature_names) if feature_names is not None else [f'f{i}' for i in range(values.shape[1])]
+    return _fit(model, None, rul_labels(cycles, offsets), feature_names, preprocess, values=values)
+
 
 # Inherited model: Used for evaluation and organization
 class SequenceModel(BaseEstimator):
+    # Trailing cycles per unit a prediction depends on (None: the whole history)
+    window = None
+
+    # Per-unit RUL with a spread estimate from the forest's per-tree predictions:
+    # the RUL is the mean over the trees evaluated, rul_std their standard deviation and
+    # rul_low / rul_high the central `coverage` range. With tolerance (cycles) or
+    # budget (seconds) only as many trees are evaluated as needed, see
+    # tree_engine.predict_anytime; n_trees says how many were.
+    def predict_interval(self, X, preprocess=True, tolerance=None, budget=None, step=10, coverage=0.9):
+        from tree_engine import predict_anytime
+
+        units, inputs, reduce = self._regressor_inputs(X, preprocess)
+        with metrics.timed('forest_predict_anytime'):
+            rul, spread, low, high, n_trees = predict_anytime(self.regressor, inputs, reduce, tolerance, budget,
+                                                              step, coverage=coverage)
+        return pd.DataFrame({'unit': units, 'rul': rul, 'rul_std': spread, 'rul_low': low, 'rul_high': high,
+                             'n_trees': n_trees})
+
+    # RMSE, PHM08 score and error per RUL bucket on a test set (see evaluation.py);
+    # y_test holds the true RUL of every unit in unit order, like RUL_FD00x.txt
     def print_report(self, X_test, y_test):
-        print("report")
-        # TODO
+        from evaluation import print_report
+        return print_report(self, X_test, y_test)
 
 
 # Simplest model: Predicts solely from the last datapoint
 class PointPredictor(SequenceModel):
+    window = 1
+
     def __init__(self, regressor, scaler=None):
         self.regressor = regressor
         self.scaler = scaler or StandardScaler()
@@ -20,28 +138,21 @@ class PointPredictor(SequenceModel):
         else:
             self.scaler_unfit = False
 
+    # Returns the scaled feature columns (not the whole frame)
     def _preprocess(self, X):
-        copy = X.copy(deep=True)
-
-        copy[self.feature_names] = self.scaler.transform(X[self.feature_names])
-        return copy
+        return scaled_features(self.scaler, X, self.feature_names)
 
     def fit(self, X, preprocess=True):
-        copy = X.copy(deep=True)
-        y = X.groupby('unit')['cycle'].transform(lambda x: x.max() - x)
+        y = X['cycle'].groupby(X['unit']).transform('max') - X['cycle']
+        features = [col for col in X.columns if col not in NON_FEATURE_COLUMNS]
+        return _fit(self, X, y, features, preprocess)
 
-        features = [col for col in copy.columns if col not in ['unit', 'cycle', 'RUL', 'failure_30']]
-        self.feature_names = features
-        copy = copy[features]
-
-        if self.scaler_unfit:
-            self.scaler.fit(copy)
-
-        if preprocess:
-            copy = self._preprocess(copy)
-
-        self.regressor.fit(copy, y)
-        return self
+    # Array variant of fit: a (rows, features) matrix whose rows are grouped by unit,
+    # the unit start offsets (see unit_offsets) and the cycle of every row. The
+    # matrix is scaled in place; with copy=False a C-contiguous float input (or a
+    # copy-on-write memmap from ingest.load_arrays) is used as the training buffer.
+    def fit_arrays(self, features, offsets, cycles, feature_names=None, preprocess=True, copy=True):
+        return _fit_arrays(self, features, offsets, cycles, feature_names, preprocess, copy)
 
     def predict(self, X, preprocess=True):
         if isinstance(X, list):
@@ -52,43 +163,65 @@ class PointPredictor(SequenceModel):
         if preprocess:
             datapoints = self._preprocess(datapoints)
 
-        return self.regressor.predict(datapoints)
+        with metrics.timed('forest_predict'):
+            return self.regressor.predict(datapoints)
+
+    def predict_units(self, X, preprocess=True):
+        last = X.groupby('unit').tail(1).sort_values('unit', kind='stable')
+        return pd.DataFrame({
+            'unit': last['unit'].to_numpy(),
+            'rul': self.predict(last, preprocess=preprocess)
+        })
+
+    # Unit ids and regressor input of predict_units, for predict_interval; every unit
+    # is one row, so per-tree row predictions are already per-unit
+    def _regressor_inputs(self, X, preprocess=True):
+        last = X.groupby('unit').tail(1).sort_values('unit', kind='stable')
+        datapoints = self._preprocess(last) if preprocess else last[self.feature_names]
+        return last['unit'].to_numpy(), datapoints, None
+
+    # RUL of every unit of a feature matrix grouped by unit (see fit_arrays); only
+    # the last row of each unit is copied and scaled
+    def predict_arrays(self, features, offsets, preprocess=True):
+        values = np.asarray(features)[np.asarray(offsets[1:]) - 1].astype(np.float64)
+        if preprocess:
+            scale_inplace(self.scaler, values, self.feature_names)
+        with metrics.timed('forest_predict'):
+            return np.asarray(self.regressor.predict(pd.DataFrame(values, columns=self.feature_names, copy=False)))
 
 class PointPredictorRegressor(SequenceModel):
+    window = 10  # default end_points
+
     def __init__(self, regressor, scaler=None):
         self.regressor = regressor
         self.scaler = scaler or StandardScaler()
         self.scaler_unfit = scaler is None
 
+    # Returns the scaled feature columns (not the whole frame)
     def _preprocess(self, X):
-        copy = X.copy(deep=True)
-
-        copy[self.feature_names] = self.scaler.transform(X[self.feature_names])
-        return copy
+        return scaled_features(self.scaler, X, self.feature_names)
 
     def fit(self, X, preprocess=True):
-        copy = X.copy(deep=True)
-        y = X.groupby('unit')['cycle'].transform(lambda x: x.max() - x)
+        y = X['cycle'].groupby(X['unit']).transform('max') - X['cycle']
+        features = [col for col in X.columns if col not in NON_FEATURE_COLUMNS]
+        return _fit(self, X, y, features, preprocess)
 
-        features = [col for col in copy.columns if col not in ['unit', 'cycle', 'RUL', 'failure_30']]
-        self.feature_names = features
-        copy = copy[features]
+    # Array variant of fit: a (rows, features) matrix whose rows are grouped by unit,
+    # the unit start offsets (see unit_offsets) and the cycle of every row. The
+    # matrix is scaled in place; with copy=False a C-contiguous float input (or a
+    # copy-on-write memmap from ingest.load_arrays) is used as the training buffer.
+    def fit_arrays(self, features, offsets, cycles, feature_names=None, preprocess=True, copy=True):
+        return _fit_arrays(self, features, offsets, cycles, feature_names, preprocess, copy)
 
-        if self.scaler_unfit:
-            self.scaler.fit(copy)
-
-        if preprocess:
-            copy = self._preprocess(copy)
+    def predict(self, X, preprocess=True, end_points=10, batched=True):
+        if batched:
+            return self.predict_units(X, preprocess=preprocess, end_points=end_points)['rul'].tolist()
 
-        self.regressor.fit(copy, y)
-        return self
-
-    def predict(self, X, preprocess=True, end_points=10):
         if isinstance(X, list):
             sequences = [self._preprocess(x[self.feature_names]) if preprocess else x[self.feature_names] for x in X]
         else:
-            df = self._preprocess(X) if preprocess else X.copy(deep=True)
-            sequences = [group for _, group in df.groupby('unit')[self.feature_names]]
+            features = self._preprocess(X) if preprocess else X[self.feature_names]
+            sequences = [group for _, group in features.groupby(X['unit'].to_numpy())]
 
         ret = []
         for sequence in sequences:
@@ -103,3 +236,226 @@ class PointPredictorRegressor(SequenceModel):
 
             ret.append(linModel.predict(np.array([[rul_pred.shape[0]]]))[0])  # get scalar
         return ret
+
+    # Batched fleet prediction: one regressor call for every tail window, then the
+    # per-unit least-squares line is solved in closed form instead of with LinearRegression
+    def predict_units(self, X, preprocess=True, end_points=10):
+        unit_ids, window, counts = self._tail_windows(X, preprocess, end_points)
+        with metrics.timed('forest_predict'):
+            rul_pred = self.regressor.predict(window)
+
+        slope, rul = _extrapolate(np.asarray(rul_pred, dtype=float), counts)
+        return pd.DataFrame({
+            'unit': unit_ids,
+            'n_points': counts,
+            'slope': slope,
+            'rul': rul
+        })
+
+    # The line through a window is linear in its predictions, so extrapolating every
+    # tree's predictions gives per-tree RULs whose mean is the model's RUL
+    def _regressor_inputs(self, X, preprocess=True, end_points=10):
+        unit_ids, window, counts = self._tail_windows(X, preprocess, end_points)
+        return unit_ids, window, lambda rul_pred: _extrapolate(rul_pred, counts)[1]
+
+    # Unit ids, the (scaled) last end_points rows of every unit and their counts
+    def _tail_windows(self, X, preprocess, end_points):
+        if isinstance(X, list):
+            units = np.repeat(np.arange(len(X)), [len(x) for x in X])
+            X = pd.concat([x[self.feature_names] for x in X], ignore_index=True)
+        else:
+            units = X['unit'].to_numpy()
+
+        # Stable sort keeps the original cycle order inside each unit, like groupby
+        order = np.argsort(units, kind='stable')
+        unit_ids, starts, counts = np.unique(units[order], return_index=True, return_counts=True)
+
+        # Position of every row counted from the end of its unit
+        from_end = np.repeat(starts + counts, counts) - np.arange(len(order)) - 1
+        if end_points > 0:
+            keep = from_end < end_points
+            order, from_end = order[keep], from_end[keep]
+            counts = np.minimum(counts, end_points)
+
+        window = X.iloc[order][self.feature_names]
+        if preprocess:
+            window = self._preprocess(window)
+        return unit_ids, window, counts
+
+    # Array variant of predict_units for a feature matrix grouped by unit (see
+    # fit_arrays): only the tail windows are gathered, into one float64 buffer that
+    # is scaled in place. Returns the RUL of every unit in offset order.
+    def predict_arrays(self, features, offsets, preprocess=True, end_points=10):
+        offsets = np.asarray(offsets)
+        counts = np.diff(offsets)
+        if end_points > 0:
+            counts = np.minimum(counts, end_points)
+        rows = np.repeat(offsets[1:] - counts, counts) + _positions(counts)
+
+        values = np.asarray(features)[rows].astype(np.float64)
+        if preprocess:
+            scale_inplace(self.scaler, values, self.feature_names)
+        with metrics.timed('forest_predict'):
+            rul_pred = self.regressor.predict(pd.DataFrame(values, columns=self.feature_names, copy=False))
+        return _extrapolate(np.asarray(rul_pred, dtype=float), counts)[1]
+
+
+# 0..n-1 inside each group of the given sizes
+def _positions(counts):
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+# Per-unit least-squares line through consecutive predictions (x runs 0..n-1 inside
+# each window, so the sums of x and x^2 only depend on n), evaluated at x = n. The
+# last axis runs over rows, so per-tree predictions (trees, rows) work too.
+def _extrapolate(rul_pred, counts):
+    n = counts.astype(float)
+    x = _positions(counts)
+    bounds = np.cumsum(counts) - counts
+    sum_y = np.add.reduceat(rul_pred, bounds, axis=-1)
+    sum_xy = np.add.reduceat(x * rul_pred, bounds, axis=-1)
+    sum_x = n * (n - 1) / 2
+    sum_xx = (n - 1) * n * (2 * n - 1) / 6
+
+    denom = n * sum_xx - sum_x ** 2
+    slope = np.divide(n * sum_xy - sum_x * sum_y, denom, out=np.zeros_like(sum_y), where=denom != 0)
+    intercept = (sum_y - slope * sum_x) / n
+    return slope, intercept + slope * n
+
+
+# Window-feature model: every cycle is described by its scaled sensor values plus
+# their rolling mean, std and slope over the last window_size cycles and an EWMA over
+# the unit's history (see window_features.py), so the forest sees each sensor's trend
+# instead of a single reading. Like PointPredictor it predicts from the last cycle of
+# each unit; the features of a whole fleet are computed in one vectorised pass.
+class RollingFeaturePredictor(SequenceModel):
+    def __init__(self, regressor, scaler=None, window_size=10, alpha=0.3):
+        self.regressor = regressor
+        self.scaler = scaler or StandardScaler()
+        self.scaler_unfit = scaler is None
+        self.window_size = window_size
+        self.alpha = alpha
+
+    # Trailing cycles a prediction depends on: the rolling window, or the EWMA's
+    # horizon (see window_features.ewma_horizon) when that is longer
+    @property
+    def window(self):
+        from window_features import ewma_horizon
+        return max(self.window_size, ewma_horizon(self.alpha))
+
+    # Scaled sensor values of the given rows (default: the last row of every unit)
+    # next to their window features, as the regressor's input frame
+    def _inputs(self, values, offsets, rows=None):
+        from window_features import last_window_features, window_features
+
+        n = len(self.feature_names)
+        if rows is None:
+            rows = np.asarray(offsets[1:]) - 1
+            engineered = last_window_features(values, offsets, self.window_size, self.alpha)
+        else:
+            engineered = window_features(values, offsets, self.window_size, self.alpha, rows)
+        inputs = np.empty((len(rows), 5 * n), dtype=np.float32)
+        inputs[:, :n] = values[rows]
+        inputs[:, n:] = engineered
+        return pd.DataFrame(inputs, columns=self.input_names, copy=False)
+
+    # Feature matrix sorted by unit (stable, so cycle order is kept) and the unit offsets
+    def _sorted_values(self, X):
+        units = X['unit'].to_numpy()
+        order = np.argsort(units, kind='stable')
+        return _feature_values(X, self.feature_names)[order], units[order], order
+
+    def _fit_values(self, values, offsets, y, feature_names, preprocess):
+        from window_features import feature_names as window_feature_names
+
+        self.feature_names = list(feature_names)
+        self.input_names = self.feature_names + window_feature_names(self.feature_names)
+        if self.scaler_unfit:
+            self.scaler.fit(pd.DataFrame(values, columns=self.feature_names, copy=False))
+        if preprocess:
+            scale_inplace(self.scaler, values, self.feature_names)
+        self.regressor.fit(self._inputs(values, offsets, rows=np.arange(len(values))), y)
+        return self
+
+    def fit(self, X, preprocess=True):
+        self.feature_names = [col for col in X.columns if col not in NON_FEATURE_COLUMNS]
+        values, units, order = self._sorted_values(X)
+        offsets = unit_offsets(units)
+        y = rul_labels(X['cycle'].to_numpy()[order], offsets)
+        return self._fit_values(values, offsets, y, self.feature_names, preprocess)
+
+    # Array variant of fit, as PointPredictor.fit_arrays
+    def fit_arrays(self, features, offsets, cycles, feature_names=None, preprocess=True, copy=True):
+        values = _float_buffer(features, copy)
+        feature_names = list(feature_names) if feature_names is not None else [f'f{i}' for i in range(values.shape[1])]
+        return self._fit_values(values, offsets, rul_labels(cycles, offsets), feature_names, preprocess)
+
+    def predict(self, X, preprocess=True):
+        return self.predict_units(X, preprocess=preprocess)['rul'].to_numpy()
+
+    # Unit ids, the feature rows of the last `window` cycles of every unit (the only
+    # ones gathered from the frame) and their unit offsets
+    def _tail_values(self, X):
+        if isinstance(X, list):
+            units = np.repeat(np.arange(len(X)), [len(x) for x in X])
+            X = pd.concat([x[self.feature_names] for x in X], ignore_index=True)
+            X['unit'] = units
+
+        units = X['unit'].to_numpy()
+        order = np.argsort(units, kind='stable')
+        offsets = unit_offsets(units[order])
+        counts = np.minimum(np.diff(offsets), self.window)
+        rows = order[np.repeat(offsets[1:] - counts, counts) + _positions(counts)]
+        values = _feature_values(X.iloc[rows], self.feature_names)
+        return units[order[offsets[:-1]]], values, np.concatenate(([0], np.cumsum(counts)))
+
+    def predict_units(self, X, preprocess=True):
+        units, values, offsets = self._tail_values(X)
+        return pd.DataFrame({
+            'unit': units,
+            'rul': self.predict_arrays(values, offsets, preprocess=preprocess)
+        })
+
+    # Unit ids and regressor input (one row per unit) of predict_units, for
+    # predict_interval
+    def _regressor_inputs(self, X, preprocess=True):
+        units, values, offsets = self._tail_values(X)
+        return units, self._array_inputs(values, offsets, preprocess), None
+
+    # RUL of every unit of a feature matrix grouped by unit (see fit_arrays); only
+    # the last `window` rows of each unit are copied and scaled
+    def predict_arrays(self, features, offsets, preprocess=True):
+        inputs = self._array_inputs(features, offsets, preprocess)
+        with metrics.timed('forest_predict'):
+            return np.asarray(self.regressor.predict(inputs))
+
+    def _array_inputs(self, features, offsets, preprocess):
+        offsets = np.asarray(offsets)
+        counts = np.minimum(np.diff(offsets), self.window)
+        values = np.asarray(features)[np.repeat(offsets[1:] - counts, counts) + _positions(counts)]
+        if values.dtype.kind != 'f':
+            values = values.astype(np.float64)
+        if preprocess:
+            with metrics.timed('preprocess'):
+                scale_inplace(self.scaler, values, self.feature_names)
+        return self._inputs(values, np.concatenate(([0], np.cumsum(counts))))
+
+    # Incremental scoring for cycles that arrive over time: state (from new_state)
+    # keeps what the windows need, so only the new rows are processed. Returns the RUL
+    # of every unit in X after its latest cycle.
+    def new_state(self, capacity=1024):
+        from window_features import WindowFeatureState
+        return WindowFeatureState(len(self.feature_names), self.window_size, self.alpha, capacity)
+
+    def predict_append(self, state, X, preprocess=True):
+        values, units, _ = self._sorted_values(X)
+        if preprocess:
+            scale_inplace(self.scaler, values, self.feature_names)
+        last = unit_offsets(units)[1:] - 1
+        n = len(self.feature_names)
+        inputs = np.empty((len(last), 5 * n), dtype=np.float32)
+        inputs[:, :n] = values[last]
+        inputs[:, n:] = state.append(units, values)[last]
+        with metrics.timed('forest_predict'):
+            rul = self.regressor.predict(pd.DataFrame(inputs, columns=self.input_names, copy=False))
+        return pd.DataFrame({'unit': units[last], 'rul': np.asarray(rul)})
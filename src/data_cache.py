@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+# Temporary directories of writes older than this were left by a crashed or failed
+# worker and are removed during eviction
+STALE_TMP_SECONDS = 600
+
+
+# Server-side store for parsed uploads. Each entry is a directory of per-column .npy
+# blocks named after the hash of the uploaded bytes, so the browser only has to hold
+# the key. Entries are evicted least-recently-used first once the total size on disk
+# goes over max_bytes. The cache lives on disk so every gunicorn worker shares it.
+class DatasetCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(raw):
+        return hashlib.sha256(raw).hexdigest()[:32]
+
+    def _path(self, key):
+        # Keys come back from the browser, so never let one escape the cache directory
+        if not key or not all(c in '0123456789abcdef' for c in key):
+            raise ValueError(f"Invalid cache key: {key!r}")
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key):
+        return os.path.isdir(self._path(key))
+
+    def put(self, key, df):
+        path = self._path(key)
+        if os.path.isdir(path):
+            os.utime(path)
+            return key
+
+        tmp = os.path.join(self.directory, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp)
+        try:
+            for i, col in enumerate(df.columns):
+                values = df[col].to_numpy()
+                if values.dtype == object:
+                    values = values.astype(str)
+                np.save(os.path.join(tmp, f'{i}.npy'), values, allow_pickle=False)
+            with open(os.path.join(tmp, 'columns.json'), 'w') as f:
+                json.dump([str(col) for col in df.columns], f)
+            os.rename(tmp, path)
+        except BaseException as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            # OSError from the rename: another worker stored the same upload first
+            if not isinstance(e, OSError) or not os.path.isdir(path):
+                raise
+
+        self._evict(keep=key)
+        return key
+
+    def get(self, key):
+        import pandas as pd
+
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, 'columns.json')) as f:
+                columns = json.load(f)
+            data = {col: np.load(os.path.join(path, f'{i}.npy'), allow_pickle=False) for i, col in enumerate(columns)}
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return pd.DataFrame(data, columns=columns)
+
+    # (mtime, size, path) of every entry, and of every unfinished write ('.tmp-*')
+    def _entries(self):
+        entries, writes = [], []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') and not name.startswith('.tmp-') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                (writes if name.startswith('.tmp-') else entries).append((os.stat(path).st_mtime, size, path))
+            except FileNotFoundError:
+                continue
+        return entries, writes
+
+    def _evict(self, keep=None):
+        entries, writes = self._entries()
+        entries.sort()
+        # Writes still in progress count against max_bytes, stale ones are removed
+        stale = time.time() - STALE_TMP_SECONDS
+        for mtime, _, path in writes:
+            if mtime < stale:
+                shutil.rmtree(path, ignore_errors=True)
+        total = sum(size for mtime, size, _ in writes if mtime >= stale) + sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and os.path.basename(path) == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,225 @@
+import os
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+import pandas as pd
+
+import parallel
+from ingest import load_arrays, load_cmapss
+
+# Evaluation of any SequenceModel against the CMAPSS ground truth: RMSE, the
+# asymmetric scoring function of the PHM08 challenge (late predictions cost more than
+# early ones) and the error per true-RUL bucket. evaluate_datasets scores the test sets
+# (test_FD00x against RUL_FD00x) and unit-grouped cross-validation folds of the train
+# sets as independent tasks in a pool of forked processes (parallel.fork_pool).
+#   python src/evaluation.py artifacts/model.joblib --datasets FD001 FD003 --folds 5
+
+DATASETS = ('FD001', 'FD002', 'FD003', 'FD004')
+RUL_BUCKETS = (0, 25, 50, 75, 100, 125, 150, np.inf)
+# Test-set units are observed for at least this many cycles (Saxena et al., 2008); the
+# cross-validation folds cut their held-out units the same way
+MIN_OBSERVED_CYCLES = 31
+
+
+def rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((np.asarray(y_pred) - np.asarray(y_true)) ** 2)))
+
+
+# PHM08 score: sum of exp(-d/13) - 1 for early predictions (d < 0) and exp(d/10) - 1
+# for late ones, with d = predicted - true RUL. Lower is better.
+def nasa_score(y_true, y_pred):
+    d = np.asarray(y_pred, dtype=np.float64) - np.asarray(y_true, dtype=np.float64)
+    return float(np.sum(np.where(d < 0, np.expm1(-d / 13), np.expm1(d / 10))))
+
+
+# Units, RMSE, mean error (bias) and score per bucket of the true RUL
+def bucket_errors(y_true, y_pred, buckets=RUL_BUCKETS):
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    labels = [f'{lo:g}-{hi:g}' if np.isfinite(hi) else f'{lo:g}+' for lo, hi in zip(buckets[:-1], buckets[1:])]
+    index = np.digitize(y_true, buckets[1:-1])
+    rows = []
+    for i, label in enumerate(labels):
+        mask = index == i
+        rows.append({
+            'bucket': label,
+            'units': int(mask.sum()),
+            'rmse': rmse(y_true[mask], y_pred[mask]) if mask.any() else np.nan,
+            'bias': float(np.mean(y_pred[mask] - y_true[mask])) if mask.any() else np.nan,
+            'score': nasa_score(y_true[mask], y_pred[mask]) if mask.any() else np.nan
+        })
+    return pd.DataFrame(rows).set_index('bucket')
+
+
+# Predicted RUL of every unit of X_test (in unit order, like the RUL_FD00x files),
+# clipped at 0 as the app serves it
+def predict_test(model, X_test):
+    return np.clip(model.predict_units(X_test, preprocess=True)['rul'].to_numpy(np.float64), 0, None)
+
+
+def metrics_for(y_true, y_pred):
+    y_true = np.asarray(y_true, dtype=np.float64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+    if len(y_true) != len(y_pred):
+        raise ValueError(f"{len(y_pred)} predicted units, but {len(y_true)} true RUL values.")
+    return {
+        'units': len(y_true),
+        'rmse': rmse(y_true, y_pred),
+        'mae': float(np.mean(np.abs(y_pred - y_true))),
+        'bias': float(np.mean(y_pred - y_true)),
+        'score': nasa_score(y_true, y_pred)
+    }
+
+
+def evaluate(model, X_test, y_test):
+    y_pred = predict_test(model, X_test)
+    result = metrics_for(y_test, y_pred)
+    result['buckets'] = bucket_errors(np.asarray(y_test, dtype=np.float64).ravel(), y_pred)
+    return result
+
+
+def print_report(model, X_test, y_test):
+    result = evaluate(model, X_test, y_test)
+    print(f"{type(model).__name__} on {result['units']} units: RMSE {result['rmse']:.2f}, "
+          f"MAE {result['mae']:.2f}, bias {result['bias']:+.2f}, score {result['score']:.1f}")
+    print(result['buckets'].to_string(float_format=lambda v: f'{v:.2f}'))
+    return result
+
+
+# Held-out units of each fold: every unit in exactly one fold, shuffled with seed
+def unit_folds(units, folds=5, seed=42):
+    units = np.unique(units)
+    return np.array_split(np.random.default_rng(seed).permutation(units), min(folds, len(units)))
+
+
+# Cuts every unit at a random cycle (at least MIN_OBSERVED_CYCLES, or the whole unit
+# when it is shorter), like the test sets. Returns the cut frame and the true RUL of
+# every unit in unit order.
+def truncate_units(df, seed=42):
+    df = df.sort_values(['unit', 'cycle'], kind='stable')
+    life = df.groupby('unit', sort=True)['cycle'].max().to_numpy()
+    rng = np.random.default_rng(seed)
+    cut = rng.integers(np.minimum(MIN_OBSERVED_CYCLES, life), life + 1)
+    keep = df['cycle'].to_numpy() <= np.repeat(cut, df.groupby('unit', sort=True).size().to_numpy())
+    return df[keep], life - cut
+
+
+# Unfitted copy of a model with a fresh regressor and scaler, for one fold. A compiled
+# forest (saved artifacts, see utils.save_model_artifact) is replaced by a clone of
+# the sklearn forest it was compiled from.
+def unfitted(model, n_jobs=None):
+    from sklearn.base import clone
+    from tree_engine import CompiledForest
+
+    params = model.get_params(deep=False)
+    regressor = params['regressor']
+    if isinstance(regressor, CompiledForest):
+        regressor = regressor.fallback if regressor.fallback is not None else regressor.estimator
+        if regressor is None:
+            raise ValueError("This compiled forest does not record its sklearn hyperparameters; "
+                             "save it again with utils.save_model_artifact to cross-validate it.")
+    params['regressor'] = clone(regressor)
+    params['scaler'] = None
+    if n_jobs is not None and 'n_jobs' in params['regressor'].get_params():
+        params['regressor'].set_params(n_jobs=n_jobs)
+    return type(model)(**params)
+
+
+def _path(dataset_dir, kind, name):
+    return os.path.join(dataset_dir, f'{kind}_{name}.txt')
+
+
+# One unit of work for the pool: ('test', name) scores the model on a test set,
+# ('cv', name, fold) fits a fresh model on the other folds of the train set and scores
+# it on the cut held-out units. Returns the task, true and predicted RUL and seconds.
+def _run_task(task, dataset_dir, folds, seed, n_jobs):
+    start = time.perf_counter()
+    if task[0] == 'test':
+        X_test = load_cmapss(_path(dataset_dir, 'test', task[1]))
+        y_true = np.loadtxt(_path(dataset_dir, 'RUL', task[1]), ndmin=1)
+        y_pred = predict_test(parallel.shared, X_test)
+    else:
+        train = load_cmapss(_path(dataset_dir, 'train', task[1]))
+        held_out = np.isin(train['unit'].to_numpy(), unit_folds(train['unit'], folds, seed)[task[2]])
+        model = unfitted(parallel.shared, n_jobs).fit(train[~held_out])
+        X_test, y_true = truncate_units(train[held_out], seed + task[2])
+        y_pred = predict_test(model, X_test)
+    return task, y_true, y_pred, time.perf_counter() - start
+
+
+# Test-set and (with folds > 1) cross-validation results for every dataset whose files
+# exist under dataset_dir, computed in `workers` forked processes. Returns the summary
+# per dataset (test metrics and the mean and spread of the fold RMSEs) and the error
+# buckets of every test set.
+def evaluate_datasets(model, names=DATASETS, folds=0, workers=None, dataset_dir='dataset', seed=42):
+    tasks = []
+    for name in names:
+        if os.path.exists(_path(dataset_dir, 'test', name)) and os.path.exists(_path(dataset_dir, 'RUL', name)):
+            load_arrays(_path(dataset_dir, 'test', name))  # parse once here, not in every worker
+            tasks.append(('test', name))
+        else:
+            print(f"Skipping the {name} test set: test_{name}.txt or RUL_{name}.txt not found in {dataset_dir}.")
+        if folds > 1:
+            if os.path.exists(_path(dataset_dir, 'train', name)):
+                load_arrays(_path(dataset_dir, 'train', name))
+                tasks += [('cv', name, fold) for fold in range(folds)]
+            else:
+                print(f"Skipping {name} cross-validation: train_{name}.txt not found in {dataset_dir}.")
+
+    workers = min(workers or os.cpu_count() or 1, max(1, len(tasks)))
+    # Forests fitted inside the pool get one thread each when the pool fills the CPUs
+    n_jobs = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+    with parallel.fork_pool(model, workers) as pool:
+        if pool is None:
+            results = [_run_task(task, dataset_dir, folds, seed, n_jobs) for task in tasks]
+        else:
+            futures = [pool.submit(_run_task, task, dataset_dir, folds, seed, n_jobs) for task in tasks]
+            results = [future.result() for future in as_completed(futures)]
+
+    summary, buckets = {}, {}
+    for task, y_true, y_pred, seconds in sorted(results, key=lambda result: result[0]):
+        row = summary.setdefault(task[1], {'dataset': task[1]})
+        if task[0] == 'test':
+            row.update({f'test_{key}': value for key, value in metrics_for(y_true, y_pred).items()})
+            row['test_seconds'] = seconds
+            buckets[task[1]] = bucket_errors(y_true, y_pred)
+        else:
+            row.setdefault('_fold_rmse', []).append(rmse(y_true, y_pred))
+            row.setdefault('_fold_score', []).append(nasa_score(y_true, y_pred))
+            row['cv_seconds'] = row.get('cv_seconds', 0) + seconds
+
+    for row in summary.values():
+        fold_rmse, fold_score = row.pop('_fold_rmse', None), row.pop('_fold_score', None)
+        if fold_rmse:
+            row['cv_rmse'] = float(np.mean(fold_rmse))
+            row['cv_rmse_std'] = float(np.std(fold_rmse))
+            row['cv_score'] = float(np.mean(fold_score))
+    table = pd.DataFrame([summary[name] for name in names if name in summary])
+    return (table.set_index('dataset') if len(table) else table), buckets
+
+
+def print_dataset_report(model, names=DATASETS, folds=0, workers=None, dataset_dir='dataset', seed=42):
+    start = time.perf_counter()
+    table, buckets = evaluate_datasets(model, names, folds, workers, dataset_dir, seed)
+    print(f"{type(model).__name__}: {len(table)} datasets in {time.perf_counter() - start:.1f} s")
+    print(table.to_string(float_format=lambda v: f'{v:.2f}'))
+    if buckets:
+        print("\nTest RMSE by true RUL:")
+        print(pd.DataFrame({name: frame['rmse'] for name, frame in buckets.items()}).to_string(float_format=lambda v: f'{v:.2f}'))
+    return table, buckets
+
+
+if __name__ == '__main__':
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description='Evaluate a saved model on the CMAPSS test sets.')
+    parser.add_argument('model', help='joblib file of a SequenceModel (as saved by the notebook)')
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS))
+    parser.add_argument('--folds', type=int, default=0, help='unit-grouped CV folds on the train sets (0: off)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dataset-dir', default='dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print_dataset_report(joblib.load(args.model), args.datasets, args.folds, args.workers, args.dataset_dir, args.seed)
@@ -0,0 +1,271 @@
+import csv
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+COLUMNS = ['equipment', 'unit', 'cycle', 'rul', 'created_at']
+NUMERIC_COLUMNS = {'unit', 'cycle', 'rul', 'created_at'}
+
+# Dash DataTable filter_query operators -> SQL
+_OPERATORS = {
+    '=': '=', 'eq': '=', '!=': '!=', 'ne': '!=',
+    '<': '<', 'lt': '<', '<=': '<=', 'le': '<=',
+    '>': '>', 'gt': '>', '>=': '>=', 'ge': '>=',
+    'contains': 'LIKE', 'datestartswith': 'LIKE'
+}
+_CLAUSE = re.compile(r'^\{(\w+)\}\s+(\S+)\s+(.+)$')
+# Filtered row counts kept per HistoryStore (see HistoryStore.count)
+COUNT_CACHE_SIZE = 256
+
+
+# LIKE pattern matching value literally: % and _ are wildcards in LIKE
+def _like_literal(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# Translates a DataTable filter_query ("{unit} = 3 && {equipment} contains Eng") into
+# a parameterised WHERE clause. Column names are whitelisted; clauses that can't be
+# parsed are ignored, the way the table's native filtering ignores them.
+def parse_filter(filter_query):
+    where, params = [], []
+    for clause in (filter_query or '').split(' && '):
+        match = _CLAUSE.match(clause.strip())
+        if not match:
+            continue
+        column, operator, value = match.groups()
+        if column not in COLUMNS or operator not in _OPERATORS:
+            continue
+
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        if operator == 'contains':
+            value = f'%{_like_literal(value)}%'
+        elif operator == 'datestartswith':
+            value = f'{_like_literal(value)}%'
+        elif column in NUMERIC_COLUMNS:
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+
+        escape = " ESCAPE '\\'" if _OPERATORS[operator] == 'LIKE' else ''
+        where.append(f'{column} {_OPERATORS[operator]} ?{escape}')
+        params.append(value)
+    return (' WHERE ' + ' AND '.join(where)) if where else '', params
+
+
+# parse_filter plus "id > since": a client that reset its view only sees later rows
+def _where(filter_query, since=0):
+    where, params = parse_filter(filter_query)
+    if since:
+        where = f'{where} AND id > ?' if where else ' WHERE id > ?'
+        params.append(since)
+    return where, params
+
+
+# (column, descending) of every sort term, ending with id so the order is total
+def _sort_terms(sort_by):
+    terms = [(item['column_id'], item.get('direction') == 'desc') for item in (sort_by or []) if item.get('column_id') in COLUMNS]
+    return terms + [('id', True)]
+
+
+def _order_by(sort_by):
+    return ' ORDER BY ' + ', '.join(f"{column} {'DESC' if desc else 'ASC'}" for column, desc in _sort_terms(sort_by))
+
+
+# Rows that come after a cursor (the sort values and id of a row, see
+# HistoryStore.cursor) in _order_by's order. Terms may mix directions, so this is
+# spelled out term by term instead of a single row-value comparison.
+def _after(sort_by, cursor):
+    terms = _sort_terms(sort_by)
+    clauses, params = [], []
+    for i, (column, desc) in enumerate(terms):
+        clauses.append(' AND '.join([f'{c} = ?' for c, _ in terms[:i]] + [f"{column} {'<' if desc else '>'} ?"]))
+        params += list(cursor[:i + 1])
+    return '(' + ' OR '.join(f'({clause})' for clause in clauses) + ')', params
+
+
+# Prediction history in an embedded SQLite database (WAL mode, so every gunicorn
+# worker can read while another writes). Pages, sorting and filtering are done by
+# SQL on indexed columns, and exports are streamed in batches, so the history can
+# grow to millions of rows without the browser or a worker holding all of it.
+class HistoryStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._counts = OrderedDict()
+        self._counts_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    equipment TEXT NOT NULL,
+                    unit INTEGER NOT NULL,
+                    cycle INTEGER NOT NULL,
+                    rul REAL NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_predictions_equipment ON predictions (equipment);
+                CREATE INDEX IF NOT EXISTS idx_predictions_unit_cycle ON predictions (unit, cycle);
+                CREATE INDEX IF NOT EXISTS idx_predictions_cycle ON predictions (cycle);
+                CREATE INDEX IF NOT EXISTS idx_predictions_rul ON predictions (rul);
+            """)
+
+    # One connection per thread; sqlite3 connections can't be shared across threads,
+    # nor with a forked process (background jobs, see jobs.py), which opens its own
+    def _connect(self):
+        if self._pid != os.getpid():
+            self._local, self._pid = threading.local(), os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add(self, entries):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO predictions (equipment, unit, cycle, rul, created_at) VALUES (?, ?, ?, ?, ?)',
+                [(e['equipment'], e['unit'], e['cycle'], e['rul'], e.get('created_at', now)) for e in entries]
+            )
+
+    # Deletes every worker's and user's history; the app's Reset only hides the rows
+    # that existed at the time (see last_id). Run as: python src/history_store.py purge
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM predictions')
+        with self._counts_lock:
+            self._counts.clear()
+
+    def last_id(self):
+        return self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM predictions').fetchone()[0]
+
+    # Rows matching a filter. Rows are only ever appended (ids keep growing) or all
+    # deleted, so a cached count is brought up to date by counting the rows after the
+    # last id it saw, on the primary key, instead of scanning the table again; it is
+    # recomputed when the lowest id changed, i.e. after a purge.
+    def count(self, filter_query=None, since=0):
+        conn = self._connect()
+        first, last = conn.execute('SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM predictions').fetchone()
+        key = (filter_query or '', since)
+        with self._counts_lock:
+            cached = self._counts.get(key)
+        if cached is not None and cached[0] == first and cached[1] == last:
+            total = cached[2]
+        else:
+            fresh = cached is not None and cached[0] == first and cached[1] < last
+            where, params = _where(filter_query, max(since, cached[1]) if fresh else since)
+            # Bounded by last, so rows added meanwhile are left to the next update
+            where = f'{where} AND id <= ?' if where else ' WHERE id <= ?'
+            total = conn.execute(f'SELECT COUNT(*) FROM predictions{where}', params + [last]).fetchone()[0]
+            total += cached[2] if fresh else 0
+        with self._counts_lock:
+            self._counts[key] = (first, last, total)
+            self._counts.move_to_end(key)
+            while len(self._counts) > COUNT_CACHE_SIZE:
+                self._counts.popitem(last=False)
+        return total
+
+    # One page of rows (with their id) in _order_by's order. cursors maps page numbers
+    # to the cursor of their last row: the page right after a known one is read by
+    # keyset, the rows after that cursor on the sort index; pages further on skip the
+    # rows in between from the nearest known page (from the start without one).
+    def page(self, page_current=0, page_size=20, sort_by=None, filter_query=None, since=0, cursors=None):
+        where, params = _where(filter_query, since)
+        known = [page for page in (cursors or {}) if page < page_current]
+        offset = page_current * page_size
+        if known:
+            nearest = max(known)
+            after, after_params = _after(sort_by, cursors[nearest])
+            where = f'{where} AND {after}' if where else f' WHERE {after}'
+            params = params + after_params
+            offset = (page_current - nearest - 1) * page_size
+        cursor = self._connect().execute(
+            f'SELECT id, {", ".join(COLUMNS)} FROM predictions{where}{_order_by(sort_by)} LIMIT ? OFFSET ?',
+            params + [page_size, offset]
+        )
+        return [dict(zip(['id'] + COLUMNS, row)) for row in cursor]
+
+    # Keyset cursor of a row returned by page: its sort values and id
+    @staticmethod
+    def cursor(sort_by, row):
+        return [row[column] for column, _ in _sort_terms(sort_by)]
+
+    # Most recent entries, oldest first
+    def recent(self, limit, since=0):
+        cursor = self._connect().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM predictions WHERE id > ? ORDER BY id DESC LIMIT ?', (since, limit)
+        )
+        return [dict(zip(COLUMNS, row)) for row in cursor][::-1]
+
+    def iter_batches(self, filter_query=None, sort_by=None, batch_size=10000, since=0):
+        where, params = _where(filter_query, since)
+        # Separate connection so a long export never shares a cursor with the UI thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(f'SELECT {", ".join(COLUMNS)} FROM predictions{where}{_order_by(sort_by)}', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def iter_csv(self, filter_query=None, sort_by=None, since=0):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for rows in self.iter_batches(filter_query, sort_by, since=since):
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    # Parquet needs pyarrow, which is optional; row groups are written batch by batch
+    # to a spooled file and streamed from there
+    def iter_parquet(self, filter_query=None, sort_by=None, chunk_bytes=1 << 20, since=0):
+        import tempfile
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([('equipment', pa.string()), ('unit', pa.int64()), ('cycle', pa.int64()),
+                            ('rul', pa.float64()), ('created_at', pa.float64())])
+        with tempfile.SpooledTemporaryFile(max_size=64 << 20) as spool:
+            with pq.ParquetWriter(spool, schema) as writer:
+                for rows in self.iter_batches(filter_query, sort_by, since=since):
+                    writer.write_table(pa.Table.from_arrays([pa.array(col) for col in zip(*rows)], schema=schema))
+            spool.seek(0)
+            while True:
+                chunk = spool.read(chunk_bytes)
+                if not chunk:
+                    break
+                yield chunk
+
+
+if __name__ == '__main__':
+    import argparse
+    import config
+
+    parser = argparse.ArgumentParser(description='Maintenance of the prediction history database.')
+    parser.add_argument('action', choices=['purge'], help='purge: delete every stored prediction')
+    parser.add_argument('--db', default=config.HISTORY_DB_PATH, help='database path (default: HISTORY_DB_PATH)')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    n_rows = store.count()
+    store.clear()
+    print(f"Deleted {n_rows} predictions from {args.db}.")
@@ -0,0 +1,260 @@
+import gzip
+import io
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# Fixed schema shared by the raw CMAPSS files, uploads and training. Features stay
+# float64: forests put split thresholds within a float32 step of training values, so
+# parsing into float32 moved served predictions by up to 1.8 cycles (test_FD001)
+# compared with the float64 frames the models are trained on.
+COLUMNS = ['unit', 'cycle', 'setting1', 'setting2', 'setting3'] + [f'sensor{i}' for i in range(1, 22)]
+FEATURES = COLUMNS[2:]
+SCHEMA = {'unit': np.int32, 'cycle': np.int32, **{col: np.float64 for col in FEATURES}}
+
+CHUNK_ROWS = 200_000
+SIDECAR_VERSION = 2
+
+
+class SchemaError(ValueError):
+    pass
+
+
+# Accepts a path, raw bytes or a binary file object, and transparently unwraps gzip
+def _open(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        handle = io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        handle = open(source, 'rb')
+    else:
+        handle = source
+
+    if not hasattr(handle, 'peek'):
+        handle = io.BufferedReader(handle)
+    if handle.peek(2)[:2] == b'\x1f\x8b':
+        handle = gzip.GzipFile(fileobj=handle)
+    return handle
+
+
+# Raw CMAPSS text has no header and is space separated; uploads are CSV with a header
+def _sniff(handle):
+    first_line = handle.peek(64 * 1024).split(b'\n', 1)[0].decode('utf-8', errors='replace')
+    sep = ',' if ',' in first_line else r'\s+'
+    tokens = [token for token in (first_line.split(',') if sep == ',' else first_line.split()) if token.strip()]
+    if not tokens:
+        raise SchemaError("File contains no rows.")
+    try:
+        [float(token) for token in tokens]
+    except ValueError:
+        return sep, True
+
+    if len(tokens) != len(COLUMNS):
+        raise SchemaError(f"Expected {len(COLUMNS)} columns without a header, found {len(tokens)}.")
+    return sep, False
+
+
+def iter_chunks(source, chunk_rows=CHUNK_ROWS):
+    handle = _open(source)
+    sep, has_header = _sniff(handle)
+
+    # Headerless files are parsed straight into the schema dtypes; with a header the
+    # columns are only known after parsing, so they are checked and cast per chunk
+    if has_header:
+        reader = pd.read_csv(handle, sep=sep, header=0, chunksize=chunk_rows)
+    else:
+        reader = pd.read_csv(handle, sep=sep, header=None, names=COLUMNS, dtype=SCHEMA, chunksize=chunk_rows)
+
+    with reader:
+        try:
+            for chunk in reader:
+                yield _apply_schema(chunk)
+        except (ValueError, pd.errors.ParserError) as e:
+            if isinstance(e, SchemaError):
+                raise
+            raise SchemaError(f"Could not parse file: {e}") from e
+
+
+def _apply_schema(chunk):
+    missing = [col for col in COLUMNS if col not in chunk.columns]
+    if missing:
+        raise SchemaError(f"Missing required columns: {', '.join(missing)}")
+    # Checked first: the columns of a header-only CSV have no numeric dtype
+    if chunk.empty:
+        raise SchemaError("Payload contains no rows.")
+
+    non_numeric = [col for col in COLUMNS if not pd.api.types.is_numeric_dtype(chunk[col])]
+    if non_numeric:
+        raise SchemaError(f"Column '{non_numeric[0]}' must contain numeric values.")
+
+    # Missing or infinite ids can't be cast to int32 (pandas raises IntCastingNaNError),
+    # and fractional ones would be truncated into another unit or cycle
+    for col in ('unit', 'cycle'):
+        if chunk[col].dtype.kind == 'f':
+            values = chunk[col].to_numpy()
+            if not np.isfinite(values).all():
+                raise SchemaError(f"Column '{col}' must not contain missing or infinite values.")
+            if (values != np.round(values)).any():
+                raise SchemaError(f"Column '{col}' must contain whole numbers.")
+
+    return chunk.astype({col: dtype for col, dtype in SCHEMA.items() if chunk[col].dtype != dtype}, copy=False)
+
+
+# Parses an upload (CSV, raw CMAPSS text or either gzipped) straight from the decoded
+# bytes, without building an intermediate str copy of the file
+def read_frame(source, chunk_rows=CHUNK_ROWS):
+    chunks = list(iter_chunks(source, chunk_rows))
+    if not chunks:
+        raise SchemaError("File contains no rows.")
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+
+
+# Column-oriented JSON: {"unit": [...], "cycle": [...], "setting1": [...], ...}
+def from_columns(data):
+    if not isinstance(data, dict) or not all(isinstance(values, list) for values in data.values()):
+        raise SchemaError("Expected a JSON object mapping column names to lists of values.")
+    if len({len(data[col]) for col in COLUMNS if col in data}) > 1:
+        raise SchemaError("All columns must have the same length.")
+    frame = pd.DataFrame({col: data[col] for col in COLUMNS if col in data})
+    return _apply_schema(frame)
+
+
+# A .npy payload: either an (n, 26) array in COLUMNS order or a structured array
+# with one field per column
+def from_npy(source):
+    try:
+        array = np.load(io.BytesIO(bytes(source)), allow_pickle=False)
+    except ValueError as e:
+        raise SchemaError(f"Could not read NumPy payload: {e}") from e
+    if not isinstance(array, np.ndarray):  # np.load returns an NpzFile for .npz archives
+        raise SchemaError("Expected a single .npy array, not an .npz archive.")
+
+    if array.dtype.names:
+        frame = pd.DataFrame({name: array[name] for name in array.dtype.names})
+    elif array.ndim == 2 and array.shape[1] == len(COLUMNS):
+        frame = pd.DataFrame(array, columns=COLUMNS)
+    else:
+        raise SchemaError(f"Expected an array of shape (n, {len(COLUMNS)}), got {array.shape}.")
+    return _apply_schema(frame)
+
+
+# An Arrow IPC stream or file. pyarrow is optional and only imported here.
+def from_arrow(source):
+    import pyarrow as pa
+
+    try:
+        reader = pa.ipc.open_stream(source)
+    except pa.ArrowInvalid:
+        try:
+            reader = pa.ipc.open_file(source)
+        except pa.ArrowInvalid as e:
+            raise SchemaError(f"Could not read Arrow payload: {e}") from e
+    return _apply_schema(reader.read_all().to_pandas())
+
+
+def _sidecar_paths(path, cache_dir):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+    base = os.path.join(cache_dir, os.path.basename(path))
+    return cache_dir, base + '.ids.npy', base + '.features.npy', base + '.json'
+
+
+def _source_meta(path):
+    stat = os.stat(path)
+    return {'version': SIDECAR_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# Parses the file in chunks into two .npy sidecars (int32 unit/cycle and float64
+# features). Each chunk is appended to a raw file as soon as it is parsed; once the
+# row count is known, the raw data is copied block by block into the memory-mapped
+# .npy. Only one chunk of the table is ever held in memory.
+def _build_sidecar(path, cache_dir, ids_path, features_path, meta_path):
+    os.makedirs(cache_dir, exist_ok=True)
+    suffix = f'.tmp-{uuid.uuid4().hex}'
+    outputs = [(ids_path, ['unit', 'cycle'], np.int32), (features_path, FEATURES, np.float64)]
+    try:
+        n_rows = 0
+        with open(ids_path + suffix, 'wb') as ids_raw, open(features_path + suffix, 'wb') as features_raw:
+            for chunk in iter_chunks(path):
+                ids_raw.write(chunk[['unit', 'cycle']].to_numpy(np.int32).tobytes())
+                features_raw.write(chunk[FEATURES].to_numpy(np.float64).tobytes())
+                n_rows += len(chunk)
+
+        for final, columns, dtype in outputs:
+            shape = (n_rows, len(columns))
+            raw = np.memmap(final + suffix, dtype=dtype, mode='r', shape=shape) if n_rows else np.empty(shape, dtype)
+            out = np.lib.format.open_memmap(final + suffix + '.npy', mode='w+', dtype=dtype, shape=shape)
+            for start in range(0, n_rows, CHUNK_ROWS):
+                out[start:start + CHUNK_ROWS] = raw[start:start + CHUNK_ROWS]
+            out.flush()
+            del out, raw
+            os.replace(final + suffix + '.npy', final)
+    finally:
+        for final, _, _ in outputs:
+            for leftover in (final + suffix, final + suffix + '.npy'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    with open(meta_path + suffix, 'w') as f:
+        json.dump(_source_meta(path), f)
+    os.replace(meta_path + suffix, meta_path)
+
+
+# Returns (ids, features) arrays for a raw file, memory-mapped from the sidecar. The
+# first load parses the text; later loads only map the binary files. mmap_mode='c'
+# keeps pages shared between processes until someone writes to them.
+def load_arrays(path, cache_dir=None, mmap_mode='c'):
+    cache_dir, ids_path, features_path, meta_path = _sidecar_paths(path, cache_dir)
+    try:
+        with open(meta_path) as f:
+            fresh = json.load(f) == _source_meta(path)
+    except (OSError, ValueError):
+        fresh = False
+
+    if not fresh:
+        try:
+            _build_sidecar(path, cache_dir, ids_path, features_path, meta_path)
+        except OSError:
+            # Read-only dataset directory: fall back to an in-memory parse
+            frame = read_frame(path)
+            return frame[['unit', 'cycle']].to_numpy(np.int32), frame[FEATURES].to_numpy(np.float64)
+
+    return np.load(ids_path, mmap_mode=mmap_mode), np.load(features_path, mmap_mode=mmap_mode)
+
+
+def to_frame(ids, features):
+    df = pd.DataFrame(features, columns=FEATURES, copy=False)
+    df.insert(0, 'cycle', ids[:, 1])
+    df.insert(0, 'unit', ids[:, 0])
+    return df
+
+
+def load_cmapss(path, cache_dir=None):
+    return to_frame(*load_arrays(path, cache_dir))
+
+
+def _resolve(name, dataset_dir):
+    if os.path.exists(name):
+        return name
+    path = os.path.join(dataset_dir, name)
+    return path if os.path.exists(path) or path.endswith('.txt') else path + '.txt'
+
+
+# Concatenates several CMAPSS files, shifting unit ids so they stay unique
+def load_fleet(names, dataset_dir='dataset', cache_dir=None):
+    frames, offset = [], 0
+    for name in names:
+        df = load_cmapss(_resolve(name, dataset_dir), cache_dir)
+        if offset:
+            df['unit'] = df['unit'] + offset
+        offset = int(df['unit'].max())
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_rul(names, dataset_dir='dataset'):
+    return pd.concat([
+        pd.read_csv(_resolve(name, dataset_dir), sep=r'\s+', header=None, names=['RUL'])
+        for name in names
+    ], ignore_index=True)
@@ -0,0 +1,64 @@
+import math
+from concurrent.futures import as_completed
+
+from dash import DiskcacheManager
+
+import parallel
+
+# Scoring for background prediction jobs. The tail windows of a fleet are split into
+# chunks of whole units and model.predict_units runs on each chunk, in a pool of
+# forked processes (parallel.fork_pool, which shares the model with them) when there
+# is more than one worker, reporting progress after every chunk.
+# numpy and pandas are imported inside the functions, as the app imports this module
+# at startup (see startup.py).
+
+
+# Dash background callback manager over directory, or None when diskcache is not
+# installed (pip install "dash[diskcache]"). Every job is a process forked from the
+# request thread, with its progress and result stored in the diskcache directory.
+def background_manager(directory):
+    try:
+        import diskcache
+    except ImportError:
+        print("diskcache is not installed; predictions run in the request thread.")
+        return None
+    return DiskcacheManager(diskcache.Cache(directory))
+
+
+def _predict_chunk(windows):
+    return parallel.shared.predict_units(windows, preprocess=True)
+
+
+# Start/stop row of every chunk: about chunk_rows rows each, never cutting a unit
+def chunk_bounds(units, chunk_rows):
+    import numpy as np
+    starts = np.flatnonzero(np.r_[True, units[1:] != units[:-1]])
+    n_chunks = min(len(starts), max(1, math.ceil(len(units) / chunk_rows)))
+    cuts = starts[np.linspace(0, len(starts), n_chunks, endpoint=False).astype(int)]
+    return list(zip(cuts, np.append(cuts[1:], len(units))))
+
+
+# Per-unit predictions (as model.predict_units) for tail windows sorted by unit.
+# progress(done, total) is called as chunks finish.
+def predict_units_parallel(model, windows, workers=1, chunk_rows=10000, progress=None):
+    import pandas as pd
+
+    bounds = chunk_bounds(windows['unit'].to_numpy(), chunk_rows)
+    chunks = [windows.iloc[start:stop] for start, stop in bounds]
+    results = [None] * len(chunks)
+    if progress is not None:
+        progress(0, len(chunks))
+
+    with parallel.fork_pool(model, min(workers, len(chunks))) as pool:
+        if pool is None:
+            for i, chunk in enumerate(chunks):
+                results[i] = _predict_chunk(chunk)
+                if progress is not None:
+                    progress(i + 1, len(chunks))
+        else:
+            futures = {pool.submit(_predict_chunk, chunk): i for i, chunk in enumerate(chunks)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if progress is not None:
+                    progress(done, len(chunks))
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,208 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics for the hot paths, served in the Prometheus text format by the
+# /metrics route. Every stage (upload parsing, preprocessing, forest evaluation,
+# figure building, ...) reports its latency, and where it makes sense the payload
+# size and the row/unit counts it handled. Each gunicorn worker keeps its own
+# registry; scrape the workers individually or sum the series.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+COUNT_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+FAMILIES = {
+    'pm_stage_seconds': ('histogram', 'Latency of each instrumented stage.', LATENCY_BUCKETS),
+    'pm_payload_bytes': ('histogram', 'Size of uploads, API bodies and responses.', SIZE_BUCKETS),
+    'pm_rows': ('histogram', 'Rows handled per call.', COUNT_BUCKETS),
+    'pm_units': ('histogram', 'Units handled per call.', COUNT_BUCKETS),
+    'pm_errors_total': ('counter', 'Errors raised by each stage.', None),
+    'pm_prediction_cache_hits_total': ('counter', 'Per-unit prediction cache hits.', None),
+    'pm_prediction_cache_misses_total': ('counter', 'Per-unit prediction cache misses.', None),
+    'pm_prediction_cache_entries': ('gauge', 'Entries in the per-unit prediction cache.', None),
+    'pm_model_ready': ('gauge', '1 once the model is loaded.', None),
+    'pm_models_resident': ('gauge', 'Models loaded in this worker.', None),
+    'pm_models_resident_bytes': ('gauge', 'Approximate memory held by the loaded models.', None),
+    'pm_model_reloads_total': ('counter', 'Models reloaded after their artifacts changed.', None)
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+
+class Registry:
+    def __init__(self):
+        self._series = {name: {} for name in FAMILIES}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            if key not in series:
+                series[key] = Histogram(FAMILIES[name][2])
+            series[key].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[name][key] = self._series[name].get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._series[name][tuple(sorted(labels.items()))] = value
+
+    def clear(self):
+        with self._lock:
+            for series in self._series.values():
+                series.clear()
+
+    # JSON-serialisable copy of the series, for merge() into another process's registry
+    # (background jobs return theirs to the app, see app.py)
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: [[[list(label) for label in key], [value.counts, value.sum, value.count] if isinstance(value, Histogram) else value]
+                       for key, value in series.items()]
+                for name, series in self._series.items() if series
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, series in snapshot.items():
+                kind = FAMILIES[name][0]
+                for labels, value in series:
+                    key = tuple(tuple(label) for label in labels)
+                    current = self._series[name].get(key)
+                    if kind == 'histogram':
+                        if current is None:
+                            current = self._series[name][key] = Histogram(FAMILIES[name][2])
+                        counts, total, count = value
+                        current.counts = [a + b for a, b in zip(current.counts, counts)]
+                        current.sum += total
+                        current.count += count
+                    elif kind == 'counter':
+                        self._series[name][key] = (current or 0) + value
+                    else:
+                        self._series[name][key] = value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, description, _) in FAMILIES.items():
+                series = self._series[name]
+                if not series:
+                    continue
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+                for key, value in sorted(series.items()):
+                    if kind != 'histogram':
+                        lines.append(f'{name}{_format_labels(key)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(key + (("le", bound),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {value.sum}')
+                    lines.append(f'{name}_count{_format_labels(key)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# Records how long the block takes under pm_stage_seconds{stage=...}; exceptions are
+# counted in pm_errors_total and re-raised
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc('pm_errors_total', stage=stage)
+        raise
+    finally:
+        registry.observe('pm_stage_seconds', time.perf_counter() - start, stage=stage)
+
+
+def observe_payload(stage, n_bytes):
+    registry.observe('pm_payload_bytes', n_bytes, stage=stage)
+
+
+def observe_counts(stage, rows=None, units=None):
+    if rows is not None:
+        registry.observe('pm_rows', rows, stage=stage)
+    if units is not None:
+        registry.observe('pm_units', units, stage=stage)
+
+
+def error(stage):
+    registry.inc('pm_errors_total', stage=stage)
+
+
+# Wraps a streamed response body so its total size and the time until the last chunk
+# is sent are recorded once the client has read it
+def stream(stage, chunks):
+    start, n_bytes = time.perf_counter(), 0
+    try:
+        for chunk in chunks:
+            n_bytes += len(chunk)
+            yield chunk
+    finally:
+        registry.observe('pm_stage_seconds', time.perf_counter() - start, stage=stage)
+        registry.observe('pm_payload_bytes', n_bytes, stage=stage)
+
+
+# Optional cProfile capture of whole requests. mode 'all' profiles every request,
+# 'header' only those sent with "X-Profile: 1". Stats are written to directory as
+# <time>-<path>.prof (load them with pstats or snakeviz) and the file name is
+# returned in the X-Profile-File response header.
+def install_request_profiler(server, mode, directory):
+    if mode not in ('all', 'header'):
+        return
+
+    import cProfile
+    import flask
+
+    os.makedirs(directory, exist_ok=True)
+
+    @server.before_request
+    def start_profile():
+        if mode == 'all' or flask.request.headers.get('X-Profile') == '1':
+            flask.g.profiler = cProfile.Profile()
+            flask.g.profiler.enable()
+
+    @server.after_request
+    def stop_profile(response):
+        profiler = flask.g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            name = flask.request.path.strip('/').replace('/', '_') or 'index'
+            path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{time.time_ns() % 10 ** 9:09d}-{name}.prof')
+            profiler.dump_stats(path)
+            response.headers['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    # after_request is skipped when a view raises (and the exception propagates), so
+    # the profiler of such a request is stopped and discarded here
+    @server.teardown_request
+    def discard_profile(exc):
+        profiler = flask.g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
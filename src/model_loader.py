@@ -0,0 +1,133 @@
+import os
+import threading
+import weakref
+
+import startup
+
+# Every loader of the process. A fork (gunicorn --preload, background jobs) copies
+# them but not the thread that may be loading: a child forked halfway through a load
+# would inherit half-imported modules and the import locks of a dead thread, so forks
+# wait for loads in other threads to finish (for at most FORK_WAIT_SECONDS). The hook
+# is registered by the first load(): before-fork hooks run last-registered first, so
+# it runs before logging's, which holds the logging lock the loading thread may need.
+FORK_WAIT_SECONDS = 120
+_loaders = weakref.WeakSet()
+_fork_hooks_registered = False
+
+
+def _register_fork_hooks():
+    global _fork_hooks_registered
+    if not _fork_hooks_registered:
+        _fork_hooks_registered = True
+        os.register_at_fork(before=_before_fork, after_in_child=_after_fork)
+
+
+def _before_fork():
+    for loader in list(_loaders):
+        loader._before_fork()
+
+
+def _after_fork():
+    for loader in list(_loaders):
+        loader._after_fork()
+
+
+# Loads the model and scaler once per process, either on first use or on a
+# background thread, so a worker can start serving (and answer /health) before the
+# sklearn unpickle has finished
+class ModelLoader:
+    def __init__(self, model_path, scaler_path, compiled=True, mmap=True, micro_batch=None, fallback=False):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.compiled = compiled
+        self.fallback = fallback  # keep the sklearn forest next to the compiled one
+        self.mmap = mmap
+        self.micro_batch = micro_batch  # batching.batch_model kwargs, or None for direct calls
+        self.state = 'idle'
+        self.error = None
+        self.model = None
+        self.scaler = None
+        self._background = False
+        self._loading_thread = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        _loaders.add(self)
+
+    def start(self):
+        if self.state == 'idle':
+            self._background = True
+            threading.Thread(target=self.load, name='model-loader', daemon=True).start()
+        return self
+
+    def _before_fork(self):
+        if self.state == 'loading' and self._loading_thread is not threading.current_thread():
+            self._done.wait(FORK_WAIT_SECONDS)
+
+    # Runs in the child of a fork. The loading thread did not come along: a load that
+    # was still running (the wait above timed out) cannot be resumed safely.
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if not self._done.is_set():
+            self.error = "Interrupted by a fork while loading; load the model before forking."
+            self.state = 'error'
+            self._done.set()
+
+    def load(self):
+        _register_fork_hooks()
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.state = 'loading'
+            self._loading_thread = threading.current_thread()
+            try:
+                with startup.phase('import joblib/sklearn'):
+                    import joblib
+                    import sklearn.ensemble  # noqa: F401  (imported here so the unpickle phase is only I/O)
+                with startup.phase('unpickle model'):
+                    if self.mmap:
+                        from utils import load_model_artifact
+                        model = load_model_artifact(self.model_path)
+                    else:
+                        model = joblib.load(self.model_path)
+                with startup.phase('unpickle scaler'):
+                    scaler = joblib.load(self.scaler_path)
+                if self.compiled:
+                    from tree_engine import compile_model
+                    with startup.phase('compile forest'):
+                        model = compile_model(model, keep_fallback=self.fallback)
+                if self.micro_batch is not None:
+                    from batching import batch_model
+                    model = batch_model(model, **self.micro_batch)
+                # Versioned here, so background jobs forked later share the
+                # prediction cache keys of this process (see utils.model_version)
+                from utils import model_version
+                model_version(model)
+
+                self.model, self.scaler = model, scaler
+                self.state = 'ready'
+                print(startup.report())
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                self.state = 'error'
+                print(f"Error loading model or scaler: {self.error}")
+            finally:
+                self._done.set()
+
+    # Blocks until the model is available; loads it in the calling thread when
+    # nothing has started loading yet
+    def get(self, timeout=None):
+        if self.state == 'idle':
+            self.load()
+        if not self._done.wait(timeout):
+            raise TimeoutError("Model is still loading.")
+        if self.state == 'error':
+            raise RuntimeError(f"Model unavailable: {self.error}")
+        return self.model, self.scaler
+
+    def status(self):
+        return {
+            'status': self.state,
+            'model_path': self.model_path,
+            'error': self.error,
+            'startup': startup.phases
+        }
@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from model_loader import ModelLoader
+from tree_engine import CompiledForest
+
+# Several models behind one app: a JSON manifest maps model IDs to artifact files,
+#
+#   {"default": "FD001",
+#    "models": {"FD001": {"model": "fd001/model.joblib", "scaler": "fd001/scaler.pkl",
+#                         "version": "3", "conditions": [[0, 0, 100]]},
+#               "FD002": {...}}}
+#
+# (paths relative to the manifest). Models are loaded on first use through a
+# ModelLoader each, kept in an LRU bounded by their resident size, and reloaded when
+# their artifact files change on disk; a request that already holds a model keeps
+# using it while the new version loads. Without a manifest the registry holds the one
+# model at MODEL_PATH / SCALER_PATH under the ID "default".
+
+SETTINGS = ['setting1', 'setting2', 'setting3']
+# Decimals the operating settings are rounded to when listing the operating
+# conditions of a dataset (CMAPSS: altitude in kft, Mach number, throttle angle)
+CONDITION_DECIMALS = (0, 2, 0)
+
+
+# Distinct operating conditions (rounded setting1..3 triples) of a dataset, for the
+# "conditions" of a manifest entry
+def operating_conditions(df, decimals=CONDITION_DECIMALS):
+    rounded = np.column_stack([np.round(df[col].to_numpy(np.float64), d) + 0.0 for col, d in zip(SETTINGS, decimals)])
+    return np.unique(rounded, axis=0).tolist()
+
+
+def read_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    specs = OrderedDict()
+    for model_id, spec in manifest['models'].items():
+        specs[model_id] = dict(spec, model=os.path.join(base, spec['model']), scaler=os.path.join(base, spec['scaler']))
+    return manifest.get('default') or next(iter(specs)), specs
+
+
+# Adds or replaces a manifest entry, writing the file atomically so running
+# registries never read half of it
+def register_model(manifest_path, model_id, model_path, scaler_path, version=None, conditions=None, default=False):
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {'default': model_id, 'models': {}}
+
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    spec = {'model': os.path.relpath(os.path.abspath(model_path), base),
+            'scaler': os.path.relpath(os.path.abspath(scaler_path), base)}
+    if version is not None:
+        spec['version'] = str(version)
+    if conditions is not None:
+        spec['conditions'] = conditions
+    manifest['models'][model_id] = spec
+    if default:
+        manifest['default'] = model_id
+
+    tmp = f'{manifest_path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def _signature(*paths):
+    try:
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, paths))
+    except FileNotFoundError:
+        return None
+
+
+# Rough resident size of a loaded model: the arrays of a compiled forest, plus the
+# sklearn forest it may keep as fallback; that one, like any model that is not a
+# compiled forest, is estimated by the size of its artifact on disk
+def _resident_bytes(loader):
+    regressor = getattr(loader.model, 'regressor', None)
+    regressor = getattr(regressor, 'regressor', regressor)  # batching.BatchedRegressor
+    if not isinstance(regressor, CompiledForest):
+        return os.path.getsize(loader.model_path)
+    arrays = [regressor.feature, regressor.threshold, regressor.left, regressor.right, regressor.value, regressor.roots]
+    nbytes = sum(array.nbytes for array in arrays)
+    if regressor.fallback is not None:
+        nbytes += os.path.getsize(loader.model_path)
+    return nbytes
+
+
+# Stops the micro-batching thread (batching.MicroBatcher) of a model the registry
+# drops; requests still holding the model keep working without it
+def _release(loader):
+    batcher = getattr(getattr(loader.model, 'regressor', None), 'batcher', None)
+    if batcher is not None:
+        batcher.close()
+
+
+class _Resident:
+    def __init__(self, loader, signature):
+        self.loader = loader
+        self.signature = signature
+        self.checked = time.monotonic()
+        self.nbytes = None
+        self.reloading = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, manifest_path, model_path, scaler_path, max_bytes=1024 * 1024 * 1024,
+                 reload_seconds=2.0, **loader_kwargs):
+        self.manifest_path = manifest_path
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.max_bytes = max_bytes
+        self.reload_seconds = reload_seconds
+        self.loader_kwargs = loader_kwargs  # compiled, fallback, mmap, micro_batch
+        self.reloads = 0
+        self._resident = OrderedDict()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._manifest_signature = None
+        self._manifest_checked = 0.0
+        self._read_manifest()
+
+    def _read_manifest(self):
+        self._manifest_signature = _signature(self.manifest_path)
+        self._manifest_checked = time.monotonic()
+        if self._manifest_signature is None:
+            self.default_id = 'default'
+            self.specs = OrderedDict(default={'model': self.model_path, 'scaler': self.scaler_path})
+            return
+        try:
+            self.default_id, self.specs = read_manifest(self.manifest_path)
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Error reading model manifest {self.manifest_path}: {e}")
+            if not hasattr(self, 'specs'):
+                raise
+
+    def ids(self):
+        return list(self.specs)
+
+    # Model ID for a request: an explicit ID, or for None / "auto" the model whose
+    # operating conditions are closest to the settings in df (the default model when
+    # there is no df or no entry lists conditions)
+    def resolve(self, model_id=None, df=None):
+        if model_id not in (None, '', 'auto'):
+            if model_id not in self.specs:
+                raise KeyError(f"Unknown model {model_id!r}; available: {', '.join(self.specs)}.")
+            return model_id
+        if df is None:
+            return self.default_id
+        return self.choose(df)
+
+    def choose(self, df):
+        candidates = {model_id: np.asarray(spec['conditions'], dtype=np.float64)
+                      for model_id, spec in self.specs.items() if spec.get('conditions')}
+        if not candidates or not set(SETTINGS) <= set(df.columns):
+            return self.default_id
+
+        settings = df[SETTINGS].to_numpy(np.float64)
+        settings = settings[::max(1, len(settings) // 10000)]
+        centroids = np.vstack(list(candidates.values()))
+        scale = np.ptp(centroids, axis=0)
+        scale[scale == 0] = 1
+        # Mean distance from every row to the nearest condition of each model; ties go
+        # to the default model, then to manifest order
+        distances = {model_id: np.abs((settings[:, None, :] - conditions[None]) / scale).sum(axis=2).min(axis=1).mean()
+                     for model_id, conditions in candidates.items()}
+        return min(distances, key=lambda model_id: (distances[model_id], model_id != self.default_id))
+
+    def _new_resident(self, model_id):
+        spec = self.specs[model_id]
+        signature = _signature(spec['model'], spec['scaler'])
+        return _Resident(ModelLoader(spec['model'], spec['scaler'], **self.loader_kwargs), signature)
+
+    def _entry(self, model_id):
+        if self._pid != os.getpid():  # forked (see jobs.py): the lock may be held by a dead thread
+            self._pid, self._lock = os.getpid(), threading.Lock()
+        now = time.monotonic()
+        if self.reload_seconds and now - self._manifest_checked >= self.reload_seconds:
+            self._manifest_checked = now
+            if _signature(self.manifest_path) != self._manifest_signature:
+                # Models that now point at other files are swapped by _check_reload like
+                # any other changed artifact
+                with self._lock:
+                    self._read_manifest()
+                    for stale in [i for i in self._resident if i not in self.specs]:
+                        _release(self._resident.pop(stale).loader)
+
+        with self._lock:
+            entry = self._resident.get(model_id)
+            if entry is None:
+                entry = self._resident[model_id] = self._new_resident(model_id)
+            self._resident.move_to_end(model_id)
+            return entry
+
+    # Loads the new artifact next to the old one; only the request that noticed the
+    # change waits for it, everyone else keeps being served by the old model
+    def _check_reload(self, model_id, entry):
+        now = time.monotonic()
+        if not self.reload_seconds or now - entry.checked < self.reload_seconds or entry.loader.state not in ('ready', 'error'):
+            return entry
+        entry.checked = now
+        spec = self.specs.get(model_id, {})
+        if _signature(spec.get('model', entry.loader.model_path), spec.get('scaler', entry.loader.scaler_path)) == entry.signature:
+            return entry
+        if not entry.reloading.acquire(blocking=False):
+            return entry
+        try:
+            fresh = self._new_resident(model_id)
+            fresh.loader.load()
+            entry.signature = fresh.signature  # a failed load is retried once the files change again
+            if fresh.loader.state != 'ready':
+                print(f"Keeping the previous version of model {model_id}: {fresh.loader.error}")
+                return entry
+            with self._lock:
+                if self._resident.get(model_id) is entry:
+                    self._resident[model_id] = fresh
+                    _release(entry.loader)
+            self.reloads += 1
+            metrics.registry.inc('pm_model_reloads_total', model=model_id)
+            print(f"Reloaded model {model_id} from {fresh.loader.model_path}")
+            return fresh
+        finally:
+            entry.reloading.release()
+
+    # Evicts least recently used models until the resident ones fit in max_bytes. The
+    # default model (which /health reports on) and the one just used always stay, and
+    # in-flight requests keep their reference to an evicted model.
+    def _account(self, model_id, entry):
+        if entry.nbytes is not None or entry.loader.state != 'ready':
+            return
+        entry.nbytes = _resident_bytes(entry.loader)
+        with self._lock:
+            evictable = [i for i in self._resident if i not in (model_id, self.default_id)]
+            while evictable and self.resident_bytes() > self.max_bytes:
+                evicted = evictable.pop(0)
+                _release(self._resident.pop(evicted).loader)
+                print(f"Evicted model {evicted} from memory")
+
+    def resident_bytes(self):
+        return sum(entry.nbytes or 0 for entry in self._resident.values())
+
+    # (model, scaler, model_id) for a request; see resolve for how the model is picked
+    def get(self, model_id=None, df=None, timeout=None):
+        model_id = self.resolve(model_id, df)
+        entry = self._check_reload(model_id, self._entry(model_id))
+        model, scaler = entry.loader.get(timeout=timeout)
+        self._account(model_id, entry)
+        return model, scaler, model_id
+
+    def loader(self, model_id=None):
+        return self._entry(model_id or self.default_id).loader
+
+    def load(self, model_id=None):
+        self.loader(model_id).load()
+        return self
+
+    def start(self, model_id=None):
+        self.loader(model_id).start()
+        return self
+
+    # Changes whenever the model behind model_id is replaced (a new manifest version or
+    # new artifact files), for results that are only valid for one version
+    def version(self, model_id):
+        entry = self._resident.get(model_id)
+        return f"{self.specs[model_id].get('version', '')}:{entry.signature if entry else ''}"
+
+    def status(self):
+        status = self.loader().status()
+        status['default_model'] = self.default_id
+        status['models'] = {
+            model_id: {
+                'version': spec.get('version'),
+                'model_path': spec['model'],
+                'state': self._resident[model_id].loader.state if model_id in self._resident else 'unloaded',
+                'resident_bytes': self._resident[model_id].nbytes if model_id in self._resident else None
+            }
+            for model_id, spec in self.specs.items()
+        }
+        status['resident_bytes'] = self.resident_bytes()
+        status['max_bytes'] = self.max_bytes
+        return status
@@ -0,0 +1,26 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# Data of the current fork_pool, for its tasks to read
+shared = None
+
+
+# Pool of forked worker processes for tasks that all need the same large object (a
+# model with its memory-mapped forest arrays, prepared folds, ...). It is set as
+# parallel.shared before the workers fork, so they inherit it instead of receiving a
+# pickled copy with every task; task functions read it from there. Yields None when
+# workers <= 1, for the caller to run the tasks inline (shared is set either way).
+@contextmanager
+def fork_pool(data, workers):
+    global shared
+
+    shared = data
+    try:
+        if workers <= 1:
+            yield None
+        else:
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                yield pool
+    finally:
+        shared = None
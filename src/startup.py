@@ -0,0 +1,24 @@
+import time
+from contextlib import contextmanager
+
+# Wall-clock breakdown of worker start-up (imports, artifact loading), exposed
+# through /health and printed once the model is ready
+
+started = time.perf_counter()
+phases = []
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append({'phase': name, 'start': start - started, 'seconds': time.perf_counter() - start})
+
+
+def report():
+    lines = ['Startup report:']
+    for entry in phases:
+        lines.append(f"  {entry['phase']:<28} {entry['seconds'] * 1000:>9.1f} ms  (at +{entry['start'] * 1000:.0f} ms)")
+    return '\n'.join(lines)
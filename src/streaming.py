@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+
+# Streaming companion to PointPredictorRegressor: engines report one cycle at a time
+# and each unit's RUL is re-extrapolated from the last `end_points` per-cycle
+# predictions without touching its history again. Per unit the state is a ring buffer
+# of recent predictions plus running sums of y and x*y over the window, all stored in
+# flat arrays indexed by slot, so a new cycle costs one forest row and O(1) updates.
+class StreamingRULTracker:
+    def __init__(self, model, end_points=10, capacity=1024):
+        self.model = model
+        self.end_points = end_points
+        self.buffer = np.zeros((capacity, end_points))
+        self.head = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.sum_y = np.zeros(capacity)
+        self.sum_xy = np.zeros(capacity)
+        self.slot_unit = np.zeros(capacity, dtype=np.int64)
+        self._slot_of = pd.Series([], dtype='int64')  # unit id -> slot
+        self._n_slots = 0
+        self._free = []
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def _grow(self, capacity):
+        for name in ('buffer', 'head', 'count', 'sum_y', 'sum_xy', 'slot_unit'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _slots_for(self, units):
+        positions = self._slot_of.index.get_indexer(units)
+        missing = positions < 0
+        if missing.any():
+            new_units = pd.unique(units[missing])
+            n_reused = min(len(self._free), len(new_units))
+            n_fresh = len(new_units) - n_reused
+            new_slots = np.concatenate([
+                np.array(self._free[:n_reused], dtype=np.int64),
+                np.arange(self._n_slots, self._n_slots + n_fresh, dtype=np.int64)
+            ])
+            del self._free[:n_reused]
+            self._n_slots += n_fresh
+            if self._n_slots > len(self.buffer):
+                self._grow(max(2 * len(self.buffer), self._n_slots))
+
+            self.slot_unit[new_slots] = new_units
+            added = pd.Series(new_slots, index=new_units)
+            self._slot_of = pd.concat([self._slot_of, added]) if len(self._slot_of) else added
+            positions = self._slot_of.index.get_indexer(units)
+        return self._slot_of.to_numpy()[positions]
+
+    # Pushes one prediction into the window of each slot (slots must be distinct)
+    def _push(self, slots, y):
+        w = self.end_points
+        n = self.count[slots]
+        full = n == w
+
+        # Window not full yet: the new value gets x = n
+        grow = slots[~full]
+        self.buffer[grow, (self.head[grow] + n[~full]) % w] = y[~full]
+        self.sum_xy[grow] += n[~full] * y[~full]
+        self.sum_y[grow] += y[~full]
+        self.count[grow] += 1
+
+        # Full window: drop the oldest value and shift every x down by one
+        slide = slots[full]
+        oldest = self.buffer[slide, self.head[slide]]
+        self.sum_xy[slide] += (w - 1) * y[full] - (self.sum_y[slide] - oldest)
+        self.sum_y[slide] += y[full] - oldest
+        self.buffer[slide, self.head[slide]] = y[full]
+        self.head[slide] = (self.head[slide] + 1) % w
+
+        # Whenever a ring wraps around, recompute its sums exactly so rounding error
+        # from the running updates can't build up (amortised O(1) per cycle)
+        wrapped = slide[self.head[slide] == 0]
+        if len(wrapped):
+            self.sum_y[wrapped] = self.buffer[wrapped].sum(axis=1)
+            self.sum_xy[wrapped] = self.buffer[wrapped] @ np.arange(w)
+
+    def _estimate(self, slots):
+        n = self.count[slots].astype(float)
+        sum_y, sum_xy = self.sum_y[slots], self.sum_xy[slots]
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+
+        denom = n * sum_xx - sum_x ** 2
+        slope = np.divide(n * sum_xy - sum_x * sum_y, denom, out=np.zeros_like(sum_y), where=denom != 0)
+        intercept = np.divide(sum_y - slope * sum_x, n, out=np.zeros_like(sum_y), where=n > 0)
+
+        return pd.DataFrame({
+            'unit': self.slot_unit[slots],
+            'n_points': self.count[slots],
+            'slope': slope,
+            'rul': intercept + slope * n
+        })
+
+    # Feeds new cycles (rows with 'unit' and the model's features, in cycle order per
+    # unit) and returns the updated estimate of every unit that appeared
+    def update(self, X, preprocess=True):
+        units = X['unit'].to_numpy()
+
+        # Only the last end_points rows of a unit can still be in its window afterwards
+        from_end = X.groupby('unit', sort=False).cumcount(ascending=False).to_numpy()
+        keep = from_end < self.end_points
+        if not keep.all():
+            X, units = X[keep], units[keep]
+
+        features = X[self.model.feature_names]
+        if preprocess:
+            features = self.model._preprocess(features)
+        y = np.asarray(self.model.regressor.predict(features), dtype=float)
+
+        slots = self._slots_for(units)
+
+        # Rows of the same unit are applied in rounds, oldest first, so every round
+        # touches each slot at most once and stays fully vectorised
+        rank = X.groupby('unit', sort=False).cumcount().to_numpy()
+        for r in range(rank.max() + 1 if len(rank) else 0):
+            mask = rank == r
+            self._push(slots[mask], y[mask])
+
+        return self._estimate(pd.unique(slots))
+
+    def predict(self, units=None):
+        if units is None:
+            slots = self._slot_of.to_numpy()
+        else:
+            slots = self._slot_of.loc[np.asarray(units)].to_numpy()
+        table = self._estimate(slots)
+        return table.sort_values('unit', ignore_index=True)
+
+    # Stops tracking units (e.g. after an engine is serviced); their slots are reused
+    def drop(self, units):
+        slots = self._slot_of.loc[np.asarray(units)].to_numpy()
+        self.head[slots] = self.count[slots] = 0
+        self.sum_y[slots] = self.sum_xy[slots] = 0
+        self.slot_unit[slots] = -1
+        self._slot_of = self._slot_of.drop(np.asarray(units))
+        self._free.extend(slots.tolist())
@@ -0,0 +1,233 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import as_completed
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+import parallel
+from custom_models import PointPredictor, PointPredictorRegressor, RollingFeaturePredictor, unit_offsets
+from evaluation import evaluate_datasets, nasa_score, rmse, truncate_units, unit_folds
+from ingest import FEATURES, load_fleet
+
+# Training entry point replacing the notebook's GridSearchCV run:
+#   python src/train.py --datasets FD001 FD002 FD003 FD004 --model-id FD --register --default
+# Every candidate (model kind x forest hyperparameters) is scored on unit-grouped
+# folds of the train sets, with the held-out units cut at a random cycle like the test
+# sets. Successive halving prunes the candidates: all of them are fitted with few
+# trees, the best 1/eta go on with eta times as many, until one is left. Trials run in
+# a pool of forked processes (parallel.fork_pool) that share the folds prepared once
+# in the parent (scaler fitted per fold, scaled float64 features, labels, cut held-out
+# units), so no trial re-reads, re-scales or receives a copy of the data. The winner is refitted on
+# all units and written as a new version directory, renamed into place in one step.
+
+MODEL_CLASSES = {
+    'point': PointPredictor,
+    'regressor': PointPredictorRegressor,
+    'rolling': RollingFeaturePredictor
+}
+
+
+def _max_features(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value  # 'sqrt', 'log2'
+
+
+def candidates(kinds, grid):
+    names = sorted(grid)
+    return [{'kind': kind, 'params': dict(zip(names, values))}
+            for kind in kinds for values in itertools.product(*(grid[name] for name in names))]
+
+
+def build_model(candidate, n_trees, scaler=None, n_jobs=-1, seed=42):
+    regressor = RandomForestRegressor(n_estimators=n_trees, random_state=seed, n_jobs=n_jobs, **candidate['params'])
+    return MODEL_CLASSES[candidate['kind']](regressor, scaler=scaler)
+
+
+# Per fold: the training rows scaled with a scaler fitted on them (C-contiguous
+# float64, so fit_arrays trains on the buffer itself) and the held-out units, cut like
+# the test sets and scaled with the same scaler. Both stay float64 like the frames the
+# final model is fitted and served on (see ingest.SCHEMA), so trials rank candidates
+# on the same values.
+def prepare_folds(df, folds=3, seed=42):
+    prepared = []
+    for i, held_out in enumerate(unit_folds(df['unit'], folds, seed)):
+        mask = np.isin(df['unit'].to_numpy(), held_out)
+        train, test = df[~mask], df[mask]
+        scaler = StandardScaler().fit(train[FEATURES])
+        X_test, y_test = truncate_units(test, seed + i)
+        X_test = X_test.copy()
+        X_test[FEATURES] = scaler.transform(X_test[FEATURES])
+        prepared.append({
+            'scaler': scaler,
+            'features': np.ascontiguousarray(scaler.transform(train[FEATURES]), dtype=np.float64),
+            'offsets': unit_offsets(train['unit'].to_numpy()),
+            'cycles': train['cycle'].to_numpy(),
+            'X_test': X_test,
+            'y_test': y_test
+        })
+    return prepared
+
+
+def _trial(candidate, fold, n_trees, n_jobs, seed):
+    start = time.perf_counter()
+    data = parallel.shared[fold]
+    model = build_model(candidate, n_trees, data['scaler'], n_jobs, seed)
+    model.fit_arrays(data['features'], data['offsets'], data['cycles'], FEATURES, preprocess=False, copy=False)
+    y_pred = np.clip(model.predict_units(data['X_test'], preprocess=False)['rul'].to_numpy(np.float64), 0, None)
+    return rmse(data['y_test'], y_pred), nasa_score(data['y_test'], y_pred), time.perf_counter() - start
+
+
+# Successive halving over the candidates on the prepared folds. Returns the winner and
+# one record per candidate and rung (trees, mean fold RMSE and score, fit seconds).
+def successive_halving(candidate_list, folds, max_trees=100, min_trees=10, eta=3, workers=None, seed=42):
+    n_rungs, remaining = 1, len(candidate_list)
+    while remaining > 1:
+        n_rungs, remaining = n_rungs + 1, math.ceil(remaining / eta)
+    workers = workers or os.cpu_count() or 1
+    # Forests fitted inside the pool get one thread each when the pool fills the CPUs
+    n_jobs = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else -1
+    alive, history = list(range(len(candidate_list))), []
+    # Trials by (candidate, fold, trees): rungs clamped to min_trees reuse them and only prune
+    results = {}
+
+    with parallel.fork_pool(folds, workers) as pool:
+        for rung in range(n_rungs):
+            start = time.perf_counter()
+            n_trees = max(min_trees, math.ceil(max_trees / eta ** (n_rungs - 1 - rung)))
+            tasks = [(i, fold, n_trees) for i in alive for fold in range(len(folds)) if (i, fold, n_trees) not in results]
+            if pool is None:
+                results.update({task: _trial(candidate_list[task[0]], task[1], n_trees, n_jobs, seed) for task in tasks})
+            else:
+                futures = {pool.submit(_trial, candidate_list[task[0]], task[1], n_trees, n_jobs, seed): task for task in tasks}
+                results.update({futures[future]: future.result() for future in as_completed(futures)})
+
+            scores = {}
+            for i in alive:
+                fold_results = np.array([results[(i, fold, n_trees)] for fold in range(len(folds))])
+                scores[i] = fold_results[:, 0].mean()
+                history.append(dict(candidate_list[i], rung=rung, trees=n_trees, rmse=float(scores[i]),
+                                    rmse_std=float(fold_results[:, 0].std()), score=float(fold_results[:, 1].mean()),
+                                    seconds=float(fold_results[:, 2].sum())))
+            alive = sorted(alive, key=scores.get)
+            print(f"rung {rung}: {len(alive):>3} candidates x {len(folds)} folds, {n_trees:>4} trees, "
+                  f"best RMSE {scores[alive[0]]:.2f} ({time.perf_counter() - start:.1f} s)")
+            if len(alive) == 1:
+                break
+            alive = alive[:max(1, math.ceil(len(alive) / eta))]
+    return candidate_list[alive[0]], history
+
+
+# Writes model.joblib (memory-mappable, see utils.save_model_artifact), scaler.pkl and
+# metadata.json into directory/<model_id>/<version>. Everything goes to a hidden
+# directory first, which is renamed into place once complete, so a half-written
+# version is never visible to the app.
+def write_artifacts(model, scaler, directory, model_id, metadata):
+    from utils import save_model_artifact
+
+    parent = os.path.join(directory, model_id)
+    version = time.strftime('%Y%m%d-%H%M%S')
+    if os.path.exists(os.path.join(parent, version)):
+        version += f'-{len([name for name in os.listdir(parent) if name.startswith(version)])}'
+    tmp = os.path.join(parent, f'.{version}.tmp-{os.getpid()}')
+    os.makedirs(tmp)
+    try:
+        save_model_artifact(model, os.path.join(tmp, 'model.joblib'))
+        joblib.dump(scaler, os.path.join(tmp, 'scaler.pkl'))
+        with open(os.path.join(tmp, 'metadata.json'), 'w') as f:
+            json.dump(dict(metadata, model_id=model_id, version=version), f, indent=1, default=str)
+        os.rename(tmp, os.path.join(parent, version))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return version, os.path.join(parent, version)
+
+
+# Search, refit on all units, test-set evaluation and artifacts for one training set
+def train(names, args, model_id):
+    start = time.perf_counter()
+    df = load_fleet([f'train_{name}' for name in names], args.dataset_dir)
+    print(f"{model_id}: {df['unit'].nunique()} units, {len(df)} rows from {', '.join(names)}")
+
+    grid = {'max_depth': args.max_depth, 'min_samples_leaf': args.min_samples_leaf, 'max_features': args.max_features}
+    candidate_list = candidates(args.models, grid)
+    folds = prepare_folds(df, args.folds, args.seed)
+    best, history = successive_halving(candidate_list, folds, args.max_trees, args.min_trees, args.eta,
+                                       args.workers, args.seed)
+    print(f"best: {best['kind']} {best['params']}")
+
+    scaler = StandardScaler().fit(df[FEATURES])
+    model = build_model(best, args.max_trees, scaler, seed=args.seed).fit(df)
+    test, _ = evaluate_datasets(model, names, workers=args.workers, dataset_dir=args.dataset_dir)
+    if len(test):
+        print(test.to_string(float_format=lambda v: f'{v:.2f}'))
+
+    metadata = {
+        'datasets': list(names),
+        'model': best['kind'],
+        'params': dict(best['params'], n_estimators=args.max_trees),
+        'cv': {'folds': args.folds, 'rmse': history[-1]['rmse'], 'rmse_std': history[-1]['rmse_std'],
+               'score': history[-1]['score']},
+        'test': test.reset_index().to_dict('records'),
+        'search': history,
+        'seconds': time.perf_counter() - start
+    }
+    version, path = write_artifacts(model, scaler, args.out, model_id, metadata)
+    print(f"wrote {path} in {metadata['seconds']:.1f} s")
+
+    if args.register:
+        from model_registry import operating_conditions, register_model
+        register_model(args.manifest, model_id, os.path.join(path, 'model.joblib'), os.path.join(path, 'scaler.pkl'),
+                       version=version, conditions=operating_conditions(df), default=args.default)
+        print(f"registered {model_id} version {version} in {args.manifest}")
+    return path
+
+
+def main():
+    import config
+
+    parser = argparse.ArgumentParser(description='Hyperparameter search and training on the CMAPSS train sets.')
+    parser.add_argument('--datasets', nargs='+', default=['FD001', 'FD002', 'FD003', 'FD004'])
+    parser.add_argument('--per-dataset', action='store_true', help='one model per dataset instead of one for all')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODEL_CLASSES), default=['point', 'regressor'])
+    parser.add_argument('--max-depth', type=int, nargs='+', default=[8, 10, 14])
+    parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--max-features', type=_max_features, nargs='+', default=[1.0, 0.5])
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--max-trees', type=int, default=100, help='trees of the final model and the last rung')
+    parser.add_argument('--min-trees', type=int, default=10)
+    parser.add_argument('--eta', type=int, default=3, help='1/eta of the candidates survive each rung')
+    parser.add_argument('--workers', type=int, default=None, help='trial processes (default: all CPUs)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dataset-dir', default='dataset')
+    parser.add_argument('--out', default=os.path.join(config.ARTIFACTS_DIR, 'models'))
+    parser.add_argument('--model-id', help='registry ID (default: the dataset names)')
+    parser.add_argument('--register', action='store_true', help='add the new version to the model manifest')
+    parser.add_argument('--manifest', default=config.MODEL_REGISTRY)
+    parser.add_argument('--default', action='store_true', help='make it the default model of the manifest')
+    args = parser.parse_args()
+
+    available = [name for name in args.datasets if os.path.exists(os.path.join(args.dataset_dir, f'train_{name}.txt'))]
+    for name in sorted(set(args.datasets) - set(available)):
+        print(f"Skipping {name}: train_{name}.txt not found in {args.dataset_dir}.")
+    if not available:
+        raise SystemExit("No training data found.")
+
+    if args.per_dataset:
+        for name in available:
+            train([name], args, name)
+    else:
+        train(available, args, args.model_id or '-'.join(available))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import copy
+import time
+
+import numpy as np
+
+# Rows evaluated per step; bounds the (n_trees, rows) node-index matrix
+BLOCK_ROWS = 8192
+
+# Above this many rows sklearn's compiled tree walk (and its thread pool) wins over
+# the NumPy level-by-level walk, so large batches go to the fallback forest if kept
+FALLBACK_ROWS = 1024
+
+
+# Raised for regressors that are not tree ensembles (no per-tree predictions)
+class NoTreesError(TypeError):
+    pass
+
+
+# Array-backed copy of a fitted RandomForestRegressor / ExtraTreesRegressor. Every
+# tree's nodes are laid out back to back in flat feature/threshold/child/value arrays
+# and all trees are walked at once with NumPy, which avoids sklearn's per-call input
+# validation and joblib thread dispatch. Leaves point at themselves, so walking a
+# fixed number of levels leaves every row on its leaf. estimator is an unfitted clone
+# of the sklearn forest (class and hyperparameters only), so a compiled artifact can
+# still be refitted, e.g. for cross-validation (see evaluation.unfitted).
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features_in_,
+                 feature_importances_=None, feature_names_in_=None, fallback=None, estimator=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features_in_
+        self.feature_importances_ = feature_importances_
+        if feature_names_in_ is not None:
+            self.feature_names_in_ = feature_names_in_
+        self.fallback = fallback
+        self.estimator = estimator
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _as_array(self, X):
+        X = X.to_numpy(np.float32) if hasattr(X, 'to_numpy') else np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features_in_}.")
+        return np.ascontiguousarray(X)
+
+    # Leaf index reached by every row in every tree (or the trees selected by a slice),
+    # shape (n_trees, n_rows)
+    def apply(self, X, trees=slice(None)):
+        X = self._as_array(X)
+        n_rows, n_features = X.shape
+        nodes = np.repeat(self.roots[trees, None], n_rows, axis=1)
+        row_offset = np.arange(n_rows) * n_features
+        flat = X.ravel()
+
+        for _ in range(self.max_depth):
+            # sklearn compares the float32 sample against the float64 threshold
+            go_left = flat[row_offset + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    # Per-tree predictions, shape (n_trees, n_rows)
+    def predict_trees(self, X, trees=slice(None)):
+        return self.value[self.apply(X, trees)]
+
+    def predict(self, X):
+        if self.fallback is not None and len(X) >= FALLBACK_ROWS:
+            return self.fallback.predict(X)
+
+        X = self._as_array(X)
+        out = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            # Summing over axis 0 adds the trees one after another, in the same order
+            # sklearn accumulates them, so the averages match bit for bit
+            out[start:start + BLOCK_ROWS] = self.predict_trees(X[start:start + BLOCK_ROWS]).sum(axis=0)
+        out /= self.n_estimators
+        return out
+
+
+def _is_forest(regressor):
+    return hasattr(regressor, 'estimators_') and all(hasattr(estimator, 'tree_') for estimator in regressor.estimators_)
+
+
+# Per-tree predictions of a fitted forest (compiled, sklearn, or either behind a
+# batching.BatchedRegressor), `step` trees at a time, as (trees, rows) blocks
+def tree_predictions(regressor, X, step=10):
+    if getattr(regressor, 'batcher', None) is not None:
+        regressor = regressor.regressor
+    if isinstance(regressor, CompiledForest) and (regressor.fallback is None or len(X) < FALLBACK_ROWS):
+        for start in range(0, regressor.n_estimators, step):
+            yield regressor.predict_trees(X, slice(start, start + step))
+        return
+    regressor = getattr(regressor, 'fallback', None) or regressor
+    if not _is_forest(regressor):
+        raise NoTreesError(f"{type(regressor).__name__} is not a tree ensemble; it has no per-tree predictions.")
+    X = np.ascontiguousarray(X.to_numpy(np.float32) if hasattr(X, 'to_numpy') else np.asarray(X, dtype=np.float32))
+    for start in range(0, len(regressor.estimators_), step):
+        yield np.vstack([tree.predict(X, check_input=False) for tree in regressor.estimators_[start:start + step]])
+
+
+# Anytime forest prediction. Trees are evaluated `step` at a time; reduce maps a block
+# of per-tree row predictions to per-tree outputs (per-unit RULs, say; default: the
+# rows themselves). Evaluation stops once every output's running mean is within
+# `tolerance` of the mean over the whole forest, at confidence z (the trees of a
+# random forest are exchangeable, so the first k are a sample without replacement
+# of all n), or once `budget` seconds have passed; the first block is always
+# evaluated. Returns the mean, the standard deviation and the (low, high) quantiles
+# of the per-tree outputs, and the number of trees used.
+def predict_anytime(regressor, X, reduce=None, tolerance=None, budget=None, step=10, z=1.96, coverage=0.9):
+    start = time.perf_counter()
+    n_total = getattr(regressor, 'n_estimators', None)
+    outputs = []
+    for block in tree_predictions(regressor, X, step):
+        outputs.append(block if reduce is None else reduce(block))
+        k = sum(len(output) for output in outputs)
+        if k >= n_total or budget is not None and time.perf_counter() - start >= budget:
+            break
+        if tolerance is not None and k > 1:
+            trees = np.concatenate(outputs)
+            half_width = z * trees.std(axis=0, ddof=1) / np.sqrt(k) * np.sqrt((n_total - k) / (n_total - 1))
+            if np.all(half_width <= tolerance):
+                break
+
+    trees = np.concatenate(outputs)
+    tail = (1 - coverage) / 2 * 100
+    low, high = np.percentile(trees, [tail, 100 - tail], axis=0)
+    return trees.mean(axis=0), trees.std(axis=0, ddof=1) if len(trees) > 1 else np.zeros(trees.shape[1:]), low, high, len(trees)
+
+
+def compile_forest(forest, keep_fallback=False):
+    from sklearn.base import clone
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output forests can be compiled.")
+
+        index = np.arange(tree.node_count) + offset
+        leaf = tree.children_left == -1
+        features.append(np.where(leaf, 0, tree.feature).astype(np.intp))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        lefts.append(np.where(leaf, index, tree.children_left + offset))
+        rights.append(np.where(leaf, index, tree.children_right + offset))
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts).astype(np.intp),
+        right=np.concatenate(rights).astype(np.intp),
+        value=np.concatenate(values).astype(np.float64),
+        roots=np.array(roots, dtype=np.intp),
+        max_depth=max_depth,
+        n_features_in_=forest.n_features_in_,
+        feature_importances_=forest.feature_importances_,
+        feature_names_in_=getattr(forest, 'feature_names_in_', None),
+        fallback=forest if keep_fallback else None,
+        estimator=clone(forest)
+    )
+
+
+# Returns a shallow copy of a SequenceModel whose regressor is replaced by its
+# compiled form. Models that don't wrap a tree ensemble are returned unchanged. With
+# keep_fallback the sklearn forest stays referenced for large batches, which doubles
+# the memory the model takes.
+def compile_model(model, keep_fallback=False):
+    regressor = getattr(model, 'regressor', None)
+    if regressor is None or isinstance(regressor, CompiledForest) or not _is_forest(regressor):
+        return model
+
+    compiled = copy.copy(model)
+    compiled.regressor = compile_forest(regressor, keep_fallback=keep_fallback)
+    return compiled
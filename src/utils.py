@@ -1,28 +1,230 @@
-import joblib
-import pandas as pd
+import hashlib
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
 import numpy as np
-import plotly.express as px
-from sklearn.preprocessing import StandardScaler
+import config
+import metrics
+from tree_engine import NoTreesError, compile_model
 
-def load_model_and_scaler():
+# joblib, pandas and plotly are imported inside the functions that use them so that
+# importing the app stays cheap; see startup.py
+
+def load_model_and_scaler(model_path=config.MODEL_PATH, scaler_path=config.SCALER_PATH, compiled=False):
+    import joblib
     try:
-        model = joblib.load('artifacts/model.joblib')
-        scaler = joblib.load('artifacts/scaler.pkl')
+        model = joblib.load(model_path)
+        scaler = joblib.load(scaler_path)
+        if compiled:
+            # Same predictions as sklearn, without its per-call overhead
+            model = compile_model(model)
         return model, scaler
     except Exception as e:
         print(f"Error loading model or scaler: {e}")
         return None, None
 
-def predict_rul(model, scaler, df):
+def save_model_artifact(model, path):
+    # Forests are stored as the flat arrays of tree_engine.CompiledForest, without
+    # compression, so load_model_artifact can memory-map them and every worker
+    # process shares a single page-cache copy instead of its own unpickled trees
+    import joblib
+    artifact = compile_model(model, keep_fallback=False)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    joblib.dump(artifact, tmp, compress=0)
+    os.replace(tmp, path)
+    return path
+
+def load_model_artifact(path, mmap_mode='r'):
+    import joblib
+    # Only uncompressed pickles (protocol header 0x80) can be memory-mapped
+    with open(path, 'rb') as f:
+        uncompressed = f.read(1) == b'\x80'
+    return joblib.load(path, mmap_mode=mmap_mode if uncompressed else None)
+
+# Bounded LRU cache with a time-to-live for per-unit prediction results
+class PredictionCache:
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+prediction_cache = PredictionCache(config.PREDICTION_CACHE_SIZE, config.PREDICTION_CACHE_TTL)
+
+# Every loaded model object gets its own version, so reloading a model (even from the
+# same path) never serves results computed by the previous one
+_model_versions = weakref.WeakKeyDictionary()
+
+def model_version(model):
+    version = _model_versions.get(model)
+    if version is None:
+        version = _model_versions.setdefault(model, uuid.uuid4().hex)
+    return version
+
+# One key per unit: the model version plus the bytes of the rows the model actually
+# looks at (its trailing window), so unchanged or overlapping uploads hit the cache
+def _window_keys(model, windows, bounds):
+    version = model_version(model).encode()
+    values = np.ascontiguousarray(windows[model.feature_names].to_numpy(np.float64))
+    keys = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        digest = hashlib.blake2b(version, digest_size=16)
+        digest.update(values[start:stop].tobytes())
+        keys.append(digest.hexdigest())
+    return keys
+
+# A PredictionCache behind the same get/put that reads from cache but only collects
+# new rows in fresh. A background job (see app.py) reads the cache it inherited from
+# the app's process; its own writes would die with it, so it returns fresh instead.
+class CacheRecorder:
+    def __init__(self, cache):
+        self.cache = cache
+        self.fresh = {}
+
+    def get(self, key):
+        row = self.fresh.get(key)
+        return row if row is not None else self.cache.get(key)
+
+    def put(self, key, value):
+        self.fresh[key] = value
+
+# Tail windows sorted by unit, with the units and the row each one starts at
+def _unit_windows(model, df):
+    window = getattr(model, 'window', None)
+    windows = df.groupby('unit', sort=False).tail(window) if window else df
+    windows = windows.sort_values('unit', kind='stable')
+    units, starts = np.unique(windows['unit'].to_numpy(), return_index=True)
+    return windows, units, starts
+
+def predict_rul(model, scaler, df, workers=1, progress=None, cache=prediction_cache):
     try:
-        # Pass the entire DataFrame, including 'unit' and 'cycle', since PointPredictor may need them for preprocessing
-        rul = model.predict(df, preprocess=True)
-        return max(0, rul[0])  # Ensure non-negative RUL, take first prediction
+        # RUL of the unit the upload starts with (the one recorded in the history)
+        table = predict_rul_units(model, scaler, df, cache=cache, workers=workers, progress=progress)
+        return float(table.loc[table['unit'] == df['unit'].iloc[0], 'rul'].iloc[0])
     except Exception as e:
         print(f"Prediction error: {str(e)}")
         raise  # Re-raise the exception to catch it in the callback for better error reporting
 
+# Scores tail windows sorted by unit; in chunks (across processes with workers > 1)
+# when a background job wants progress reports, see jobs.predict_units_parallel
+def _score(model, windows, workers, progress):
+    if workers > 1 or progress is not None:
+        from jobs import predict_units_parallel
+        return predict_units_parallel(model, windows, workers, config.JOB_CHUNK_ROWS, progress)
+    return model.predict_units(windows, preprocess=True)
+
+# Per-unit table for tail windows sorted by unit: rows come from the cache where
+# possible, and score(windows) only runs on the units that missed
+def _cached_units(cache, keys, units, windows, score):
+    import pandas as pd
+    cached = [cache.get(key) for key in keys]
+    missed = [i for i, row in enumerate(cached) if row is None]
+    if missed:
+        fresh = score(windows[windows['unit'].isin(units[missed])])
+        for i, row in zip(missed, fresh.drop(columns='unit').to_dict('records')):
+            cache.put(keys[i], row)
+            cached[i] = row
+    table = pd.DataFrame(cached)
+    table.insert(0, 'unit', units)
+    return table
+
+def predict_rul_units(model, scaler, df, cache=prediction_cache, workers=1, progress=None):
+    # Per-unit result table for the whole upload instead of only the first unit
+    try:
+        with metrics.timed('predict_rul'):
+            windows, units, starts = _unit_windows(model, df)
+            if cache is None:
+                table = _score(model, windows, workers, progress)
+            else:
+                keys = _window_keys(model, windows, np.append(starts, len(windows)))
+                table = _cached_units(cache, keys, units, windows, lambda rows: _score(model, rows, workers, progress))
+            table['rul'] = table['rul'].clip(lower=0)
+        metrics.observe_counts('predict_rul', rows=len(df), units=len(units))
+        return table
+    except Exception as e:
+        print(f"Prediction error: {str(e)}")
+        raise
+
+# Per-unit RUL with the spread of the forest's per-tree predictions (see
+# SequenceModel.predict_interval). tolerance / budget let it stop before all trees
+# have been evaluated; only full-forest results are cached (next to the units' RUL
+# in cache). Raises tree_engine.NoTreesError for models that are not tree ensembles.
+def predict_rul_intervals(model, scaler, df, tolerance=None, budget=None, step=config.ANYTIME_STEP, cache=None):
+    try:
+        with metrics.timed('predict_rul_interval'):
+            windows, units, starts = _unit_windows(model, df)
+            def score(rows):
+                return model.predict_interval(rows, preprocess=True, tolerance=tolerance, budget=budget, step=step)
+            if cache is None or tolerance or budget:
+                table = score(windows)
+            else:
+                keys = [f'{key}-interval' for key in _window_keys(model, windows, np.append(starts, len(windows)))]
+                table = _cached_units(cache, keys, units, windows, score)
+            table[['rul', 'rul_low', 'rul_high']] = table[['rul', 'rul_low', 'rul_high']].clip(lower=0)
+        metrics.observe_counts('predict_rul_interval', rows=len(df), units=len(table))
+        return table
+    except NoTreesError:
+        raise  # callers report that themselves
+    except Exception as e:
+        print(f"Prediction error: {str(e)}")
+        raise
+
+# The importance figure only depends on the loaded model, so it is built once per model
+_importance_figures = weakref.WeakKeyDictionary()
+
+# Placeholder plot with an error message
+def _importance_placeholder():
+    import plotly.express as px
+    fig = px.bar(title='Feature Importance Not Available')
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='#ffffff',
+        title_font_color='#ffffff'
+    )
+    return fig
+
 def get_feature_importance(model, features):
+    if model is None:  # no model loaded (and None can't key the WeakKeyDictionary)
+        return _importance_placeholder()
+    cached = _importance_figures.get(model, {}).get(tuple(features))
+    if cached is not None:
+        return cached
+
+    import pandas as pd
+    import plotly.express as px
+    start = time.perf_counter()
     try:
         # Verify that model.regressor is a RandomForestRegressor and has feature_importances_
         if not hasattr(model, 'regressor') or not hasattr(model.regressor, 'feature_importances_'):
@@ -46,15 +248,43 @@ def get_feature_importance(model, features):
             font_color='#ffffff',
             title_font_color='#ffffff'
         )
+        _importance_figures.setdefault(model, {})[tuple(features)] = fig
+        metrics.registry.observe('pm_stage_seconds', time.perf_counter() - start, stage='feature_importance_figure')
         return fig
     except Exception as e:
         print(f"Feature importance error: {e}")
-        # Return a placeholder plot with an error message
-        fig = px.bar(title='Feature Importance Not Available')
-        fig.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#ffffff',
-            title_font_color='#ffffff'
-        )
-        return fig
\ No newline at end of file
+        metrics.error('feature_importance_figure')
+        return _importance_placeholder()
+
+# The trend figure is a plain figure dict with one trace per unit (in order of first
+# appearance, like px.line(color='unit')), so callbacks can extend it with dash.Patch
+# instead of re-sending the whole figure after every prediction
+TREND_LAYOUT = {
+    'title': {'text': 'RUL Prediction Trend', 'font': {'color': '#ffffff'}},
+    'xaxis': {'title': {'text': 'Cycle'}},
+    'yaxis': {'title': {'text': 'Predicted RUL'}},
+    'legend': {'title': {'text': 'unit'}},
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+    'font': {'color': '#ffffff'}
+}
+
+def trend_trace(unit, cycles=(), ruls=()):
+    return {
+        'type': 'scatter',
+        'mode': 'lines+markers',
+        'line': {'shape': 'linear'},
+        'name': str(unit),
+        'x': list(cycles),
+        'y': list(ruls)
+    }
+
+def get_trend_figure(history):
+    with metrics.timed('trend_figure'):
+        traces = {}
+        for entry in history:
+            trace = traces.setdefault(entry['unit'], trend_trace(entry['unit']))
+            trace['x'].append(entry['cycle'])
+            trace['y'].append(entry['rul'])
+        return {'data': list(traces.values()), 'layout': TREND_LAYOUT}
+
@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+# Trailing-window statistics of every sensor for a whole fleet at once. Rows are
+# grouped by unit (see custom_models.unit_offsets); each row gets the mean, standard
+# deviation and least-squares slope of its sensors over the last `window` cycles of
+# its unit (fewer at the start of a unit), plus an exponentially weighted mean over
+# the unit's whole history. Window sums come from cumulative sums, so the cost is
+# O(rows) whatever the window, with no groupby().rolling and no loop over units.
+
+STATS = ('mean', 'std', 'slope', 'ewma')
+_ROUNDING = 1024 * np.finfo(np.float64).eps
+
+
+def feature_names(names):
+    return [f'{name}_{stat}' for stat in STATS for name in names]
+
+
+# Leading zero row, so the sum over rows a..r is c[r + 1] - c[a]
+def _cumsum(values):
+    out = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+
+# Mean, std (ddof=0) and slope per cycle over the trailing window, as three
+# (len(rows), features) blocks. rows selects the rows to return (default all of
+# them); the cumulative sums always cover the whole input.
+def rolling_stats(values, offsets, window=10, rows=None):
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets)
+    counts = np.diff(offsets)
+    starts = np.repeat(offsets[:-1], counts)
+    x = np.arange(len(values)) - starts  # cycle position inside the unit
+    rows = np.arange(len(values)) if rows is None else np.asarray(rows)
+
+    # Std and slope don't depend on a shift that is constant within a unit; centring
+    # every unit on its own mean keeps the running sums of squares small, so window
+    # differences don't lose precision on raw sensor values
+    center = np.repeat(np.add.reduceat(values, offsets[:-1]) / counts[:, None], counts, axis=0) if len(values) else values
+    centred = values - center
+    sums = _cumsum(centred)
+    squares = _cumsum(centred * centred)
+    products = _cumsum(x[:, None] * centred)
+
+    first = np.maximum(starts[rows], rows - window + 1)
+    n = (rows - first + 1).astype(np.float64)[:, None]
+    sum_y = sums[rows + 1] - sums[first]
+    sum_yy = squares[rows + 1] - squares[first]
+    sum_xy = products[rows + 1] - products[first]
+
+    # Window sums are differences of running totals and carry a rounding error of a
+    # small multiple of eps times those totals. Anything below that is noise and set
+    # to 0, so a constant window gets exactly 0 std and slope wherever the running
+    # sums started (a full recompute and WindowFeatureState must agree on it).
+    mean = sum_y / n
+    var = sum_yy / n - mean * mean
+    var[var <= _ROUNDING * squares[rows + 1] / n] = 0
+    std = np.sqrt(var)
+    # x runs over consecutive positions, so n*sum(x^2) - sum(x)^2 = n^2 (n^2 - 1) / 12
+    sum_x = (x[first] + x[rows])[:, None] * n / 2
+    numerator = n * sum_xy - sum_x * sum_y
+    noise = n * (np.abs(products[rows + 1]) + np.abs(products[first])) + sum_x * (np.abs(sums[rows + 1]) + np.abs(sums[first]))
+    numerator[np.abs(numerator) <= _ROUNDING * noise] = 0
+    denom = n * n * (n * n - 1) / 12
+    slope = np.divide(numerator, denom, out=np.zeros_like(sum_y), where=denom > 0)
+    return mean + center[rows], std, slope
+
+
+# Exponentially weighted mean per unit, e_t = alpha * y_t + (1 - alpha) * e_{t-1},
+# starting from the unit's first value, or from start (one row per unit, NaN rows
+# for units without a previous value). One scipy lfilter pass runs over the whole
+# fleet; the value it carries over from the previous unit decays by (1 - alpha) per
+# cycle and is subtracted afterwards.
+def ewma(values, offsets, alpha=0.3, start=None):
+    from scipy.signal import lfilter
+
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets)
+    if not len(values):
+        return values.copy()
+    counts = np.diff(offsets)
+    first = offsets[:-1]
+
+    filtered = lfilter([alpha], [1, alpha - 1], values, axis=0)
+    target = values[first]
+    if start is not None:
+        start = np.asarray(start, dtype=np.float64)
+        target = np.where(np.isnan(start), target, alpha * target + (1 - alpha) * start)
+    carry = filtered[first] - target
+    decay = (1 - alpha) ** (np.arange(len(values)) - np.repeat(first, counts))
+    return filtered - np.repeat(carry, counts, axis=0) * decay[:, None]
+
+
+# Cycles after which older history weighs less than float64 resolution in the EWMA
+# ((1 - alpha)^k < eps): the EWMA over a unit's last ewma_horizon(alpha) rows equals
+# the one over its whole history, so serving never needs more than that
+def ewma_horizon(alpha):
+    return 1 if alpha >= 1 else int(np.ceil(np.log(np.finfo(np.float64).eps) / np.log1p(-alpha)))
+
+
+# All of STATS for the selected rows, as one (len(rows), 4 * features) matrix laid
+# out like feature_names()
+def window_features(values, offsets, window=10, alpha=0.3, rows=None):
+    mean, std, slope = rolling_stats(values, offsets, window, rows)
+    smoothed = ewma(values, offsets, alpha)
+    return np.hstack([mean, std, slope, smoothed if rows is None else smoothed[rows]])
+
+
+# window_features of the last row of every unit, which is all serving needs: the
+# rolling statistics only read each unit's last `window` rows, and the EWMA is taken
+# as a weighted sum (alpha * (1 - alpha)^k for the k-th most recent row, (1 - alpha)^(n-1)
+# for a unit's first one) instead of a filter pass over every row
+def last_window_features(values, offsets, window=10, alpha=0.3):
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets)
+    counts = np.diff(offsets)
+    recent = np.minimum(counts, window)
+    tail_offsets = np.concatenate(([0], np.cumsum(recent)))
+    tail = np.repeat(offsets[1:] - recent, recent) + np.arange(tail_offsets[-1]) - np.repeat(tail_offsets[:-1], recent)
+    mean, std, slope = rolling_stats(values[tail], tail_offsets, window, tail_offsets[1:] - 1)
+
+    weights = alpha * (1 - alpha) ** (np.repeat(offsets[1:], counts) - np.arange(len(values)) - 1)
+    weights[offsets[:-1]] = (1 - alpha) ** (counts - 1)
+    smoothed = np.add.reduceat(values * weights[:, None], offsets[:-1])
+    return np.hstack([mean, std, slope, smoothed])
+
+
+# Incremental window_features for cycles that arrive over time. Per unit it keeps
+# the last window - 1 rows and the latest EWMA, in flat arrays indexed by slot (like
+# streaming.StreamingRULTracker), so appending cycles for any set of units only
+# touches those rows and the stored tails, and returns the same features as a
+# recompute over the units' full histories.
+class WindowFeatureState:
+    def __init__(self, n_features, window=10, alpha=0.3, capacity=1024):
+        self.window = window
+        self.alpha = alpha
+        self.tail = np.zeros((capacity, window - 1, n_features))  # right-aligned
+        self.tail_count = np.zeros(capacity, dtype=np.int64)
+        self.last_ewma = np.zeros((capacity, n_features))
+        self._units = pd.Index([])
+
+    def __len__(self):
+        return len(self._units)
+
+    def _slots_for(self, units):
+        slots = self._units.get_indexer(units)
+        new = slots < 0
+        if new.any():
+            slots[new] = np.arange(len(self._units), len(self._units) + new.sum())
+            added = pd.Index(units[new])
+            self._units = self._units.append(added) if len(self._units) else added
+            if len(self._units) > len(self.tail):
+                capacity = max(2 * len(self.tail), len(self._units))
+                for name in ('tail', 'tail_count', 'last_ewma'):
+                    old = getattr(self, name)
+                    grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                    grown[:len(old)] = old
+                    setattr(self, name, grown)
+        return slots, new
+
+    # New cycles (in cycle order within each unit) -> their window features, in the
+    # order of the input rows
+    def append(self, units, values):
+        units = np.asarray(units)
+        order = np.argsort(units, kind='stable')
+        values = np.asarray(values, dtype=np.float64)[order]
+        batch_units, counts = np.unique(units[order], return_counts=True)
+        slots, new = self._slots_for(batch_units)
+
+        # Each unit's stored tail followed by its new rows
+        kept = self.tail_count[slots]
+        lengths = kept + counts
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        owner = np.repeat(np.arange(len(slots)), lengths)
+        position = np.arange(offsets[-1]) - offsets[owner]
+        from_tail = position < kept[owner]
+        extended = np.empty((offsets[-1], values.shape[1]))
+        extended[from_tail] = self.tail[slots[owner[from_tail]], self.window - 1 - kept[owner[from_tail]] + position[from_tail]]
+        extended[~from_tail] = values
+        rows = np.flatnonzero(~from_tail)
+
+        new_offsets = np.concatenate(([0], np.cumsum(counts)))
+        start = np.where(new[:, None], np.nan, self.last_ewma[slots])
+        smoothed = ewma(values, new_offsets, self.alpha, start)
+        features = np.hstack(list(rolling_stats(extended, offsets, self.window, rows)) + [smoothed])
+
+        # Remember the last window - 1 rows and the EWMA of every unit
+        keep = np.minimum(lengths, self.window - 1)
+        from_end = offsets[owner + 1] - np.arange(offsets[-1]) - 1
+        stored = from_end < keep[owner]
+        self.tail[slots[owner[stored]], self.window - 2 - from_end[stored]] = extended[stored]
+        self.tail_count[slots] = keep
+        self.last_ewma[slots] = smoothed[new_offsets[1:] - 1]
+
+        out = np.empty_like(features)
+        out[order] = features
+        return out
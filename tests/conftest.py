@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules in src/ import each other as top-level modules, like app.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from ingest import COLUMNS, FEATURES  # noqa: E402
+
+
+# Small CMAPSS-like fleet: n_units units of 20-60 cycles whose sensors drift with wear
+def make_fleet(n_units=12, seed=0):
+    rng = np.random.default_rng(seed)
+    lives = rng.integers(20, 61, n_units)
+    units = np.repeat(np.arange(1, n_units + 1), lives)
+    cycles = np.concatenate([np.arange(1, life + 1) for life in lives])
+    wear = cycles / np.repeat(lives, lives)
+    features = rng.normal(size=(len(units), len(FEATURES))) + wear[:, None] * rng.uniform(1, 5, len(FEATURES))
+    df = pd.DataFrame(features, columns=FEATURES)
+    df.insert(0, 'cycle', cycles.astype(np.int32))
+    df.insert(0, 'unit', units.astype(np.int32))
+    return df[COLUMNS]
+
+
+@pytest.fixture
+def fleet():
+    return make_fleet()
+
+
+@pytest.fixture
+def forest(fleet):
+    from sklearn.ensemble import RandomForestRegressor
+    y = fleet.groupby('unit')['cycle'].transform('max') - fleet['cycle']
+    return RandomForestRegressor(n_estimators=15, max_depth=6, random_state=0).fit(fleet[FEATURES].to_numpy(), y)
+
+
+@pytest.fixture
+def regressor_model(fleet):
+    from sklearn.ensemble import RandomForestRegressor
+    from custom_models import PointPredictorRegressor
+    return PointPredictorRegressor(RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0)).fit(fleet)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from ingest import FEATURES
+from tree_engine import NoTreesError, compile_forest, predict_anytime
+
+
+def test_full_forest_without_stopping_rules(fleet, forest):
+    X = fleet[FEATURES].to_numpy()
+    rul, spread, low, high, n_trees = predict_anytime(forest, X, step=4)
+    trees = np.vstack([tree.predict(X.astype(np.float32)) for tree in forest.estimators_])
+    assert n_trees == 15
+    np.testing.assert_allclose(rul, trees.mean(axis=0))
+    np.testing.assert_allclose(spread, trees.std(axis=0, ddof=1))
+    assert np.all(low <= rul) and np.all(rul <= high)
+
+
+def test_compiled_and_sklearn_forests_agree(fleet, forest):
+    X = fleet[FEATURES].to_numpy()
+    for expected, actual in zip(predict_anytime(forest, X), predict_anytime(compile_forest(forest), X)):
+        np.testing.assert_allclose(actual, expected)
+
+
+def test_tolerance_stops_early(fleet, forest):
+    X = fleet[FEATURES].to_numpy()[:20]
+    assert predict_anytime(forest, X, tolerance=1e6, step=2)[4] == 2  # after the first block
+    assert predict_anytime(forest, X, tolerance=1e-9, step=2)[4] == 15
+
+
+def test_budget_stops_after_the_first_block(fleet, forest):
+    X = fleet[FEATURES].to_numpy()[:20]
+    rul, spread, _, _, n_trees = predict_anytime(forest, X, budget=0, step=5)
+    assert n_trees == 5
+    assert rul.shape == spread.shape == (20,)
+
+
+def test_reduce_maps_rows_to_outputs(fleet, forest):
+    X = fleet[FEATURES].to_numpy()
+    rul, _, _, _, _ = predict_anytime(forest, X, reduce=lambda block: block[:, :3].sum(axis=1, keepdims=True))
+    assert rul.shape == (1,)
+    assert rul[0] == pytest.approx(forest.predict(X[:3]).sum())
+
+
+def test_models_without_trees(fleet):
+    X = fleet[FEATURES].to_numpy()
+    with pytest.raises(NoTreesError):
+        predict_anytime(LinearRegression().fit(X, fleet['cycle']), X)
@@ -0,0 +1,117 @@
+import io
+import json
+
+import flask
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+import config
+from api import create_api
+from custom_models import PointPredictorRegressor
+from ingest import COLUMNS
+
+
+# Stands in for model_registry.ModelRegistry: fixed models by ID, "default" when none is asked for
+class Registry:
+    def __init__(self, models):
+        self.models = models
+
+    def get(self, model_id=None, df=None, timeout=None):
+        model_id = model_id if model_id not in (None, 'auto') else 'default'
+        if model_id not in self.models:
+            raise KeyError(f"Unknown model {model_id!r}.")
+        return self.models[model_id], None, model_id
+
+
+@pytest.fixture
+def client(fleet, regressor_model):
+    linear = PointPredictorRegressor(LinearRegression()).fit(fleet)
+    server = flask.Flask(__name__)
+    server.register_blueprint(create_api(Registry({'default': regressor_model, 'linear': linear})))
+    return server.test_client()
+
+
+def _json(df):
+    return json.dumps(df.to_dict('list'))
+
+
+def test_scores_every_unit(client, fleet, regressor_model):
+    response = client.post('/api/v1/rul', data=_json(fleet), content_type='application/json')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['n_units'] == fleet['unit'].nunique() and body['model'] == 'default'
+    np.testing.assert_allclose(body['rul'], np.clip(regressor_model.predict(fleet), 0, None))
+
+
+def test_intervals(client, fleet):
+    response = client.post('/api/v1/rul?interval=1', data=fleet.to_csv(index=False), content_type='text/csv')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert set(body['n_trees']) == {10}
+    assert all(low <= high for low, high in zip(body['rul_low'], body['rul_high']))
+
+
+def test_npy_payload(client, fleet):
+    buffer = io.BytesIO()
+    np.save(buffer, fleet[COLUMNS].to_numpy(np.float64))
+    response = client.post('/api/v1/rul', data=buffer.getvalue(), content_type='application/x-npy')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('data, content_type, query, status', [
+    ('{}', 'application/xml', '', 415),
+    ('{"unit": [1', 'application/json', '', 400),
+    ('[1, 2]', 'application/json', '', 400),
+    ('', 'text/csv', '?tolerance=abc', 400),
+])
+def test_rejected_requests(client, data, content_type, query, status):
+    response = client.post(f'/api/v1/rul{query}', data=data, content_type=content_type)
+    assert response.status_code == status
+    assert 'error' in response.get_json()
+
+
+def test_npz_archive_is_rejected(client, fleet):
+    buffer = io.BytesIO()
+    np.savez(buffer, fleet=fleet[COLUMNS].to_numpy(np.float64))
+    response = client.post('/api/v1/rul', data=buffer.getvalue(), content_type='application/x-npy')
+    assert response.status_code == 400
+
+
+def test_header_only_csv(client):
+    response = client.post('/api/v1/rul', data=','.join(COLUMNS) + '\n', content_type='text/csv')
+    assert response.status_code == 400
+    assert 'no rows' in response.get_json()['error']
+
+
+def test_missing_infinite_or_fractional_ids(client, fleet):
+    for value in (np.nan, np.inf, 1.5):
+        df = fleet.astype({'unit': float})
+        df.loc[3, 'unit'] = value
+        response = client.post('/api/v1/rul', data=df.to_csv(index=False), content_type='text/csv')
+        assert response.status_code == 400
+
+
+def test_unknown_model(client, fleet):
+    response = client.post('/api/v1/rul?model=FD009', data=_json(fleet), content_type='application/json')
+    assert response.status_code == 404
+
+
+def test_intervals_of_a_model_without_trees(client, fleet):
+    response = client.post('/api/v1/rul?model=linear&interval=1', data=_json(fleet), content_type='application/json')
+    assert response.status_code == 501
+    response = client.post('/api/v1/rul?model=linear', data=_json(fleet), content_type='application/json')
+    assert response.status_code == 200
+
+
+def test_body_over_the_limit(client, fleet, monkeypatch):
+    monkeypatch.setattr(config, 'API_MAX_MB', 0)
+    response = client.post('/api/v1/rul', data='unit,cycle\n1,1\n', content_type='text/csv')
+    assert response.status_code == 413
+
+    # Chunked upload: no Content-Length, the limit is enforced while reading
+    monkeypatch.setattr(config, 'API_MAX_MB', 1)
+    body = fleet.to_csv(index=False).encode() * (2 * 1024 * 1024 // len(fleet.to_csv(index=False)) + 1)
+    response = client.post('/api/v1/rul', input_stream=io.BytesIO(body), content_type='text/csv',
+                           environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 413
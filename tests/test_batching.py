@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+# predict_fn whose first call blocks until released, so the requests submitted
+# meanwhile queue up and are served as one batch
+class Gate:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, X):
+        self.calls.append(len(X))
+        if len(self.calls) == 1:
+            self.entered.set()
+            self.release.wait(5)
+        if self.fail:
+            raise ValueError("bad batch")
+        return np.asarray(X).sum(axis=1)
+
+
+def _hold_scheduler(batcher, gate):
+    first = batcher.submit(np.zeros((1, 3)))
+    assert gate.entered.wait(5)
+    return first
+
+
+def test_concurrent_submits_coalesce_into_one_call():
+    gate = Gate()
+    batcher = MicroBatcher(gate, max_batch_rows=9, max_wait=5)  # the batch closes once all 9 rows are queued
+    first = _hold_scheduler(batcher, gate)
+    requests = [np.full((n, 3), n, dtype=np.float32) for n in (2, 3, 4)]
+    futures = [batcher.submit(X) for X in requests]
+    gate.release.set()
+
+    assert first.result(5).tolist() == [0]
+    for X, future in zip(requests, futures):
+        np.testing.assert_array_equal(future.result(5), X.sum(axis=1))
+    assert gate.calls == [1, 9]
+    assert batcher.stats()['batches'] == 2 and batcher.stats()['requests'] == 4
+    batcher.close()
+
+
+def test_predict_exception_reaches_every_waiting_future():
+    gate = Gate(fail=True)
+    batcher = MicroBatcher(gate, max_batch_rows=6, max_wait=5)
+    first = _hold_scheduler(batcher, gate)
+    futures = [batcher.submit(np.ones((2, 3))) for _ in range(3)]
+    gate.release.set()
+
+    for future in [first] + futures:
+        with pytest.raises(ValueError, match='bad batch'):
+            future.result(5)
+    stats = batcher.stats()
+    assert stats['failed_batches'] == 2 and stats['failed_requests'] == 4
+    assert stats['batches'] == 0
+    batcher.close()
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('end_points', [10, 3, 0])
+def test_batched_prediction_matches_per_unit_fits(fleet, regressor_model, end_points):
+    batched = regressor_model.predict(fleet, end_points=end_points)
+    per_unit = regressor_model.predict(fleet, end_points=end_points, batched=False)
+    np.testing.assert_allclose(batched, per_unit, rtol=1e-9, atol=1e-6)
+
+
+def test_batched_prediction_keeps_cycle_order_of_shuffled_units(fleet, regressor_model):
+    # Units interleaved, but every unit's rows still in cycle order
+    shuffled = fleet.sample(frac=1, random_state=0).sort_values('cycle', kind='stable')
+    table = regressor_model.predict_units(shuffled)
+    assert table['unit'].tolist() == sorted(fleet['unit'].unique())
+    np.testing.assert_allclose(table['rul'], regressor_model.predict(fleet, batched=False), rtol=1e-9, atol=1e-6)
+
+
+def test_list_input_matches_frame_input(fleet, regressor_model):
+    sequences = [group for _, group in fleet.groupby('unit')]
+    np.testing.assert_allclose(regressor_model.predict(sequences), regressor_model.predict(fleet))
+
+
+def test_rul_labels_of_an_empty_frame_are_empty():
+    from custom_models import rul_labels, unit_offsets
+
+    labels = rul_labels(np.array([], dtype=np.int32), unit_offsets(np.array([], dtype=np.int32)))
+    assert labels.shape == (0,)
+    np.testing.assert_array_equal(rul_labels([1, 2, 3, 1, 2], unit_offsets([4, 4, 4, 7, 7])), [2, 1, 0, 1, 0])
@@ -0,0 +1,42 @@
+import os
+import time
+
+import pandas as pd
+
+from data_cache import STALE_TMP_SECONDS, DatasetCache
+
+
+def _entry_bytes(cache, key):
+    return sum(entry.stat().st_size for entry in os.scandir(os.path.join(cache.directory, key)))
+
+
+def test_least_recently_used_uploads_are_evicted(tmp_path, fleet):
+    cache = DatasetCache(str(tmp_path / 'uploads'))
+    frames = {cache.key_for(bytes([i])): fleet[fleet['unit'] <= 4].assign(unit=i) for i in range(3)}
+    first, second, third = frames
+    cache.put(first, frames[first])
+    cache.put(second, frames[second])
+    old = time.time() - 100
+    os.utime(os.path.join(cache.directory, first), (old, old))
+    os.utime(os.path.join(cache.directory, second), (old + 1, old + 1))
+
+    pd.testing.assert_frame_equal(cache.get(first), frames[first].reset_index(drop=True))  # now the most recent
+    cache.max_bytes = 2 * _entry_bytes(cache, first)
+    cache.put(third, frames[third])
+    assert first in cache and third in cache and second not in cache
+    assert cache.get(second) is None
+
+
+def test_stale_temporary_writes_are_swept(tmp_path, fleet):
+    cache = DatasetCache(str(tmp_path / 'uploads'))
+    stale, fresh = (os.path.join(cache.directory, f'.tmp-{name}') for name in ('stale', 'fresh'))
+    for path in (stale, fresh):
+        os.makedirs(path)
+        with open(os.path.join(path, '0.npy'), 'wb') as f:
+            f.write(b'partial')
+    old = time.time() - STALE_TMP_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    cache.put(cache.key_for(b'upload'), fleet)
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)  # may still be written by another worker
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+from evaluation import MIN_OBSERVED_CYCLES, bucket_errors, nasa_score, truncate_units
+
+
+def test_nasa_score_penalises_late_predictions_more():
+    assert nasa_score([50, 50], [50, 50]) == 0
+    assert nasa_score([50], [37]) == pytest.approx(np.e - 1)  # 13 cycles early
+    assert nasa_score([50], [60]) == pytest.approx(np.e - 1)  # 10 cycles late
+    assert nasa_score([50], [60]) > nasa_score([50], [40])
+    assert nasa_score([50, 50], [37, 60]) == pytest.approx(2 * (np.e - 1))
+
+
+def test_empty_buckets_have_nan_scores():
+    table = bucket_errors([10, 20], [12, 18])
+    assert table['units'].sum() == 2
+    empty = table[table['units'] == 0]
+    assert len(empty) and empty[['rmse', 'bias', 'score']].isna().all().all()
+
+
+def test_truncate_units(fleet):
+    shuffled = fleet.sample(frac=1, random_state=1)
+    cut, rul = truncate_units(shuffled, seed=3)
+    life = fleet.groupby('unit')['cycle'].max()
+    observed = cut.groupby('unit')['cycle'].agg(['min', 'max', 'count'])
+
+    assert list(observed.index) == list(life.index) == sorted(fleet['unit'].unique())
+    assert (observed['min'] == 1).all() and (observed['count'] == observed['max']).all()  # a prefix of every unit
+    assert (observed['max'] >= np.minimum(MIN_OBSERVED_CYCLES, life)).all()
+    np.testing.assert_array_equal(rul, life - observed['max'])
+    assert (rul >= 0).all()
+
+    again, rul_again = truncate_units(fleet, seed=3)
+    np.testing.assert_array_equal(rul_again, rul)
+    assert len(again) == len(cut)
+
+
+def test_compiled_artifact_cross_validates(fleet, tmp_path):
+    from sklearn.preprocessing import StandardScaler
+    from evaluation import evaluate_datasets
+    from ingest import FEATURES
+    from train import build_model, write_artifacts
+    from utils import load_model_artifact
+
+    cut, rul = truncate_units(fleet, seed=0)
+    dataset_dir = tmp_path / 'dataset'
+    dataset_dir.mkdir()
+    fleet.to_csv(dataset_dir / 'train_FD001.txt', sep=' ', header=False, index=False)
+    cut.to_csv(dataset_dir / 'test_FD001.txt', sep=' ', header=False, index=False)
+    np.savetxt(dataset_dir / 'RUL_FD001.txt', rul, fmt='%d')
+
+    scaler = StandardScaler().fit(fleet[FEATURES])
+    candidate = {'kind': 'regressor', 'params': {'max_depth': 5, 'min_samples_leaf': 2}}
+    model = build_model(candidate, 8, scaler, n_jobs=1).fit(fleet)
+    _, path = write_artifacts(model, scaler, str(tmp_path / 'models'), 'FD001', {})
+    artifact = load_model_artifact(os.path.join(path, 'model.joblib'))
+    assert artifact.regressor.estimator.get_params()['max_depth'] == 5
+
+    table, _ = evaluate_datasets(artifact, ['FD001'], folds=2, workers=1, dataset_dir=str(dataset_dir))
+    assert table.loc['FD001', 'test_units'] == fleet['unit'].nunique()
+    assert np.isfinite(table.loc['FD001', ['test_rmse', 'cv_rmse', 'cv_rmse_std']].astype(float)).all()
@@ -0,0 +1,77 @@
+import pytest
+
+from history_store import HistoryStore, _order_by, _where, parse_filter
+
+
+@pytest.mark.parametrize('query, sql, params', [
+    (None, '', []),
+    ('{unit} = 3', ' WHERE unit = ?', [3.0]),
+    ('{rul} le 40 && {cycle} > 100', ' WHERE rul <= ? AND cycle > ?', [40.0, 100.0]),
+    ('{equipment} contains "Eng 1"', " WHERE equipment LIKE ? ESCAPE '\\'", ['%Eng 1%']),
+    ('{equipment} contains 50%_a\\b', " WHERE equipment LIKE ? ESCAPE '\\'", ['%50\\%\\_a\\\\b%']),
+    ('{equipment} = Engine', ' WHERE equipment = ?', ['Engine']),
+    ('{created_at} datestartswith 17', " WHERE created_at LIKE ? ESCAPE '\\'", ['17%']),
+    ('{unit} = abc && {rul} < 5', ' WHERE rul < ?', [5.0]),  # unparsable number
+    ('{id} = 1', '', []),  # not a column of the table
+    ('{unit} ~ 1', '', []),  # unknown operator
+    ('{unit} = 1; DROP TABLE predictions', '', []),
+])
+def test_parse_filter(query, sql, params):
+    assert parse_filter(query) == (sql, params)
+
+
+def test_where_appends_since():
+    assert _where(None, 7) == (' WHERE id > ?', [7])
+    assert _where('{unit} = 3', 7) == (' WHERE unit = ? AND id > ?', [3.0, 7])
+
+
+def test_order_by_whitelists_columns():
+    assert _order_by([{'column_id': 'rul', 'direction': 'desc'}, {'column_id': 'id; --'}]) == ' ORDER BY rul DESC, id DESC'
+
+
+def test_filtered_pages_and_since(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    store.add([{'equipment': f'Engine {i % 2}', 'unit': i, 'cycle': 10 * i, 'rul': 100 - i} for i in range(1, 11)])
+    assert store.count('{equipment} contains "1" && {rul} < 95') == 2
+    rows = store.page(0, 2, sort_by=[{'column_id': 'cycle', 'direction': 'asc'}], filter_query='{unit} >= 4')
+    assert [row['unit'] for row in rows] == [4, 5]
+    store.add([{'equipment': 'Engine_1', 'unit': 20, 'cycle': 1, 'rul': 1}, {'equipment': 'Engine%', 'unit': 21, 'cycle': 1, 'rul': 1}])
+    assert store.count('{equipment} contains _') == 1
+    assert store.count('{equipment} contains "e%"') == 1
+
+    since = store.last_id()
+    store.add([{'equipment': 'Engine 9', 'unit': 11, 'cycle': 5, 'rul': 1}])
+    assert store.count(since=since) == 1
+    assert [row['unit'] for row in store.recent(5, since=since)] == [11]
+    assert ''.join(store.iter_csv(since=since)).splitlines()[1].startswith('Engine 9,11,5,1.0,')
+
+
+def test_keyset_pages_match_offset_pages(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    store.add([{'equipment': f'Engine {i % 3}', 'unit': i % 4, 'cycle': i % 5, 'rul': i} for i in range(23)])
+    sort_by = [{'column_id': 'equipment', 'direction': 'desc'}, {'column_id': 'cycle', 'direction': 'asc'}]
+    everything = store.page(0, 100, sort_by, '{rul} > 1')
+    assert len(everything) == 21
+
+    cursors = {}
+    for page in range(5):
+        rows = store.page(page, 4, sort_by, '{rul} > 1', cursors=cursors)
+        assert rows == everything[4 * page:4 * page + 4]
+        if rows:
+            cursors[page] = store.cursor(sort_by, rows[-1])
+    # A jump skips rows from the nearest page before it
+    assert store.page(4, 4, sort_by, '{rul} > 1', cursors={1: cursors[1]}) == everything[16:20]
+
+
+def test_count_is_updated_incrementally_and_reset_by_clear(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    store.add([{'equipment': 'Engine', 'unit': i, 'cycle': i, 'rul': i} for i in range(10)])
+    assert store.count('{rul} >= 5') == 5
+    store.add([{'equipment': 'Engine', 'unit': i, 'cycle': i, 'rul': i} for i in range(3, 8)])
+    assert store.count('{rul} >= 5') == 8
+    assert store.count('{rul} >= 5', since=10) == 3
+
+    other = HistoryStore(store.path)  # a purge from another process
+    other.clear()
+    other.add([{'equipment': 'Engine', 'unit': 1, 'cycle': 1, 'rul': 9}])
+    assert store.count('{rul} >= 5') == 1
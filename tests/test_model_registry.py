@@ -0,0 +1,48 @@
+import os
+
+import joblib
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from ingest import FEATURES
+from model_registry import ModelRegistry, register_model
+
+
+@pytest.fixture
+def manifest(tmp_path, fleet, regressor_model):
+    scaler = joblib.dump(StandardScaler().fit(fleet[FEATURES]), str(tmp_path / 'scaler.pkl'))[0]
+    path = str(tmp_path / 'models.json')
+    for model_id in ('A', 'B', 'C'):
+        model = joblib.dump(regressor_model, str(tmp_path / f'{model_id}.joblib'))[0]
+        register_model(path, model_id, model, scaler, version=1, default=model_id == 'A')
+    return path
+
+
+def _registry(manifest, **kwargs):
+    return ModelRegistry(manifest, None, None, compiled=False, mmap=False, **kwargs)
+
+
+def test_least_recently_used_models_are_evicted_over_the_byte_budget(manifest, tmp_path):
+    one_model = os.path.getsize(tmp_path / 'A.joblib')
+    registry = _registry(manifest, max_bytes=2 * one_model, reload_seconds=0)
+    for model_id in ('A', 'B', 'C'):
+        assert registry.get(model_id)[2] == model_id
+    # B was the least recently used model that may go (A is the default, C in use)
+    assert list(registry._resident) == ['A', 'C']
+    assert registry.resident_bytes() == 2 * one_model
+
+    model, _, _ = registry.get('B')
+    assert model is not None and list(registry._resident) == ['A', 'B']
+
+
+def test_failed_reload_keeps_the_old_model(manifest, tmp_path, fleet):
+    registry = _registry(manifest, reload_seconds=1e-6)
+    model, _, _ = registry.get('B')
+    version = registry.version('B')
+
+    with open(tmp_path / 'B.joblib', 'wb') as f:
+        f.write(b'not a pickle')
+    assert registry.get('B')[0] is model
+    assert registry.reloads == 0
+    assert registry.version('B') != version  # not retried until the files change again
+    assert len(registry.get('B')[0].predict(fleet)) == fleet['unit'].nunique()
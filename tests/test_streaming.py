@@ -0,0 +1,35 @@
+import numpy as np
+
+from streaming import StreamingRULTracker
+
+
+def test_cycle_by_cycle_updates_match_batch_prediction(fleet, regressor_model):
+    tracker = StreamingRULTracker(regressor_model, end_points=5, capacity=4)  # forces _grow
+    for _, rows in fleet.groupby('cycle'):
+        tracker.update(rows)
+    expected = regressor_model.predict_units(fleet, end_points=5)
+    table = tracker.predict()
+    assert len(tracker) == fleet['unit'].nunique()
+    np.testing.assert_array_equal(table['unit'], expected['unit'])
+    np.testing.assert_array_equal(table['n_points'], expected['n_points'])
+    np.testing.assert_allclose(table['rul'], expected['rul'], atol=1e-6)
+
+
+def test_update_with_many_cycles_per_unit(fleet, regressor_model):
+    tracker = StreamingRULTracker(regressor_model, end_points=10)
+    half = fleet[fleet['cycle'] <= 15]
+    tracker.update(half)
+    tracker.update(fleet[fleet['cycle'] > 15])
+    np.testing.assert_allclose(tracker.predict()['rul'], regressor_model.predict(fleet), atol=1e-6)
+
+
+def test_dropped_slots_are_reused_from_scratch(fleet, regressor_model):
+    tracker = StreamingRULTracker(regressor_model, end_points=5)
+    tracker.update(fleet[fleet['unit'].isin([1, 2])])
+    tracker.drop([1])
+    assert len(tracker) == 1
+
+    unit = fleet[fleet['unit'] == 3]
+    tracker.update(unit)
+    assert tracker.slot_unit[:tracker._n_slots].tolist() == [3, 2]
+    np.testing.assert_allclose(tracker.predict([3])['rul'], regressor_model.predict(unit, end_points=5), atol=1e-6)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor
+
+from ingest import FEATURES
+from tree_engine import FALLBACK_ROWS, compile_forest, compile_model
+
+
+def test_compiled_forest_matches_sklearn_bit_for_bit(fleet, forest):
+    X = fleet[FEATURES].to_numpy()
+    compiled = compile_forest(forest)
+    np.testing.assert_array_equal(compiled.predict(X), forest.predict(X))
+    np.testing.assert_array_equal(compiled.predict_trees(X[:50]),
+                                  np.vstack([tree.predict(X[:50].astype(np.float32)) for tree in forest.estimators_]))
+
+
+def test_compiled_extra_trees_match_sklearn(fleet):
+    X = fleet[FEATURES].to_numpy()
+    forest = ExtraTreesRegressor(n_estimators=10, random_state=0).fit(X, fleet['cycle'])
+    np.testing.assert_array_equal(compile_forest(forest).predict(X), forest.predict(X))
+
+
+def test_compile_model_drops_the_sklearn_forest_by_default(fleet, forest):
+    from custom_models import PointPredictor
+
+    model = PointPredictor(forest)
+    model.feature_names = FEATURES
+    model.scaler.fit(fleet[FEATURES])
+    assert compile_model(model).regressor.fallback is None
+    assert compile_model(model, keep_fallback=True).regressor.fallback is forest
+    assert model.regressor is forest  # the original model is left alone
+
+
+def test_fallback_only_serves_large_batches(fleet, forest):
+    X = np.tile(fleet[FEATURES].to_numpy(), (FALLBACK_ROWS // len(fleet) + 1, 1))
+    compiled = compile_forest(forest, keep_fallback=True)
+    np.testing.assert_array_equal(compiled.predict(X), forest.predict(X))
+    np.testing.assert_array_equal(compiled.predict(X[:10]), forest.predict(X[:10]))
+
+
+def test_rejects_wrong_feature_count(forest):
+    with pytest.raises(ValueError):
+        compile_forest(forest).predict(np.zeros((2, 3)))
@@ -0,0 +1,23 @@
+import numpy as np
+
+from custom_models import unit_offsets
+from ingest import FEATURES
+from window_features import WindowFeatureState, window_features
+
+
+def test_incremental_append_matches_full_recompute(fleet):
+    fleet = fleet.sort_values(['unit', 'cycle'], kind='stable').reset_index(drop=True)
+    expected = window_features(fleet[FEATURES].to_numpy(), unit_offsets(fleet['unit'].to_numpy()), window=5, alpha=0.3)
+
+    state = WindowFeatureState(len(FEATURES), window=5, alpha=0.3, capacity=4)  # forces growth
+    got = np.empty_like(expected)
+    # Batches of 1-7 cycles, with the units of each batch in shuffled order
+    rng = np.random.default_rng(0)
+    bounds = np.unique(np.concatenate(([0], np.cumsum(rng.integers(1, 8, 20)), [fleet['cycle'].max()])))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        batch = fleet[(fleet['cycle'] > lo) & (fleet['cycle'] <= hi)]
+        batch = batch.sample(frac=1, random_state=int(hi)).sort_values('cycle', kind='stable')
+        got[batch.index] = state.append(batch['unit'].to_numpy(), batch[FEATURES].to_numpy())
+
+    assert len(state) == fleet['unit'].nunique()
+    np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-9)